@@ -3,6 +3,7 @@ import botocore.exceptions
 import os
 import datetime
 import threading
+import time
 import requests
 from pymongo import MongoClient, ASCENDING
 import settings
@@ -13,6 +14,11 @@ client   = MongoClient("172.17.0.1")
 util_ref = client["fvonprem"]["utils"]
 kinesis_log = client["fvonprem"]["kinesis_auth_log"]
 
+# PutRecords limits
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES   = 5 * 1024 * 1024
+MAX_BATCH_RETRIES = 3
+
 def ms_timestamp():
     return int(datetime.datetime.now().timestamp()*1000)
 
@@ -169,6 +175,77 @@ class Kinesis(object):
         else:
             return False
 
+    def send_batch(self, records, partition_key=None):
+        """ Send records with PutRecords, retrying only the entries that failed.
+
+        Returns a list aligned with records: True for each record that was
+        written, otherwise the last error reported for it. A PutRecords call
+        that raises fails only the records of its own chunk.
+        """
+        if not self.authorized:
+            if self.debug:
+                self._log('send_rejected', {'reason': 'not authorized'})
+            return ['Service not authorized'] * len(records)
+
+        client = self._connect_client()
+        if not client:
+            return ['Kinesis client unavailable'] * len(records)
+
+        entries = []
+        for record in records:
+            key = str(partition_key if partition_key != None else uuid.uuid4())
+            entries.append({'Data': (json.dumps(record)+'\n').encode('utf-8'), 'PartitionKey': key})
+
+        results = [None] * len(records)
+        for chunk in self._chunk_entries(entries):
+            self._put_records(client, entries, chunk, results)
+        return results
+
+    def _chunk_entries(self, entries):
+        chunk, chunk_bytes = [], 0
+        for i, entry in enumerate(entries):
+            size = len(entry['Data']) + len(entry['PartitionKey'])
+            if chunk and (len(chunk) == MAX_BATCH_RECORDS or chunk_bytes + size > MAX_BATCH_BYTES):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(i)
+            chunk_bytes += size
+        if chunk:
+            yield chunk
+
+    def _put_records(self, client, entries, pending, results):
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            if attempt:
+                time.sleep(0.1 * (2 ** attempt))
+            try:
+                resp = client.put_records(
+                    StreamARN=self.stream,
+                    Records=[entries[i] for i in pending]
+                )
+            except botocore.exceptions.ClientError as e:
+                error_code = e.response['Error']['Code']
+                if error_code in ('UnrecognizedClientException', 'ExpiredTokenException', 'InvalidSignatureException'):
+                    self._log('put_records_auth_error', {'error_code': error_code, 'message': str(e)})
+                    self.CLIENT = None
+                    self.expiration = None
+                # only this chunk failed; chunks already written keep their results
+                for i in pending:
+                    results[i] = '{}: {}'.format(error_code, e.response['Error'].get('Message', ''))
+                return
+
+            retry = []
+            for i, entry in zip(pending, resp['Records']):
+                if 'ErrorCode' in entry:
+                    results[i] = '{}: {}'.format(entry['ErrorCode'], entry.get('ErrorMessage', ''))
+                    retry.append(i)
+                else:
+                    results[i] = True
+            if not retry:
+                return
+            if self.debug:
+                self._log('put_records_partial_failure', {'failed': len(retry), 'attempt': attempt})
+            pending = retry
+
     def _log(self, event, details=None):
         try:
             kinesis_log.insert_one({
@@ -81,7 +81,8 @@ fi
 docker run -p 8500:8500 -p 8501:8501 --gpus device=0 --name localprediction  -d -e AWS_ACCESS_KEY_ID=imagerie -e AWS_SECRET_ACCESS_KEY=imagerie -e AWS_REGION=us-east-1 \
     --restart unless-stopped --network imagerie_nw  \
     --log-opt max-size=50m --log-opt max-file=5 \
-    -t fvonprem/$4-prediction:$PREDICTION_VERSION
+    -t fvonprem/$4-prediction:$PREDICTION_VERSION \
+    --model_config_file_poll_wait_seconds=60
 
 docker run -p 8511:8511 --name predictlite  -d  \
     --restart unless-stopped --network imagerie_nw  \
@@ -0,0 +1,79 @@
+"""
+Benchmark: claiming unsynced analytics, per-record loop vs bulk claim.
+
+Seeds a scratch collection on the local mongo with pending analytics and
+times get_unsynced_records() in both claim modes until the backlog is
+drained. The fvonprem database is never touched.
+
+Usage (on the device, from system_server/):
+    python3 benchmarks/bench_claim_unsynced.py [--records 100000] [--cycles 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from worker_scripts import job_manager
+
+BENCH_DB = 'fvonprem_bench'
+
+
+def seed(coll, num_records):
+    coll.drop()
+    old = job_manager.time_now_ms() - 300000
+    batch = []
+    for i in range(num_records):
+        batch.append({'id': f'bench-{i}', 'did': f'det-{i % 500}', 'synced': False,
+                      'modified': old, 'complete': True, 'payload': 'x' * 256})
+        if len(batch) == 5000:
+            coll.insert_many(batch)
+            batch = []
+    if batch:
+        coll.insert_many(batch)
+    coll.create_index('synced')
+
+
+def run_mode(mode, num_records, cycles):
+    client = job_manager.client
+    job_manager.analytics_coll = client[BENCH_DB]['img_analytics']
+    job_manager.util_collection = client[BENCH_DB]['utils']
+    job_manager.util_collection.update_one({'type': 'predict_sync'},
+        {'$set': {'ms_time': str(job_manager.time_now_ms())}}, True)
+    job_manager.CLAIM_MODE = mode
+
+    seed(job_manager.analytics_coll, num_records)
+
+    timings = []
+    claimed = 0
+    for _ in range(cycles):
+        start = time.perf_counter()
+        records = job_manager.get_unsynced_records()
+        timings.append(time.perf_counter() - start)
+        claimed += len(records)
+        if not records:
+            break
+
+    avg = sum(timings) / len(timings)
+    print(f"{mode:>5}: {claimed} records in {len(timings)} cycles, "
+          f"avg {avg * 1000:.1f} ms/cycle, {claimed / sum(timings):.0f} records/sec")
+    return avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--cycles', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Seeding {args.records} pending analytics into {BENCH_DB}.img_analytics")
+    loop_avg = run_mode('loop', args.records, args.cycles)
+    bulk_avg = run_mode('bulk', args.records, args.cycles)
+    print(f"speedup: {loop_avg / bulk_avg:.1f}x per sync cycle")
+
+    job_manager.client.drop_database(BENCH_DB)
+
+
+if __name__ == '__main__':
+    main()
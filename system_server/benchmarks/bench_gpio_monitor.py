@@ -0,0 +1,118 @@
+"""
+CPU cost of GPIO input monitoring: the old 1 ms list-building loop vs EdgeMonitor.
+
+Runs each for --seconds against the fake gpio.so with the pins idle (the
+common case on a line between parts), optionally pressing a pin every
+--press-ms, and reports samples/sec and the CPU used by the sampler thread.
+
+    python3 benchmarks/bench_gpio_monitor.py --seconds 5
+    python3 benchmarks/bench_gpio_monitor.py --seconds 5 --interrupts
+
+On the device, pass --real to read the actual gpio.so instead.
+"""
+import argparse
+import ctypes
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'gpio')))
+
+from edge_monitor import EdgeMonitor
+from fake_gpio import FakeGpioLib, GPIO_State
+
+
+def legacy_loop(lib, stop, counters):
+    """The old GPIO.run loop body, minus the mongo/socket work done on changes"""
+    current_output_state = None
+    last_pin_state = None
+    start = time.thread_time()
+    while not stop.is_set():
+        lib.read_all_gpio_states.restype = GPIO_State
+        c_gpio_state = lib.read_all_gpio_states()
+        gpio_state = {'inputs': [(c_gpio_state.inputs >> i) & 1 for i in range(8)],
+                      'outputs': [(c_gpio_state.outputs >> i) & 1 for i in range(8)]}
+        all_output_state = gpio_state['outputs']
+        all_pin_state = gpio_state['inputs']
+        if current_output_state != all_output_state:
+            current_output_state = all_output_state[:]
+        if 0 in all_pin_state:
+            all_pin_state.index(0)
+        if last_pin_state != all_pin_state:
+            last_pin_state = all_pin_state[:]
+            counters['edges'] += 1
+        counters['samples'] += 1
+        time.sleep(.001)
+    counters['cpu'] = time.thread_time() - start
+
+
+def presser(lib, stop, press_ms):
+    while press_ms and not stop.wait(press_ms / 1000):
+        lib.press(1)
+        time.sleep(0.02)
+        lib.release(1)
+
+
+def run_legacy(lib, seconds, press_ms):
+    stop, counters = threading.Event(), {'samples': 0, 'edges': 0}
+    threads = [threading.Thread(target=legacy_loop, args=(lib, stop, counters)),
+               threading.Thread(target=presser, args=(lib, stop, press_ms))]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {'backend': 'legacy', 'samples': counters['samples'], 'edges': counters['edges'],
+            'sample_rate_hz': round(counters['samples'] / seconds, 1),
+            'cpu_percent': round(100 * counters['cpu'] / seconds, 2)}
+
+
+def run_edge(lib, seconds, press_ms, interrupts):
+    def read():
+        state = lib.read_all_gpio_states()
+        return state.inputs | state.outputs << 8
+
+    def wait(timeout):
+        state = lib.wait_gpio_change(int(timeout * 1000))
+        return state.inputs | state.outputs << 8
+
+    monitor = EdgeMonitor(read, lambda state, changed: None, wait=wait if interrupts else None)
+    stop = threading.Event()
+    pressing = threading.Thread(target=presser, args=(lib, stop, press_ms))
+    monitor.start()
+    pressing.start()
+    time.sleep(seconds)
+    stats = monitor.stats()
+    stop.set()
+    monitor.stop()
+    pressing.join()
+    return stats
+
+
+def load_real_gpio():
+    lib = ctypes.CDLL(os.environ['HOME'] + '/flex-run/system_server/gpio/gpio.so')
+    lib.read_all_gpio_states.restype = GPIO_State
+    lib.press = lib.release = lambda pin: None
+    return lib
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--press-ms', type=float, default=0, help='press GPI1 this often, 0 keeps the pins idle')
+    parser.add_argument('--interrupts', action='store_true', help='give the fake library wait_gpio_change')
+    parser.add_argument('--real', action='store_true', help='read the board through gpio.so')
+    args = parser.parse_args()
+
+    new_lib = load_real_gpio if args.real else lambda: FakeGpioLib(interrupts=args.interrupts)
+    results = [run_legacy(new_lib(), args.seconds, args.press_ms),
+               run_edge(new_lib(), args.seconds, args.press_ms, args.interrupts and not args.real)]
+    for stats in results:
+        print(f"{stats['backend']:>9}: {stats['sample_rate_hz']:8.1f} samples/sec, "
+              f"{stats['edges']} dispatches, {stats['cpu_percent']:.2f}% CPU")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark: job_watcher sweep, per-job lookups vs pipelined bulk lookups.
+
+Seeds tracked jobs (half finished, a tenth failed, the rest queued) into a
+scratch redis db and a scratch mongo database, then times one sweep of the
+old per-job loop (fetch_job + get_status + delete_one per job) against
+job_watcher.reconcile(). Every tick starts from a freshly seeded state.
+Neither the fvonprem database nor redis db 0 is touched.
+
+Usage (on the device, from system_server/):
+    python3 benchmarks/bench_job_watcher.py [--jobs 10000] [--ticks 3]
+    python3 benchmarks/bench_job_watcher.py --fake    # fakeredis + mongomock
+
+--fake has no network round trips and mongomock scans every document per
+update, so it understates the gain; use it only where redis/mongo are not
+available (about 2x at 1000 jobs on a dev machine).
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rq import Queue
+from rq.job import Job
+from rq.registry import FinishedJobRegistry
+
+import job_watcher
+
+BENCH_DB    = 'fvonprem_bench'
+BENCH_REDIS = 15
+BENCH_QUEUE = 'bench'
+
+
+def connect(fake):
+    if fake:
+        import fakeredis
+        import mongomock
+        redis_con = fakeredis.FakeStrictRedis()
+        # rq checks the server version, which fakeredis does not report
+        redis_con.info = lambda *args: {'redis_version': '6.2.0'}
+        return redis_con, mongomock.MongoClient()
+    from redis import Redis
+    from pymongo import MongoClient
+    return Redis('localhost', 6379, db=BENCH_REDIS), MongoClient("172.17.0.1")
+
+
+def seed(redis_con, db, num_jobs):
+    redis_con.flushdb()
+    db['jobs'].drop()
+    db['failed_jobs'].drop()
+
+    queue    = Queue(BENCH_QUEUE, connection=redis_con)
+    finished = FinishedJobRegistry(BENCH_QUEUE, connection=redis_con)
+    docs = []
+    with redis_con.pipeline() as pipe:
+        for i in range(num_jobs):
+            job = Job.create('builtins.print', args=('x',), connection=redis_con,
+                             id=str(uuid.uuid4()), origin=BENCH_QUEUE)
+            if i % 10 < 5:
+                job.set_status('finished', pipeline=pipe)
+                finished.add(job, -1, pipeline=pipe)
+            elif i % 10 == 5:
+                job.set_status('failed', pipeline=pipe)
+            else:
+                job.set_status('queued', pipeline=pipe)
+                queue.push_job_id(job.id, pipeline=pipe)
+            job.save(pipeline=pipe)
+            docs.append({'_id': job.id, 'type': 'bench_job', 'status': 'running'})
+        pipe.execute()
+    db['jobs'].insert_many(docs)
+
+
+def legacy_tick():
+    """The watcher loop body before bulk lookups"""
+    for job in job_watcher.job_collection.find():
+        j = job_watcher.job_queue.fetch_job(job['_id'])
+        if not j: continue
+        if j and j.get_status() == 'finished':
+            job_watcher.job_collection.delete_one({'_id': job['_id']})
+            j.delete()
+        elif j.get_status() == 'failed':
+            job_watcher.insert_failed_job(j)
+            job_watcher.job_collection.delete_one({'_id': job['_id']})
+        elif j.get_status() != 'started':
+            msg = 'job_'+j.id+'_'+j.get_status()
+            job_watcher.job_collection.update_one({'_id': job['_id']}, {'$set': {'type': msg}})
+
+
+def run_mode(name, tick, redis_con, db, num_jobs, ticks):
+    job_watcher.redis_con      = redis_con
+    job_watcher.job_queue      = Queue(BENCH_QUEUE, connection=redis_con)
+    job_watcher.job_collection = db['jobs']
+    job_watcher.failed_jobs    = db['failed_jobs']
+
+    timings = []
+    for _ in range(ticks):
+        seed(redis_con, db, num_jobs)
+        start = time.perf_counter()
+        tick()
+        timings.append(time.perf_counter() - start)
+
+    remaining = db['jobs'].count_documents({})
+    avg = sum(timings) / len(timings)
+    print(f"{name:>9}: avg {avg * 1000:.1f} ms/tick over {ticks} ticks, "
+          f"{remaining} jobs still tracked after the last tick")
+    return avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=3)
+    parser.add_argument('--fake', action='store_true', help='use fakeredis and mongomock')
+    args = parser.parse_args()
+
+    redis_con, client = connect(args.fake)
+    db = client[BENCH_DB]
+
+    print(f"Tracking {args.jobs} jobs per tick")
+    legacy_avg = run_mode('per-job', legacy_tick, redis_con, db, args.jobs, args.ticks)
+    bulk_avg   = run_mode('pipelined', job_watcher.reconcile, redis_con, db, args.jobs, args.ticks)
+    print(f"speedup: {legacy_avg / bulk_avg:.1f}x per tick")
+
+    redis_con.flushdb()
+    client.drop_database(BENCH_DB)
+
+
+if __name__ == '__main__':
+    main()
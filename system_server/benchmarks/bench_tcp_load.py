@@ -0,0 +1,93 @@
+"""
+Load test: N simulated PLC clients against the TCP command server.
+
+Each client opens its own connection and sends --commands commands one
+after another, waiting for every response, like a PLC does. Reports
+commands/sec across all clients and p50/p99 latency per command.
+
+Against the running server on the device (GPIread is safe, it only reads):
+    python3 benchmarks/bench_tcp_load.py --clients 8 --commands 200 --command GPIread
+
+Without a device, --self-test serves a stub handler that takes
+--service-ms per command in-process, to compare server implementations:
+    python3 benchmarks/bench_tcp_load.py --self-test --clients 8 --service-ms 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tcp')))
+
+
+async def run_client(host, port, command, num_commands, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(num_commands):
+            start = time.perf_counter()
+            writer.write(command)
+            await writer.drain()
+            if not await reader.read(65536):
+                raise ConnectionError('server closed the connection')
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_load(host, port, command, clients, num_commands):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, command, num_commands, latencies)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{clients} clients x {num_commands} commands: {len(latencies)} responses in {elapsed:.2f} s")
+    print(f"throughput: {len(latencies) / elapsed:.0f} commands/sec")
+    print(f"latency: p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+
+
+async def self_test(args):
+    from command_server import CommandServer
+
+    def handle_command(session, data):
+        time.sleep(args.service_ms / 1000)
+        return b'ok\n'
+
+    server = CommandServer(handle_command, host='127.0.0.1', port=0, max_workers=args.workers)
+    await server.start()
+    try:
+        await run_load('127.0.0.1', server.port, args.command.encode('utf-8'), args.clients, args.commands)
+    finally:
+        server.server.close()
+        await server.server.wait_closed()
+        server.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5300)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--commands', type=int, default=100, help='commands per client')
+    parser.add_argument('--command', default='GPIread')
+    parser.add_argument('--self-test', action='store_true', help='serve a stub handler in-process')
+    parser.add_argument('--service-ms', type=float, default=10, help='stub handler time per command')
+    parser.add_argument('--workers', type=int, default=8, help='stub server thread pool size')
+    args = parser.parse_args()
+
+    if args.self_test:
+        asyncio.run(self_test(args))
+    else:
+        asyncio.run(run_load(args.host, args.port, args.command.encode('utf-8'), args.clients, args.commands))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Edge-driven GPIO monitoring.
+
+EdgeMonitor samples the pins as one integer bitmask, XORs it with the last
+stable state and calls on_edges(state, changed) only when a bit actually
+changed, so nothing is rebuilt or written while the pins are idle.
+
+Backends:
+    poll       read() every interval seconds
+    interrupt  wait(timeout) blocks in the driver until an input changes
+               (gpio.so builds that export wait_gpio_change); used whenever
+               one is given, polling only while a debounce is pending
+
+Debounce is per bit, in seconds: a changed bit has to read the same for
+that long before its edge is dispatched. stats() reports the sampling rate
+and the CPU time used by the sampler thread.
+"""
+import threading
+import time
+
+
+class EdgeMonitor(object):
+    def __init__(self, read, on_edges, wait=None, bits=16, interval=0.001, debounce=None,
+                 idle_timeout=0.5):
+        self.read         = read
+        self.on_edges     = on_edges
+        self.wait         = wait
+        self.mask         = (1 << bits) - 1
+        self.interval     = interval
+        self.debounce     = debounce or {}  # bit -> seconds
+        self.idle_timeout = idle_timeout
+        self.state        = None
+        self.pending      = {}  # bit -> when its new value was first read
+        self.samples      = 0
+        self.edges        = 0
+        self.cpu_seconds  = 0.0
+        self.started_at   = None
+        self.stopped      = threading.Event()
+        self.thread       = None
+
+    @property
+    def backend(self):
+        return 'interrupt' if self.wait else 'poll'
+
+    def sample(self, raw, now=None):
+        """Process one reading; returns the bits dispatched as edges"""
+        now = time.monotonic() if now is None else now
+        self.samples += 1
+        if self.state is None:
+            # first reading, everything is new to the caller
+            self.state = raw
+            self._dispatch(self.mask)
+            return self.mask
+
+        changed = raw ^ self.state
+        for bit in list(self.pending):
+            if not changed >> bit & 1:
+                # bounced back before the debounce passed
+                del self.pending[bit]
+
+        accepted = 0
+        remaining = changed
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            bit = low.bit_length() - 1
+            delay = self.debounce.get(bit)
+            if delay:
+                if now - self.pending.setdefault(bit, now) < delay:
+                    continue
+                del self.pending[bit]
+            accepted |= low
+
+        if accepted:
+            self.state ^= accepted
+            self._dispatch(accepted)
+        return accepted
+
+    def _dispatch(self, changed):
+        self.edges += 1
+        try:
+            self.on_edges(self.state, changed)
+        except Exception as error:
+            print('edge handler failed', error)
+
+    def run(self):
+        self.started_at = time.monotonic()
+        cpu_start = time.thread_time()
+        self.sample(self.read())
+        while not self.stopped.is_set():
+            if self.wait and not self.pending:
+                raw = self.wait(self.idle_timeout)
+            else:
+                time.sleep(self.interval)
+                raw = self.read()
+            self.sample(raw)
+            self.cpu_seconds = time.thread_time() - cpu_start
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            'backend':          self.backend,
+            'samples':          self.samples,
+            'edges':            self.edges,
+            'sample_rate_hz':   round(self.samples / elapsed, 1) if elapsed else 0,
+            'cpu_percent':      round(100 * self.cpu_seconds / elapsed, 2) if elapsed else 0,
+            'pending_debounce': len(self.pending),
+        }
@@ -0,0 +1,77 @@
+"""
+Stand-in for gpio.so, for running the GPIO code without the board.
+
+FakeGpioLib exposes the same functions as the CDLL (set_gpio, read_gpi,
+read_gpo, read_all_gpio_states), and wait_gpio_change when interrupts is
+set, so it can be dropped in wherever `functions` is used. Pins read like
+the board: inputs idle high and read low while triggered, outputs read low
+while on. gpio_helper loads it instead of gpio.so when FV_FAKE_GPIO is set.
+
+    lib = FakeGpioLib()
+    lib.press(3)     # GPI3 triggered
+    lib.release(3)
+"""
+import ctypes
+import threading
+
+
+class GPIO_State(ctypes.Structure):
+    _fields_ = [
+        ("inputs", ctypes.c_ubyte),
+        ("outputs", ctypes.c_ubyte)
+    ]
+
+
+class _Function(object):
+    """Callable with the restype/argtypes attributes callers set on ctypes functions"""
+    def __init__(self, fn):
+        self.fn       = fn
+        self.restype  = None
+        self.argtypes = None
+        self.calls    = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.fn(*args)
+
+
+class FakeGpioLib(object):
+    def __init__(self, inputs=0xff, outputs=0xff, interrupts=False):
+        self.inputs  = inputs
+        self.outputs = outputs
+        self.changed = threading.Condition()
+        self.set_gpio             = _Function(self._set_gpio)
+        self.set_gpo              = _Function(lambda pin, value: self._set_gpio(1, pin, value))
+        self.read_gpi             = _Function(lambda pin: pin if self.inputs >> (pin - 1) & 1 else 0)
+        self.read_gpo             = _Function(lambda pin: self.outputs >> (pin - 1) & 1)
+        self.read_all_gpio_states = _Function(self._read_all)
+        if interrupts:
+            self.wait_gpio_change = _Function(self._wait_change)
+
+    def press(self, pin):
+        self._set_inputs(self.inputs & ~(1 << (pin - 1)))
+
+    def release(self, pin):
+        self._set_inputs(self.inputs | 1 << (pin - 1))
+
+    def _set_inputs(self, inputs):
+        with self.changed:
+            self.inputs = inputs & 0xff
+            self.changed.notify_all()
+
+    def _set_gpio(self, direction, pin, value):
+        if direction != 1:
+            return -1
+        bit = 1 << (pin - 1)
+        self.outputs = self.outputs | bit if value else self.outputs & ~bit
+        return 0
+
+    def _read_all(self):
+        return GPIO_State(self.inputs, self.outputs)
+
+    def _wait_change(self, timeout_ms):
+        """Block until the inputs change or timeout_ms passes, then read all pins"""
+        with self.changed:
+            inputs = self.inputs
+            self.changed.wait_for(lambda: self.inputs != inputs, timeout_ms / 1000)
+        return self._read_all()
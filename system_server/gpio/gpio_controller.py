@@ -1,5 +1,6 @@
 import threading
 import os
+import sys
 import time
 import requests
 from ctypes import *
@@ -9,6 +10,13 @@ import string
 import json
 from bson import json_util, ObjectId
 from gpio_helper import *
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.capture_client import CaptureClient
+from utils.config_cache import ConfigCache
+from utils.pin_state import PinState
+from edge_monitor import EdgeMonitor
+from pin_store import PinStateStore
+from inference_pool import InferencePool
 
 # Import Flask and Flask-SocketIO
 from flask import Flask, jsonify, request
@@ -24,10 +32,52 @@ io_ref   = client["fvonprem"]["io_presets"]
 util_ref = client["fvonprem"]["utils"]
 pin_state_ref = client["fvonprem"]["pin_state"]
 pass_fail_ref = client["fvonprem"]["pass_fail"]
+config_ref    = client["fvonprem"]["io_configs"]
+
+# --- Capture Backend ---
+INFERENCE_WORKERS  = 4  # presets predicted at once across all triggers, gpio_config 'inference_workers'
+INFERENCE_QUEUE    = 4  # triggers waiting per preset, gpio_config 'inference_queue'
+INFERENCE_OVERFLOW = 'drop_oldest'  # or drop_newest / coalesce, gpio_config 'inference_overflow'
+CACHE_TTL          = 30  # seconds cached presets/token are trusted without a change stream
+capture = CaptureClient(pool_size=INFERENCE_WORKERS, timeout=2)
+
+def load_presets():
+    """GPI presets by ioVal, e.g. {'GPI3': [preset, ...]}"""
+    presets = {}
+    for preset in io_ref.find({'ioVal': {'$regex': '^GPI'}}):
+        presets.setdefault(preset['ioVal'], []).append(preset)
+    return presets
+
+cache = ConfigCache(ttl=CACHE_TTL)
+cache.register('presets', io_ref, load_presets)
+cache.register('id_token', util_ref, lambda: util_ref.find_one({'type': 'id_token'}, {'_id': 0}))
+
+# --- Input Monitoring ---
+POLL_INTERVAL = .001  # seconds between reads when the driver has no wait_gpio_change
+INPUT_MASK    = 0xff  # read_gpio_mask: inputs in the low byte, outputs in the high byte
+PIN_STATE_FLUSH     = .05  # seconds pin changes are collected into one pin_state write
+PIN_STATE_EMIT_RATE = 10   # max pin_state_update events per second
+RESULT_HOLD         = .3   # seconds GPIx stays on in the UI after its inference finished
+
+def load_gpio_config():
+    return config_ref.find_one({'type': 'gpio_config'}) or {}
+
+def load_debounce():
+    """Per pin debounce from the gpio_config document, e.g. {'debounce_ms': {'GPI1': 5}}"""
+    config = load_gpio_config()
+    debounce = {}
+    for pin, ms in (config.get('debounce_ms') or {}).items():
+        if pin.startswith('GPI'):
+            debounce[int(pin[3:]) - 1] = ms / 1000
+        elif pin.startswith('GPO'):
+            debounce[int(pin[3:]) + 7] = ms / 1000
+    return debounce
 
 # --- GPIO Library Loading ---
 so_file = os.environ.get('HOME', '') + "/flex-run/system_server/gpio/gpio.so"
-if not os.path.exists(so_file):
+if os.environ.get('FV_FAKE_GPIO'):
+    pass # gpio_helper loaded the fake library into functions
+elif not os.path.exists(so_file):
     print(f"GPIO shared library not found at: {so_file}. Please ensure it's correctly built and located.")
     functions = None
 else:
@@ -47,36 +97,35 @@ def ms_timestamp():
 class GPIO:
     def __init__(self):
         self.state_query      = {'type': 'gpio_pin_state'}
-        self.cur_pin_state    = pin_state_ref.find_one(self.state_query)
-        if not self.cur_pin_state:
-            self.cur_pin_state = {
-                'GPO1': False, 'GPO2': False, 'GPO3': False, 'GPO4': False,
-                'GPO5': False, 'GPO6': False, 'GPO7': False, 'GPO8': False,
-                'GPI1': False, 'GPI2': False, 'GPI3': False, 'GPI4': False,
-                'GPI5': False, 'GPI6': False, 'GPI7': False, 'GPI8': False,
-            }
-            pin_state_ref.insert_one(self.cur_pin_state)
-        else:
-            del self.cur_pin_state['_id']
-            del self.cur_pin_state['type']
+        stored = pin_state_ref.find_one(self.state_query, {'_id': 0, 'type': 0})
+        pins   = PinState.from_dict(stored or {})
+        if not stored:
+            pin_state_ref.update_one(self.state_query, {'$set': pins.as_dict()}, True)
+        # what the UI shows: the board's pins plus GPIx held on while its inference runs
+        config     = load_gpio_config()
+        self.store = PinStateStore(pins, self._persist_pin_changes, self._emit_pin_state_update,
+                                   flush_interval=config.get('pin_state_flush_ms', PIN_STATE_FLUSH * 1000) / 1000,
+                                   max_emit_rate=config.get('pin_state_emit_rate', PIN_STATE_EMIT_RATE))
+        self.store.start()
+        self.pool  = InferencePool(self.run_inference,
+                                   workers=config.get('inference_workers', INFERENCE_WORKERS),
+                                   queue_size=config.get('inference_queue', INFERENCE_QUEUE),
+                                   overflow=config.get('inference_overflow', INFERENCE_OVERFLOW))
+        self.pool.start()
 
         self.last_input_state = "wait"
-        self.debounce_delay   = .001
-        self.last_pin_state   = None 
+        self.monitor          = None
         self.set_gpio_func = functions.set_gpio
         self.read_gpi_func = functions.read_gpi
         self.read_gpo_func = functions.read_gpo
-        self.current_output_state = [
-            self.read_gpo_func(1),
-            self.read_gpo_func(2),
-            self.read_gpo_func(3),
-            self.read_gpo_func(4),
-            self.read_gpo_func(5),
-            self.read_gpo_func(6),
-            self.read_gpo_func(7),
-            self.read_gpo_func(8)
-        ]
 
+    @property
+    def pins(self):
+        return self.store.pins
+
+    @property
+    def cur_pin_state(self):
+        return self.store.pins.as_dict()
 
     def _set_gpio(self, direction, pin_index, value):
         """Wrapper for set_gpio with error handling."""
@@ -97,15 +146,13 @@ class GPIO:
         if not data: return False
         return data[0]
 
-    def run_inference(self, preset, pin):
+    def run_inference(self, preset, pin, triggered_at=None):
         cameraId, modelName, modelVersion = preset['cameraId'], preset['modelName'], preset['modelVersion']
         ioVal, presetId                   = preset['ioVal'], preset['presetId']
         server = preset['server'] if 'server' in preset else 'vision'
 
-        res     = util_ref.find_one({'type': 'id_token'}, {'_id': 0})
-        token   = res['token']
+        token   = cache.get('id_token')['token']
         host    = 'http://172.17.0.1'
-        port    = '5000'
         path    = '/api/capture/predict/snap/'+str(modelName)+'/'+str(modelVersion)+'/'+str(cameraId)+'?workstation='+str(ioVal)+'&preset_id='+str(presetId)
 
         if server == 'thermal':
@@ -115,26 +162,29 @@ class GPIO:
             t_url     = host+':'+tport+tpath
             headers = {'Authorization': 'Bearer '+ token}
             try:
-                t_res  = requests.get(t_url, headers=headers, timeout=2)
+                t_res  = capture.get(t_url, headers=headers)
                 data = t_res.json()
 
                 path = '/api/capture/predict/single_inference/1/1?preset_id='+str(presetId)
-                url  = host+':'+port+path
-                res  = requests.put(url, json=data, headers=headers, timeout=2)
+                res  = capture.put(path, json=data, headers=headers)
 
             except Exception as error:
                 print(error)
                 return
 
         else:
-            url     = host+':'+port+path
             headers = {'Authorization': 'Bearer '+ token}
             try:
-                res  = requests.get(url, headers=headers, timeout=2)
+                res  = capture.get(path, headers=headers)
             except Exception as error:
                 print(error)
                 return
 
+        if triggered_at is not None:
+            capture.latency.record('trigger', time.perf_counter() - triggered_at)
+        if res.status_code == 401:
+            # reread the token on the next trigger
+            cache.invalidate(['id_token'])
         if res.status_code == 200:
             data = res.json()
             print(data, '-----------------------')
@@ -143,20 +193,10 @@ class GPIO:
 
 
     def pin_switch_inference_start(self, pin):
-        self.cur_pin_state['GPI'+str(pin)] = True 
-        self.cur_pin_state = pin_state_ref.find_one(self.state_query) or self.cur_pin_state
-        pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-        self._emit_pin_state_update() 
+        self.store.update(lambda pins: pins.with_pin('GPI'+str(pin), True))
 
     def pin_switch_inference_end(self, pin):
-        pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-        self._emit_pin_state_update()
-
-        time.sleep(.3)
-        self.cur_pin_state['GPI'+str(pin)] = False 
-        self.cur_pin_state = pin_state_ref.find_one(self.state_query) or self.cur_pin_state
-        pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-        self._emit_pin_state_update() 
+        self.store.update(lambda pins: pins.with_pin('GPI'+str(pin), False), delay=RESULT_HOLD)
 
     def allow_inference(self, cur_input_state_high, pin_num):
         run_inference = False
@@ -169,75 +209,49 @@ class GPIO:
     def default_pin_state(self):
         for gpo in range(1,9):
             self._set_gpio(1, gpo, 1)
-            self.cur_pin_state['GPO'+str(gpo)] = False 
-        for gpi in range(1,9):
-            self.cur_pin_state['GPI'+str(gpi)] = False
+        self.store.update(lambda pins: PinState())
 
-        self.cur_pin_state = pin_state_ref.find_one(self.state_query) or self.cur_pin_state
-        pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-        self._emit_pin_state_update() # Emit update to frontend
+    def _persist_pin_changes(self, changes):
+        pin_state_ref.update_one(self.state_query, {'$set': changes}, True)
 
-    def _emit_pin_state_update(self):
+    def _emit_pin_state_update(self, pins=None):
         """Emits the current pin state to connected SocketIO clients."""
         try:
-            if '_id' in self.cur_pin_state:
-                del self.cur_pin_state['_id']
-                del self.cur_pin_state['type']
-
-            socketio.emit('pin_state_update', self.cur_pin_state, namespace='/gpio')
+            socketio.emit('pin_state_update', (pins or self.pins).as_dict(), namespace='/gpio')
         except Exception as e:
             print(f"Error emitting SocketIO event: {e}")
 
-    def update_pin_state(self, i_o, pins):
-        for pin, state in enumerate(pins):
-            self.cur_pin_state[f'GP{i_o}{pin+1}'] = state == 0
+    def handle_edges(self, state, changed):
+        """EdgeMonitor callback, only called when a pin changed"""
+        board = PinState.from_mask(state)
+        if changed & ~INPUT_MASK:
+            print("Output state changed:", board.to_json()['outputs'])
+        # take the changed pins from the board, keep the rest as shown
+        self.store.update(lambda pins: PinState.from_mask(pins.mask & ~changed | state & changed))
+
+        if not changed & INPUT_MASK:
+            return
+        triggered = board.triggered()
+        if not triggered:
+            self.last_input_state = "wait"
+        elif self.allow_inference(0, triggered[0]):
+            # the lowest triggered pin runs
+            cur_pin = triggered[0]
+            triggered_at = time.perf_counter()
+            self.pin_switch_inference_start(cur_pin)
+            presets = cache.get_nowait('presets').get('GPI'+str(cur_pin), [])
+            queued = [self.pool.submit(preset['presetId'], preset, cur_pin, triggered_at) for preset in presets]
+            if not any(queued):
+                self.pin_switch_inference_end(cur_pin)
 
     def run(self):
         self.default_pin_state()
-        print("GPIO monitoring thread started.")
-        while True:
-            cur_pin = None
-
-            gpio_state = read_all_gpio_states_as_json()
-            all_output_state = gpio_state['outputs']
-            all_pin_state = gpio_state['inputs']
-
-            if self.current_output_state != all_output_state:
-                self.current_output_state = all_output_state[:]
-                self.update_pin_state('O', all_output_state)
-                print("Output state changed:", all_output_state)
-                self._emit_pin_state_update()
-
-            if 0 in all_pin_state:
-                cur_pin = all_pin_state.index(0) + 1 
-                if self.last_pin_state != all_pin_state:
-                    self.last_pin_state = all_pin_state[:] 
-                    self.update_pin_state('I', all_pin_state)
-                    self._emit_pin_state_update()
-
-                if self.allow_inference(0, cur_pin):
-                    self.pin_switch_inference_start(cur_pin)
-                    query = {'ioVal': 'GPI'+str(cur_pin)}
-                    presets = io_ref.find(query)
-                    for preset in presets:
-                        inference_thread = threading.Thread(target=self.run_inference, args=(preset, cur_pin), daemon=True)
-                        inference_thread.start()
-            else:
-                if self.last_input_state == "run":
-                    self.last_input_state = "wait"
-                    for i in range(1, 9):
-                        self.cur_pin_state[f'GPI{i}'] = (all_pin_state[i-1] == 0) # Update based on actual read
-                    pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-                    self._emit_pin_state_update()
-
-                if self.last_pin_state != all_pin_state:
-                    self.last_pin_state = all_pin_state[:]
-                    for i in range(1, 9):
-                        self.cur_pin_state[f'GPI{i}'] = (all_pin_state[i-1] == 0)
-                    pin_state_ref.update_one(self.state_query, {'$set': self.cur_pin_state}, True)
-                    self._emit_pin_state_update()
-
-            time.sleep(self.debounce_delay) 
+        # edges read presets with get_nowait, load them before the first one
+        cache.warm(['presets', 'id_token'])
+        self.monitor = EdgeMonitor(read_gpio_mask, self.handle_edges, wait=gpio_change_waiter(),
+                                   interval=POLL_INTERVAL, debounce=load_debounce())
+        print("GPIO monitoring thread started,", self.monitor.backend, "backend")
+        self.monitor.run()
 
 
 
@@ -251,9 +265,26 @@ def handle_connect():
 def handle_disconnect():
     print('Client disconnected from /gpio namespace')
 
+@app.route('/monitor_stats', methods=['GET'])
+def monitor_stats():
+    """Input sampling rate, edges seen and the sampler's CPU use"""
+    monitor = getattr(init_gpio, 'monitor', None)
+    return jsonify(monitor.stats() if monitor else {})
+
+@app.route('/inference_stats', methods=['GET'])
+def inference_stats():
+    """Inference queue depth per preset, running jobs and drop counts"""
+    return jsonify(init_gpio.pool.stats())
+
+@app.route('/latency', methods=['GET'])
+def latency():
+    """Trigger latency histograms (connect, predict, trigger) in ms"""
+    return jsonify(capture.latency.snapshot())
+
 
 # --- Main Execution ---
 if __name__ == '__main__':
+    cache.start_watching(client['fvonprem'])
     gpio_thread = threading.Thread(target=init_gpio.run, daemon=True)
     gpio_thread.start()
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import threading
 import time
 import requests
@@ -8,6 +9,8 @@ from ctypes import *
 from pymongo import MongoClient
 import datetime
 import string
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pin_state import PinState
 
 client   = MongoClient("172.17.0.1")
 io_ref   = client["fvonprem"]["io_presets"]
@@ -15,7 +18,12 @@ util_ref = client["fvonprem"]["utils"]
 pin_state_ref = client["fvonprem"]["pin_state"]
 
 so_file = os.environ['HOME']+"/flex-run/system_server/gpio/gpio.so"
-functions = CDLL(so_file)
+if os.environ.get('FV_FAKE_GPIO'):
+    # no board, see fake_gpio.py
+    from fake_gpio import FakeGpioLib
+    functions = FakeGpioLib(interrupts=os.environ.get('FV_FAKE_GPIO') == 'interrupts')
+else:
+    functions = CDLL(so_file)
 
 #(<direction>,<pin_index>,<value>)
 # direction - IN  = 0
@@ -30,15 +38,13 @@ def read_pin(pin_num):
 
 def toggle_pin(pin_num):
     query = {'type':'gpio_pin_state'}
-    cur_pin_state = pin_state_ref.find_one(query)
     pin_key       = 'GPO'+str(pin_num)
+    cur_pin_state = pin_state_ref.find_one(query, {pin_key: 1})
     if cur_pin_state[pin_key]:
-        cur_pin_state[pin_key] = False
         functions.set_gpio(1, int(pin_num), 1)
     else:
-        cur_pin_state[pin_key] = True
         functions.set_gpio(1, int(pin_num), 0)
-    pin_state_ref.update_one(query, {'$set': cur_pin_state}, True)
+    pin_state_ref.update_one(query, {'$set': {pin_key: not cur_pin_state[pin_key]}}, True)
 
 def set_pin_state(pin_num, state):
     query = {'type':'gpio_pin_state'}
@@ -62,20 +68,34 @@ class GPIO_State(ctypes.Structure):
     ]
 
 
-def read_all_gpio_states_as_json():
+def read_gpio_mask():
+    """All pins in one int: inputs in the low byte, outputs in the high byte"""
+    return read_pin_state().mask
+
+
+def gpio_change_waiter():
+    """Blocking wait(timeout) for the next input change, if this gpio.so build exports
+    wait_gpio_change(timeout_ms); returns None when only polling is available"""
     try:
-        functions.read_all_gpio_states.restype = GPIO_State
-        c_gpio_state = functions.read_all_gpio_states()
+        wait_gpio_change = functions.wait_gpio_change
+    except AttributeError:
+        return None
+    wait_gpio_change.restype  = GPIO_State
+    wait_gpio_change.argtypes = [ctypes.c_int]
 
-        inputs = [(c_gpio_state.inputs >> i) & 1 for i in range(8)]
-        outputs = [(c_gpio_state.outputs >> i) & 1 for i in range(8)]
+    def wait(timeout):
+        return PinState.from_c(wait_gpio_change(int(timeout * 1000))).mask
+    return wait
 
-        gpio_data = {
-            "inputs": inputs,
-            "outputs": outputs
-        }
 
-        return gpio_data
+def read_pin_state():
+    functions.read_all_gpio_states.restype = GPIO_State
+    return PinState.from_c(functions.read_all_gpio_states())
+
+
+def read_all_gpio_states_as_json():
+    try:
+        return read_pin_state().to_json()
 
     except OSError as e:
         error_message = {
@@ -0,0 +1,130 @@
+"""
+Bounded worker pool for GPIO-triggered inference.
+
+Each preset gets its own queue of at most queue_size jobs, and a preset
+has at most one job running, so a chattering input can't pile up
+requests against the same camera. A fixed number of worker threads take
+turns across the presets that have work.
+
+When a preset's queue is full the overflow policy decides what goes:
+
+    drop_oldest  - the longest waiting job, the new trigger is kept
+    drop_newest  - the new trigger
+    coalesce     - a preset keeps one waiting job, replaced by each new trigger
+
+stats() reports queue depths and drop counts for the /inference_stats route.
+"""
+import threading
+from collections import deque
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+COALESCE    = 'coalesce'
+POLICIES    = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+
+class InferencePool(object):
+    def __init__(self, run, workers=4, queue_size=4, overflow=DROP_OLDEST):
+        if overflow not in POLICIES:
+            raise ValueError('unknown overflow policy ' + str(overflow))
+        self.run        = run
+        self.workers    = workers
+        self.queue_size = 1 if overflow == COALESCE else max(1, queue_size)
+        self.overflow   = overflow
+        self.queues     = {}       # key -> deque of waiting args
+        self.ready      = deque()  # keys with waiting jobs and nothing running
+        self.scheduled  = set()    # keys in ready, so a key is never queued twice
+        self.running    = set()
+        self.dropped    = {}       # key -> jobs dropped on overflow
+        self.submitted  = 0
+        self.completed  = 0
+        self.failed     = 0
+        self.stopped    = False
+        self.cond       = threading.Condition()
+        self.threads    = []
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self.threads
+
+    def stop(self, timeout=None):
+        """Drop waiting jobs and wait for the running ones to finish"""
+        with self.cond:
+            self.stopped = True
+            self.queues.clear()
+            self.ready.clear()
+            self.scheduled.clear()
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def submit(self, key, *args):
+        """Queue run(*args) behind key's earlier jobs; False if the job was dropped"""
+        with self.cond:
+            if self.stopped:
+                return False
+            self.submitted += 1
+            queue = self.queues.setdefault(key, deque())
+            if len(queue) >= self.queue_size:
+                self.dropped[key] = self.dropped.get(key, 0) + 1
+                if self.overflow == DROP_NEWEST:
+                    return False
+                queue.popleft()
+            queue.append(args)
+            self._schedule(key)
+            return True
+
+    def _schedule(self, key):
+        # caller holds self.cond
+        if key in self.scheduled or key in self.running:
+            return
+        self.scheduled.add(key)
+        self.ready.append(key)
+        self.cond.notify()
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.ready and not self.stopped:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                key = self.ready.popleft()
+                self.scheduled.discard(key)
+                queue = self.queues.get(key)
+                if not queue:
+                    continue
+                args = queue.popleft()
+                self.running.add(key)
+            failed = False
+            try:
+                self.run(*args)
+            except Exception as error:
+                failed = True
+                print('inference failed for', key, error)
+            with self.cond:
+                self.running.discard(key)
+                self.completed += 1
+                self.failed += failed
+                if self.queues.get(key):
+                    self._schedule(key)
+
+    def stats(self):
+        with self.cond:
+            depths = {str(key): len(queue) for key, queue in self.queues.items()}
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'overflow': self.overflow,
+                'running': len(self.running),
+                'queued': sum(depths.values()),
+                'queue_depth': depths,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': sum(self.dropped.values()),
+                'dropped_by_preset': {str(key): count for key, count in self.dropped.items()},
+            }
@@ -0,0 +1,121 @@
+"""
+Write-behind store for the GPIO pin state shown in the UI.
+
+The state lives in memory; callers change it with update(fn), which
+returns straight away. A background thread waits flush_interval after
+the first change so later changes land in the same write, then hands the
+pins that differ from what was last stored to persist(changes) as one
+$set, and the latest state to emit(pins). Emits are limited to
+max_emit_rate per second; the last state is always emitted once things
+settle.
+
+update(fn, delay) applies fn later instead, e.g. to show an input as on
+for a moment after its inference finished without holding a thread.
+"""
+import threading
+import time
+
+
+class PinStateStore(object):
+    def __init__(self, pins, persist, emit=None, flush_interval=0.05, max_emit_rate=10):
+        self.pins           = pins
+        self.stored         = pins
+        self.emitted        = None
+        self.persist        = persist
+        self.emit           = emit
+        self.flush_interval = flush_interval
+        self.emit_interval  = 1.0 / max_emit_rate if max_emit_rate else 0
+        self.last_emit_at   = 0
+        self.deferred       = []  # (due, fn)
+        self.writes         = 0
+        self.emits          = 0
+        self.stopped        = False
+        self.cond           = threading.Condition()
+        self.flush_lock     = threading.Lock()
+        self.wakeup         = threading.Event()
+        self.thread         = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        """Stop the writer after writing out what is pending; deferred updates are dropped"""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+        self.flush()
+
+    def update(self, fn, delay=0):
+        """Replace the pins with fn(pins), now or after delay seconds"""
+        with self.cond:
+            if delay:
+                self.deferred.append((time.monotonic() + delay, fn))
+            else:
+                self.pins = fn(self.pins)
+            self.cond.notify()
+
+    def flush(self):
+        """Write and emit the current state now"""
+        with self.cond:
+            self._apply_due()
+            pins = self.pins
+        self._flush(pins)
+
+    def _dirty(self):
+        return self.pins != self.stored or (self.emit is not None and self.pins != self.emitted)
+
+    def _apply_due(self):
+        now = time.monotonic()
+        due = [entry for entry in self.deferred if entry[0] <= now]
+        if due:
+            self.deferred = [entry for entry in self.deferred if entry[0] > now]
+            for _, fn in sorted(due, key=lambda entry: entry[0]):
+                self.pins = fn(self.pins)
+
+    def _next_due(self):
+        if not self.deferred:
+            return None
+        return max(0, min(entry[0] for entry in self.deferred) - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self._apply_due()
+                while not self._dirty() and not self.stopped:
+                    self.cond.wait(self._next_due())
+                    self._apply_due()
+                if self.stopped:
+                    return
+                since_emit = time.monotonic() - self.last_emit_at
+                window = max(self.flush_interval, self.emit_interval - since_emit)
+            # collect whatever else changes in the window into the same write
+            self.wakeup.wait(window)
+            with self.cond:
+                self._apply_due()
+                pins = self.pins
+            self._flush(pins)
+
+    def _flush(self, pins):
+        with self.flush_lock:
+            changes = pins.changes(self.stored)
+            if changes:
+                try:
+                    self.persist(changes)
+                    self.stored = pins
+                    self.writes += 1
+                except Exception as error:
+                    # kept dirty, so it is retried on the next pass
+                    print('failed to store pin state', error)
+            if self.emit is not None and pins != self.emitted:
+                try:
+                    self.emit(pins)
+                except Exception as error:
+                    print('failed to emit pin state', error)
+                self.emitted = pins
+                self.last_emit_at = time.monotonic()
+                self.emits += 1
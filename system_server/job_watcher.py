@@ -1,9 +1,26 @@
+"""
+Keeps the fvonprem jobs/failed_jobs collections in step with RQ.
+
+RQ (1.5) has no job callbacks, so the watcher subscribes to redis keyspace
+notifications for rq:job:* hashes. Every status change RQ writes arrives
+as an event, and only the jobs named in it are looked up and updated. A
+slow reconciliation sweep over the jobs collection catches anything a
+notification missed, e.g. a job that finished before insert_job() ran or
+events published while the watcher was restarting. If keyspace
+notifications cannot be enabled the sweep runs at the old polling rate.
+
+Statuses are read in bulk: one redis pipeline per chunk of job ids
+(Job.fetch_many), finished jobs are removed from redis in a second
+pipeline and from mongo with a single delete_many. Failed jobs are
+copied to failed_jobs with one bulk_write.
+"""
 import os
 import time
 from redis import Redis
 from rq import Queue, Worker
 from rq.job import Job
-from pymongo import MongoClient
+from rq.registry import FinishedJobRegistry
+from pymongo import MongoClient, UpdateOne
 import subprocess
 import uuid
 
@@ -14,10 +31,15 @@ failed_jobs       = client["fvonprem"]["failed_jobs"]
 redis_con = Redis('localhost', 6379, password=None)
 job_queue = Queue('default', connection=redis_con)
 
+JOB_KEY_PREFIX     = Job.redis_job_namespace_prefix
+RECONCILE_INTERVAL = 60
+POLL_INTERVAL      = .5
+FETCH_CHUNK        = 1000
 
-def insert_failed_job(j):
-    failed_jobs.update_one({'job_id': j.id},
-        {'$set': 
+
+def failed_job_update(j):
+    return UpdateOne({'job_id': j.id},
+        {'$set':
             {
                 'job_id': j.id,
                 'started_at': j.started_at,
@@ -25,21 +47,103 @@ def insert_failed_job(j):
                 'origin': j.origin
             }
         },
-        True
+        upsert=True
     )
 
-while True:
-    time.sleep(.5)
-    jobs = job_collection.find()
-    for job in jobs:
-        j = job_queue.fetch_job(job['_id'])
-        if not j: continue
-        if j and j.get_status() == 'finished':
-            job_collection.delete_one({'_id': job['_id']})
-            j.delete()
-        elif j.get_status() == 'failed':
-            insert_failed_job(j)
-            job_collection.delete_one({'_id': job['_id']})
-        elif j.get_status() != 'started':
-            msg = 'job_'+j.id+'_'+j.get_status()
-            job_collection.update_one({'_id': job['_id']}, {'$set': {'type': msg}})
+def insert_failed_job(j):
+    failed_jobs.bulk_write([failed_job_update(j)])
+
+def delete_finished(j, pipeline):
+    """Queue the redis cleanup Job.delete() does for a finished job, without its extra round trips"""
+    FinishedJobRegistry(j.origin, connection=redis_con).remove(j, pipeline=pipeline)
+    pipeline.delete(j.key, j.dependents_key, j.dependencies_key)
+
+def apply_statuses(job_ids):
+    """Apply the current RQ status of tracked jobs to mongo"""
+    done    = []
+    updates = []
+    failed  = []
+    for i in range(0, len(job_ids), FETCH_CHUNK):
+        chunk = job_ids[i:i+FETCH_CHUNK]
+        jobs  = Job.fetch_many(chunk, connection=redis_con)
+        with redis_con.pipeline() as pipe:
+            for job_id, j in zip(chunk, jobs):
+                if not j: continue
+                status = j.get_status(refresh=False)
+                if status == 'finished':
+                    delete_finished(j, pipe)
+                    done.append(job_id)
+                elif status == 'failed':
+                    failed.append(failed_job_update(j))
+                    done.append(job_id)
+                elif status != 'started':
+                    msg = 'job_'+j.id+'_'+status
+                    updates.append(UpdateOne({'_id': job_id}, {'$set': {'type': msg}}))
+            pipe.execute()
+
+    if failed:
+        failed_jobs.bulk_write(failed, ordered=False)
+    if updates:
+        job_collection.bulk_write(updates, ordered=False)
+    if done:
+        job_collection.delete_many({'_id': {'$in': done}})
+
+def reconcile():
+    apply_statuses([job['_id'] for job in job_collection.find({}, {'_id': 1})])
+
+def enable_keyspace_events():
+    """Turn on keyspace notifications for hash commands, keeping any flags already set"""
+    try:
+        flags = redis_con.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+        missing = ''.join(f for f in 'Kh' if f not in flags)
+        if missing:
+            redis_con.config_set('notify-keyspace-events', flags + missing)
+        return True
+    except Exception as e:
+        print(f"Keyspace notifications unavailable, polling instead: {str(e)}")
+        return False
+
+def job_id_from_event(message):
+    channel = message['channel']
+    if isinstance(channel, bytes): channel = channel.decode('utf-8')
+    key = channel.split(':', 1)[1]
+    if not key.startswith(JOB_KEY_PREFIX): return None
+    job_id = key[len(JOB_KEY_PREFIX):]
+    # skip rq:job:<id>:dependents and similar sub keys
+    return job_id if job_id and ':' not in job_id else None
+
+def drain_events(pubsub, timeout=1.0):
+    """Collect the job ids changed since the last call, waiting up to timeout for the first"""
+    job_ids = set()
+    message = pubsub.get_message(timeout=timeout)
+    while message:
+        job_id = job_id_from_event(message) if message['type'] == 'pmessage' else None
+        if job_id: job_ids.add(job_id)
+        message = pubsub.get_message()
+    return job_ids
+
+def handle_events(job_ids):
+    if not job_ids: return
+    tracked = job_collection.find({'_id': {'$in': list(job_ids)}}, {'_id': 1})
+    apply_statuses([job['_id'] for job in tracked])
+
+def watch():
+    if not enable_keyspace_events():
+        while True:
+            time.sleep(POLL_INTERVAL)
+            reconcile()
+
+    db = redis_con.connection_pool.connection_kwargs.get('db', 0)
+    pubsub = redis_con.pubsub()
+    pubsub.psubscribe(f'__keyspace@{db}__:{JOB_KEY_PREFIX}*')
+
+    reconcile()
+    last_reconcile = time.time()
+    while True:
+        handle_events(drain_events(pubsub))
+        if time.time() - last_reconcile >= RECONCILE_INTERVAL:
+            reconcile()
+            last_reconcile = time.time()
+
+if __name__ == '__main__':
+    watch()
@@ -1,7 +1,7 @@
 import os
 import json
+import shutil
 import zipfile
-import tempfile
 from flask import request
 from flask_restx import Resource
 from os.path import exists
@@ -12,6 +12,7 @@ from worker_scripts.retrieve_models import retrieve_models
 from worker_scripts.retrieve_programs import retrieve_programs
 from worker_scripts.retrieve_masks import retrieve_masks
 from worker_scripts.model_upload_worker import upload_model
+from worker_scripts.model_archive import extract_model_archive
 from worker_scripts.job_manager import insert_job
 from utils.device_utils import base_path
 
@@ -102,38 +103,13 @@ class UploadModel(Resource):
         path = "/"+model_name
         if os.path.exists('/models'+path):
             print(path+' - already exists - REMOVING')
-            os.system('rm -rf '+'/models'+path)
-
-        os.system("mkdir "+path)
-        fn = tempfile.gettempdir() + 'model.zip'
-        fl.save(fn)
+            shutil.rmtree('/models'+path, ignore_errors=True)
 
         try:
             print('EXTRACTING ZIP FILE')
-            with zipfile.ZipFile(fn) as zf:
-                zf.extractall(path)
-
-            job_data = None
-            if os.path.exists(path+'/job.json'):
-                with open(path+'/job.json') as f:
-                    data = json.load(f)
-                    if data: job_data = data
-
-            if not job_data: return 'no job data'
-
-            version = job_data['model_version']
-            os.system("mv "+path+"/job.json "+path+"/"+str(version))
-            os.system("mv "+path+"/object-detection.pbtxt "+path+"/"+str(version))
-
-            model_file_path = path+"/"+str(version)+"/saved_model/saved_model.pb"
-            if os.path.exists(model_file_path):
-                os.system("mv "+model_file_path+" "+path+"/"+str(version))
-
-            vars_path = path+"/"+str(version)+"/saved_model/variables"
-            if os.path.exists(vars_path):
-                os.system("mv "+vars_path+" "+path+"/"+str(version))
-
-            os.system("rm -rf "+fn)
+            # read straight from the upload, laid out as <path>/<version>/
+            version = extract_model_archive(fl.stream, path)
+            if version is None: return 'no job data'
 
             j_upload = job_queue.enqueue(upload_model, str(path), str(fl.filename),
                             job_timeout=600,
@@ -143,7 +119,7 @@ class UploadModel(Resource):
 
             if j_upload: insert_job(j_upload.id, 'Uploading models')
         except zipfile.BadZipfile:
-            print('bad zipfile in ',fn)
+            print('bad zipfile in ', fl.filename)
 
 def register_routes(api):
     api.add_resource(CategoryIndex, '/category_index/<string:model>/<string:version>')
@@ -0,0 +1,131 @@
+"""
+Asyncio TCP command server.
+
+Serves any number of concurrent clients (PLCs, robots) on one port. Each
+connection gets a Session with its own state; commands from one client
+are answered in order while other clients are served concurrently.
+Command handlers do blocking work (GPIO, mongo, HTTP), so they run in a
+thread pool with a per-request timeout.
+
+Incoming bytes go through a per-connection FrameParser (see framing.py),
+so long commands split over several reads and several commands sent in
+one segment each get their own response. A partial command that is not
+completed within PARTIAL_TIMEOUT is handled as-is, like the old
+one-read-one-command server did.
+
+    handle_command(session, data) -> bytes to send back, or None
+    on_connect(session)           -> optional, loads per-connection state
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from framing import FrameParser, encode_response
+
+READ_SIZE        = 4096
+PARTIAL_TIMEOUT  = 0.2
+TIMEOUT_RESPONSE = b'request timed out\n'
+FAILED_RESPONSE  = b'request failed\n'
+
+
+class Session(object):
+    """State for one client connection"""
+    def __init__(self, client_address):
+        self.client_address  = client_address
+        self.connected_at    = time.time()
+        self.last_command_at = None
+        self.commands        = 0
+        # framing mode, on_connect may change it before the first read
+        self.framing         = 'auto'
+        # end responses to newline framed commands with a newline
+        self.newline_responses = False
+        # handler owned state, e.g. the presets loaded on connect
+        self.data            = {}
+
+
+class CommandServer(object):
+    def __init__(self, handle_command, on_connect=None, host='0.0.0.0', port=5300,
+                 request_timeout=30, idle_timeout=0, max_workers=8):
+        self.handle_command  = handle_command
+        self.on_connect      = on_connect
+        self.host            = host
+        self.port            = port
+        self.request_timeout = request_timeout
+        self.idle_timeout    = idle_timeout
+        self.executor        = ThreadPoolExecutor(max_workers=max_workers)
+        self.sessions        = set()
+        self.server          = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print('starting server on port', (self.host, self.port))
+        return self.server
+
+    async def serve(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    async def _serve_client(self, reader, writer):
+        session = Session(writer.get_extra_info('peername'))
+        self.sessions.add(session)
+        print('neighbor connected: ', session.client_address)
+        loop = asyncio.get_running_loop()
+        try:
+            if self.on_connect:
+                await loop.run_in_executor(self.executor, self.on_connect, session)
+            parser = FrameParser(session.framing)
+            while True:
+                frames = await self._read_frames(reader, parser)
+                if frames is None:
+                    break
+                for frame in frames:
+                    print('received: ', frame.payload)
+                    session.commands += 1
+                    session.last_command_at = time.time()
+                    response = await self._run_command(loop, session, frame.payload)
+                    if response:
+                        writer.write(encode_response(response, frame.kind, session.newline_responses))
+                        await writer.drain()
+        except asyncio.TimeoutError:
+            print('closing idle connection', session.client_address)
+        except (ConnectionError, OSError) as msg:
+            print('failed', msg)
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _read_frames(self, reader, parser):
+        """Read until at least one command is complete; None once the client disconnects"""
+        timeout = PARTIAL_TIMEOUT if parser.pending else self.idle_timeout
+        try:
+            if timeout:
+                data = await asyncio.wait_for(reader.read(READ_SIZE), timeout)
+            else:
+                data = await reader.read(READ_SIZE)
+        except asyncio.TimeoutError:
+            if parser.pending:
+                return parser.flush()
+            raise
+        if not data:
+            return parser.flush() or None
+        return parser.feed(data)
+
+    async def _run_command(self, loop, session, data):
+        future = loop.run_in_executor(self.executor, self.handle_command, session, data)
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError:
+            print('request timed out', session.client_address, data)
+            return TIMEOUT_RESPONSE
+        except Exception as error:
+            print(error, ' <<<<<<< error')
+            return FAILED_RESPONSE
@@ -0,0 +1,166 @@
+"""
+Message framing for the TCP command protocol.
+
+FrameParser is fed raw bytes as they arrive and returns complete commands,
+keeping any partial command buffered until the rest is read. Supported
+framings:
+
+    newline   <command>\\n              (a trailing \\r is dropped)
+    stx       \\x01<len>\\x02<command>\\x03\\x0d, the format the server already
+              uses for responses when packet_header is set
+    length    4 byte big-endian length followed by the command
+    raw       legacy clients that send bare commands with no delimiter;
+              JSON commands are split with a JSON decoder, so several in
+              one segment become separate commands, and keywords
+              (help, GPIread, GPOread) are recognised on their own
+
+In 'auto' mode (the default) each frame's type is detected from its first
+byte. Responses go back in the framing the command used, so a pipelining
+client can match one response to each command; raw commands get the
+response unchanged. Newline framed commands also get the response
+unchanged unless newline=True, since existing clients do not expect a
+terminator on responses.
+"""
+import json
+import struct
+
+MAX_FRAME  = 64 * 1024
+KEYWORDS   = (b'help', b'GPIread', b'GPOread')
+STX, ETX   = b'\x01', b'\x03'
+LENGTH_FMT = '>I'
+LENGTH_LEN = struct.calcsize(LENGTH_FMT)
+
+_decoder = json.JSONDecoder()
+
+
+class Frame(object):
+    def __init__(self, payload, kind):
+        self.payload = payload
+        self.kind    = kind
+
+    def __eq__(self, other):
+        return isinstance(other, Frame) and (self.payload, self.kind) == (other.payload, other.kind)
+
+    def __repr__(self):
+        return f'Frame({self.payload!r}, {self.kind!r})'
+
+
+class FrameParser(object):
+    def __init__(self, mode='auto', max_frame=MAX_FRAME):
+        self.mode      = mode
+        self.max_frame = max_frame
+        self.buffer    = b''
+
+    @property
+    def pending(self):
+        return bool(self.buffer)
+
+    def feed(self, data):
+        """Add received bytes; returns the commands completed by them"""
+        self.buffer += data
+        frames = []
+        while self.buffer:
+            if self.mode != 'length':
+                self.buffer = self.buffer.lstrip(b'\r\n')
+                if not self.buffer:
+                    break
+            frame = self._next_frame()
+            if frame is None:
+                break
+            if frame.payload:
+                frames.append(frame)
+        if len(self.buffer) > self.max_frame:
+            frames.extend(self.flush())
+        return frames
+
+    def flush(self):
+        """Give up waiting for the rest of a partial command and return what is buffered"""
+        data, self.buffer = self.buffer, b''
+        return [Frame(data, 'raw')] if data else []
+
+    def _next_frame(self):
+        kind = self.mode if self.mode != 'auto' else self._detect()
+        return getattr(self, '_parse_' + kind)()
+
+    def _detect(self):
+        first = self.buffer[:1]
+        if first == STX:
+            return 'stx'
+        if first == b'\x00':
+            return 'length'
+        if b'\n' in self.buffer:
+            return 'newline'
+        return 'raw'
+
+    def _take(self, end, skip=0):
+        payload, self.buffer = self.buffer[:end], self.buffer[end + skip:]
+        return payload
+
+    def _parse_newline(self):
+        end = self.buffer.find(b'\n')
+        if end < 0:
+            return None
+        return Frame(self._take(end, 1).rstrip(b'\r'), 'newline')
+
+    def _parse_stx(self):
+        if self.buffer[:1] != STX:
+            # not a frame start, resynchronise on the next STX
+            start = self.buffer.find(STX)
+            return Frame(self._take(start if start > 0 else len(self.buffer)), 'raw')
+        sep = self.buffer.find(b'\x02')
+        if sep < 0:
+            return None
+        try:
+            length = int(self.buffer[1:sep])
+        except ValueError:
+            return Frame(self._take(sep + 1), 'raw')
+        end = sep + 1 + length
+        if len(self.buffer) < end + 1:
+            return None
+        if self.buffer[end:end + 1] != ETX:
+            return Frame(self._take(end), 'raw')
+        return Frame(self._take(end, 1)[sep + 1:], 'stx')
+
+    def _parse_length(self):
+        if len(self.buffer) < LENGTH_LEN:
+            return None
+        length = struct.unpack(LENGTH_FMT, self.buffer[:LENGTH_LEN])[0]
+        if len(self.buffer) < LENGTH_LEN + length:
+            return None
+        return Frame(self._take(LENGTH_LEN + length)[LENGTH_LEN:], 'length')
+
+    def _parse_raw(self):
+        data = self.buffer.lstrip()
+        if not data:
+            self.buffer = b''
+            return Frame(b'', 'raw')
+        for keyword in KEYWORDS:
+            if data.startswith(keyword):
+                self.buffer = data[len(keyword):]
+                return Frame(keyword, 'raw')
+            if keyword.startswith(data):
+                return None
+        if not data.startswith(b'{'):
+            return Frame(self._take(len(self.buffer)), 'raw')
+        try:
+            text = data.decode('utf-8')
+            _, end = _decoder.raw_decode(text)
+        except (UnicodeDecodeError, ValueError):
+            # most likely the rest of the command has not arrived yet
+            return None
+        command = text[:end].encode('utf-8')
+        self.buffer = data[len(command):]
+        return Frame(command, 'raw')
+
+
+def encode_response(response, kind, newline=False):
+    """Frame a response the same way its command was framed"""
+    if kind == 'newline' and newline:
+        return response if response.endswith(b'\n') else response + b'\n'
+    if kind == 'stx':
+        if response.startswith(STX):
+            return response
+        return STX + str(len(response)).encode('utf-8') + b'\x02' + response + ETX + b'\x0d'
+    if kind == 'length':
+        return struct.pack(LENGTH_FMT, len(response)) + response
+    return response
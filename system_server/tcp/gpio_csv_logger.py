@@ -1,8 +1,10 @@
-import csv
 import json
 import os
+import threading
 import time
 
+from log_writer import CsvLogWriter
+
 LOG_DIR = "/home/visioncell/Documents"
 CSV_PATH = os.path.join(LOG_DIR, "gpio_inspection_log.csv")
 
@@ -12,20 +14,14 @@ CSV_HEADERS = [
 ]
 
 _current_cycle = None
+_cycle_lock = threading.Lock()  # commands run concurrently, one cycle is shared by all of them
+writer = CsvLogWriter(CSV_PATH, CSV_HEADERS)
 
 
 def _ts_ms():
     return round(time.time() * 1000, 3)
 
 
-def _ensure_csv():
-    if not os.path.exists(CSV_PATH):
-        os.makedirs(LOG_DIR, exist_ok=True)
-        with open(CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(CSV_HEADERS)
-
-
 def _write_row(cycle):
     warnings = "|".join(cycle.get("warnings", []))
     do2_set = cycle.get("do2_set_ts")
@@ -57,10 +53,7 @@ def _write_row(cycle):
         warnings,
     ]
 
-    _ensure_csv()
-    with open(CSV_PATH, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+    writer.write(row)
 
 
 def _flush_incomplete(cycle, extra_warnings=None):
@@ -80,22 +73,27 @@ def log_signal(raw: bytes):
 
     Call this with the raw bytes received from the TCP socket before
     passing them to the GPIO driver. Expected format: b'{"1": true}' etc.
+    Rows are written by a background thread, see log_writer.
     """
-    global _current_cycle
     now = _ts_ms()
 
     try:
         parsed = json.loads(raw.decode("utf-8"))
     except Exception:
-        _ensure_csv()
-        with open(CSV_PATH, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["", "", "", "", "", "", "", "", f"PARSE_ERROR: {raw!r}"])
+        writer.write(["", "", "", "", "", "", "", "", f"PARSE_ERROR: {raw!r}"])
         return
 
     pin = str(list(parsed.keys())[0])
     value = parsed[pin]
 
+    with _cycle_lock:
+        _advance_cycle(pin, value, now)
+
+
+def _advance_cycle(pin, value, now):
+    """Update the current cycle for one signal; the caller holds _cycle_lock"""
+    global _current_cycle
+
     # DO2 (pin 2) — data/reject signal
     if pin == "2":
         if value is True:
@@ -152,6 +150,7 @@ if __name__ == "__main__":
     _test_dir = tempfile.mkdtemp()
     CSV_PATH = os.path.join(_test_dir, "gpio_inspection_log.csv")
     LOG_DIR = _test_dir
+    writer = CsvLogWriter(CSV_PATH, CSV_HEADERS)
 
     print(f"Self-test CSV: {CSV_PATH}\n")
 
@@ -193,6 +192,8 @@ if __name__ == "__main__":
     print("=== Parse error ===")
     log_signal(b"not json")
 
+    writer.close()
+
     # Print results
     print("\n--- CSV Output ---")
     with open(CSV_PATH, "r") as f:
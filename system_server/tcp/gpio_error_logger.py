@@ -1,7 +1,8 @@
-import csv
 import os
 import time
 
+from log_writer import CsvLogWriter
+
 DEBUG = False
 
 LOG_DIR = "/home/visioncell/Documents"
@@ -9,19 +10,13 @@ ERROR_CSV_PATH = os.path.join(LOG_DIR, "gpio_error_log.csv")
 
 ERROR_HEADERS = ["timestamp", "function", "pin", "direction", "value", "return_code", "error"]
 
+writer = CsvLogWriter(ERROR_CSV_PATH, ERROR_HEADERS)
+
 
 def _ts_iso():
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
 
-def _ensure_error_csv():
-    if not os.path.exists(ERROR_CSV_PATH):
-        os.makedirs(LOG_DIR, exist_ok=True)
-        with open(ERROR_CSV_PATH, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(ERROR_HEADERS)
-
-
 def log_gpio_error(function_name, pin, direction, value, return_code, error=None):
     """Log a GPIO C function call result when DEBUG is enabled.
 
@@ -36,7 +31,6 @@ def log_gpio_error(function_name, pin, direction, value, return_code, error=None
     if not DEBUG:
         return
 
-    _ensure_error_csv()
     row = [
         _ts_iso(),
         function_name,
@@ -46,6 +40,4 @@ def log_gpio_error(function_name, pin, direction, value, return_code, error=None
         return_code,
         str(error) if error else "",
     ]
-    with open(ERROR_CSV_PATH, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+    writer.write(row)
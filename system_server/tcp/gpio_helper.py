@@ -1,4 +1,5 @@
 import os
+import sys
 import threading
 import time
 import requests
@@ -8,6 +9,8 @@ from ctypes import *
 from pymongo import MongoClient
 import datetime
 import string
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pin_state import PinState
 from gpio_error_logger import log_gpio_error
 
 client   = MongoClient("172.17.0.1")
@@ -31,15 +34,13 @@ def read_pin(pin_num):
 
 def toggle_pin(pin_num):
     query = {'type':'gpio_pin_state'}
-    cur_pin_state = pin_state_ref.find_one(query)
     pin_key       = 'GPO'+str(pin_num)
+    cur_pin_state = pin_state_ref.find_one(query, {pin_key: 1})
     if cur_pin_state[pin_key]:
-        cur_pin_state[pin_key] = False
         functions.set_gpio(1, int(pin_num), 1)
     else:
-        cur_pin_state[pin_key] = True
         functions.set_gpio(1, int(pin_num), 0)
-    pin_state_ref.update_one(query, {'$set': cur_pin_state}, True)
+    pin_state_ref.update_one(query, {'$set': {pin_key: not cur_pin_state[pin_key]}}, True)
 
 
 def set_pin_state(pin_num, state):
@@ -72,20 +73,14 @@ class GPIO_State(ctypes.Structure):
     ]
 
 
-def read_all_gpio_states_as_json():
-    try:
-        functions.read_all_gpio_states.restype = GPIO_State
-        c_gpio_state = functions.read_all_gpio_states()
-
-        inputs = [(c_gpio_state.inputs >> i) & 1 for i in range(8)]
-        outputs = [(c_gpio_state.outputs >> i) & 1 for i in range(8)]
+def read_pin_state():
+    functions.read_all_gpio_states.restype = GPIO_State
+    return PinState.from_c(functions.read_all_gpio_states())
 
-        gpio_data = {
-            "inputs": inputs,
-            "outputs": outputs
-        }
 
-        return gpio_data
+def read_all_gpio_states_as_json():
+    try:
+        return read_pin_state().to_json()
 
     except OSError as e:
         error_message = {
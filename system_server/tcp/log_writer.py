@@ -0,0 +1,189 @@
+"""
+Background CSV writer for the GPIO logs.
+
+write(row) only puts the row on a bounded queue, so logging costs the TCP
+command path next to nothing. A writer thread keeps the file open,
+collects rows for up to flush_interval and writes them as one batch
+followed by a single flush. When the queue is full, rows are dropped and
+counted instead of blocking the caller.
+
+The file is rotated when it reaches max_bytes or has been written for
+max_age seconds. The old file is renamed to
+<name>.<YYYYmmdd-HHMMSS>.csv and only the newest `backups` rotated files
+are kept. Every new file starts with the header row.
+
+close_all() writes out what is queued and closes every writer. It is
+registered with atexit, and tcp_server also calls it on shutdown. A
+closed writer rejects further rows, so a late write cannot start a
+second writer thread.
+"""
+import atexit
+import csv
+import glob
+import os
+import queue
+import threading
+import time
+
+MAX_BYTES      = 10 * 1024 * 1024  # rotate the CSV at this size
+MAX_AGE        = 24 * 3600         # or after this many seconds
+BACKUPS        = 7                 # rotated files kept per log
+QUEUE_SIZE     = 10000             # rows waiting to be written before new ones are dropped
+FLUSH_INTERVAL = .5                # seconds rows are collected into one write
+
+_STOP    = object()
+_writers = []
+
+
+class CsvLogWriter(object):
+    def __init__(self, path, headers, max_bytes=MAX_BYTES, max_age=MAX_AGE, backups=BACKUPS,
+                 queue_size=QUEUE_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path           = path
+        self.headers        = headers
+        self.max_bytes      = max_bytes
+        self.max_age        = max_age
+        self.backups        = backups
+        self.flush_interval = flush_interval
+        self.queue          = queue.Queue(maxsize=queue_size)
+        self.file           = None
+        self.writer         = None
+        self.opened_at      = None
+        self.written        = 0
+        self.dropped        = 0
+        self.rotations      = 0
+        self.thread         = None
+        self.closed         = False
+        self.lock           = threading.Lock()
+        _writers.append(self)
+
+    def write(self, row):
+        """Queue a row; never blocks, returns False if the row was dropped or the writer is closed"""
+        with self.lock:
+            # checked under the lock so no row is queued behind close()'s _STOP
+            if self.closed:
+                return False
+            self._ensure_started()
+            try:
+                self.queue.put_nowait(row)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+    def flush(self, timeout=5):
+        """Wait until the rows queued so far are on disk"""
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5):
+        """Write out what is queued and close the file; later writes are rejected"""
+        with self.lock:
+            self.closed = True
+            thread = self.thread
+        if thread is None:
+            return
+        self.queue.put(_STOP)
+        thread.join(timeout)
+        self.thread = None
+
+    def _ensure_started(self):
+        """Start the writer thread; the caller holds self.lock"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            batch, markers, stop = [], [], False
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+                if stop or markers:
+                    # write now, someone is waiting on it
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as error:
+                print('failed to write', self.path, error)
+                self._close_file()
+            for done in markers:
+                done.set()
+            if stop:
+                self._close_file()
+                return
+
+    def _write_batch(self, rows):
+        if not rows:
+            return
+        self._open()
+        for row in rows:
+            if self._needs_rotation():
+                self._rotate()
+            self.writer.writerow(row)
+            self.written += 1
+        self.file.flush()
+
+    def _open(self):
+        if self.file is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file      = open(self.path, 'a', newline='')
+        self.writer    = csv.writer(self.file)
+        self.opened_at = time.time()
+        if new:
+            self.writer.writerow(self.headers)
+
+    def _needs_rotation(self):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self.opened_at >= self.max_age
+
+    def _rotate(self):
+        self._close_file()
+        base, ext = os.path.splitext(self.path)
+        target = base + time.strftime('.%Y%m%d-%H%M%S', time.localtime()) + ext
+        suffix = 1
+        while os.path.exists(target):
+            target = base + time.strftime('.%Y%m%d-%H%M%S', time.localtime()) + '-' + str(suffix) + ext
+            suffix += 1
+        os.rename(self.path, target)
+        self.rotations += 1
+        rotated = glob.glob(glob.escape(base) + '.[0-9]*' + ext)
+        rotated.sort(key=lambda name: (os.path.getmtime(name), name))
+        for old in rotated[:max(0, len(rotated) - self.backups)]:
+            os.remove(old)
+        self._open()
+
+    def _close_file(self):
+        if self.file is not None:
+            try:
+                self.file.close()
+            finally:
+                self.file = self.writer = None
+
+
+def close_all():
+    for writer in list(_writers):
+        writer.close()
+
+
+atexit.register(close_all)
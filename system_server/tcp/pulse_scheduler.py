@@ -0,0 +1,88 @@
+"""
+Non-blocking output pulses for the pass/fail pins.
+
+pulse(pin) switches the pin on straight away and returns; a timer thread
+switches it off once the pulse width has passed. A new pulse on a pin that
+is still on extends the pulse instead of being cut short by the earlier
+deadline, and pulses on different pins run independently.
+
+Pin changes are handed to persist(changes) on a separate thread, with all
+changes made since the last write coalesced into one {pin: on} dict, so
+mongo is never on the response path.
+"""
+import threading
+import time
+
+
+class PulseScheduler(object):
+    def __init__(self, set_pin, persist=None, width=0.5):
+        self.set_pin        = set_pin
+        self.persist        = persist
+        self.width          = width
+        self.deadlines      = {}  # pin -> time.monotonic() it switches off
+        self.changes        = {}  # pin -> state not persisted yet
+        self.stopped        = False
+        self.lock           = threading.Lock()
+        self.timer_wakeup   = threading.Condition(self.lock)
+        self.persist_wakeup = threading.Condition(self.lock)
+        self.threads        = [threading.Thread(target=self._run_timer, daemon=True),
+                               threading.Thread(target=self._run_persist, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def pulse(self, pin, width=None):
+        """Switch pin on now and off after width seconds"""
+        deadline = time.monotonic() + (self.width if width is None else width)
+        with self.lock:
+            if pin not in self.deadlines:
+                self._set(pin, True)
+            self.deadlines[pin] = max(deadline, self.deadlines.get(pin, 0))
+            self.timer_wakeup.notify()
+
+    def active(self):
+        with self.lock:
+            return set(self.deadlines)
+
+    def stop(self):
+        """Switch off any pins still pulsing and write out the remaining changes"""
+        with self.lock:
+            for pin in list(self.deadlines):
+                self._set(pin, False)
+            self.deadlines = {}
+            self.stopped = True
+            self.timer_wakeup.notify()
+            self.persist_wakeup.notify()
+        for thread in self.threads:
+            thread.join()
+
+    def _set(self, pin, on):
+        # called with the lock held, so the timer never switches off a pin a new pulse just extended
+        self.set_pin(pin, on)
+        self.changes[pin] = on
+        self.persist_wakeup.notify()
+
+    def _run_timer(self):
+        with self.lock:
+            while not self.stopped:
+                now = time.monotonic()
+                for pin, deadline in list(self.deadlines.items()):
+                    if deadline <= now:
+                        del self.deadlines[pin]
+                        self._set(pin, False)
+                timeout = min(self.deadlines.values()) - now if self.deadlines else None
+                self.timer_wakeup.wait(timeout)
+
+    def _run_persist(self):
+        while True:
+            with self.lock:
+                while not self.changes and not self.stopped:
+                    self.persist_wakeup.wait()
+                changes, self.changes = self.changes, {}
+                stopped = self.stopped
+            if changes and self.persist:
+                try:
+                    self.persist(changes)
+                except Exception as error:
+                    print('failed to persist pin state', error)
+            elif stopped:
+                return
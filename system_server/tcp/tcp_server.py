@@ -8,6 +8,12 @@ from ctypes import *
 from pymongo import MongoClient
 from gpio_helper import *
 from gpio_csv_logger import log_signal
+from log_writer import close_all as close_logs
+from command_server import CommandServer
+from pulse_scheduler import PulseScheduler
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.capture_client import CaptureClient
+from utils.config_cache import ConfigCache
 import datetime
 import string
 import json
@@ -19,6 +25,24 @@ util_ref = client["fvonprem"]["utils"]
 config_ref = client['fvonprem']['io_configs']
 pin_state_ref = client["fvonprem"]["pin_state"]
 
+REQUEST_TIMEOUT = 30  # seconds before a command gets 'request timed out'
+MAX_WORKERS     = 8   # commands handled at once across all clients
+CACHE_TTL       = 30  # seconds cached presets/config/token are trusted without a change stream
+PULSE_WIDTH     = .5  # seconds the pass/fail pin stays on, tcp_config 'pulse_ms' overrides it
+PASS_PIN        = 5
+FAIL_PIN        = 6
+
+def load_presets():
+    return {preset['ioVal']: preset for preset in io_ref.find({'ioType': 'TCP'})}
+
+cache = ConfigCache(ttl=CACHE_TTL)
+cache.register('valid_commands', io_ref, load_presets)
+cache.register('config', config_ref, lambda: config_ref.find_one({'type': 'tcp_config'}))
+cache.register('id_token', util_ref, lambda: util_ref.find_one({'type': 'id_token'}, {'_id': 0}))
+
+# keep-alive connections to the capture backend, with per-trigger latency histograms
+capture = CaptureClient(pool_size=MAX_WORKERS)
+
 #(<direction input=0/output=1>,<pin_index>,<value on=0/off=1>)
 
 def take_action(actions):
@@ -40,153 +64,141 @@ def read_gpio_state(type):
         return {'error': 'Invalid state type requested'}    
 
 import platform 
+pulses = None  # no GPIO pulses on aarch64
 if platform.processor() != 'aarch64':
     so_file = os.environ['HOME']+"/flex-run/system_server/gpio/gpio.so"
     functions = CDLL(so_file)
 
-    def set_pass_fail_pins(data):
+    def set_pin_output(pin, on):
+        print(functions.set_gpio(1, pin, 0 if on else 1), 'GPO'+str(pin), 'ON' if on else 'OFF')
+
+    def persist_pin_changes(changes):
+        new_pin_state = {'GPO'+str(pin): on for pin, on in changes.items()}
+        pin_state_ref.update_one({'type': 'gpio_pin_state'}, {'$set': new_pin_state}, True)
+
+    pulses = PulseScheduler(set_pin_output, persist_pin_changes, width=PULSE_WIDTH)
+
+    def set_pass_fail_pins(data, width=None):
+        """Pulse the pass or fail pin; returns without waiting for the pulse to end"""
         if 'pass_fail' in data:
-            new_pin_state = {}
             print(data['pass_fail'], ' <======================')
             if data['pass_fail'] == 'PASS':
-                #set pass pin
-                print(functions.set_gpio(1, 5, 0), 'PASS PIN ON')
-                new_pin_state['GPO5'] = True
+                pulses.pulse(PASS_PIN, width)
             if data['pass_fail'] == 'FAIL':
-                #set fail pin
-                print(functions.set_gpio(1, 6, 0), 'FAIL PIN ON')
-                new_pin_state['GPO6'] = True
-
-            pin_state_ref.update_one({'type': 'gpio_pin_state'}, {'$set': new_pin_state}, True)
-            time.sleep(.5)
-
-            print(functions.set_gpio(1, 5, 1), 'PASS PIN OFF')
-            print(functions.set_gpio(1, 6, 1), 'FAIL PIN OFF')
-            new_pin_state['GPO5'] = False
-            new_pin_state['GPO6'] = False
-            pin_state_ref.update_one({'type': 'gpio_pin_state'}, {'$set': new_pin_state}, True)
+                pulses.pulse(FAIL_PIN, width)
             return data['pass_fail']
         return
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_name    = '0.0.0.0'
-server_address = (server_name, 5300)
-
-print('starting server on port', server_address)
-sock.bind(server_address)
-sock.listen(1)
+def load_session(session):
+    """Warm the preset/config cache for a new connection"""
+    for name in ('valid_commands', 'config', 'id_token'):
+        cache.get(name)
+    config = cache.get('config')
+    session.newline_responses = bool(config and config.get('newline_responses'))
+
+def request_prediction(path):
+    """GET the predict endpoint with the cached token, reloading the token once if it was rejected"""
+    resp = capture.get(path, headers={'Authorization': 'Bearer '+ cache.get('id_token')['token']})
+    if resp.status_code == 401:
+        cache.invalidate(['id_token'])
+        resp = capture.get(path, headers={'Authorization': 'Bearer '+ cache.get('id_token')['token']})
+    return resp
+
+def handle_command(session, data):
+    """Run one command and return the response bytes"""
+    valid_commands = cache.get('valid_commands')
+    config         = cache.get('config')
+    client_address = session.client_address
+    try:
+        incoming_command = data.decode('utf-8')
+        command          = None
+        actions          = None
+        params           = ''
+        if incoming_command == "help":
+            help_map = {
+                "commands": {
+                    "Read Input Pins": "GPIread",
+                    "Read Output Pins": "GPOread",
+                    "Trigger Latency Histogram": "latency",
+                    "Set Output Pin State (on/off)": ["{\"1\": true}", "{\"1\": false}"],
+                    "Run Prediction": {
+                        "Valid Commands (based on your presets)": list(valid_commands.keys()),
+                        "Format": "{\"cmd1\": {\"did\": \"12345\"}}"
+                    }
+                }
+            }
+            return json.dumps(help_map).encode('utf-8')
+        elif incoming_command == "GPIread":
+            io_state_str = read_gpio_state('input')
+            return json.dumps(io_state_str).encode('utf-8')
+        elif incoming_command == "GPOread":
+            io_state_str = read_gpio_state('output')
+            return json.dumps(io_state_str).encode('utf-8')
+        elif incoming_command == "latency":
+            return json.dumps(capture.latency.snapshot()).encode('utf-8')
+
+        incoming_command = json.loads(incoming_command)
+        command          = list(incoming_command.keys())[0]
+        actions          = incoming_command[command]
+        if len(command) == 1:
+            #treat as an output pin command
+            log_signal(data)
+            state = set_pin_state(command, actions)
+            return str.encode(state + '\n')
+        else:
+            params           = take_action(actions)
+    except Exception as error:
+        print(error, ' <<<<<<< error')
+        print('INVALID COMMAND PARSE')
+
+    if command in valid_commands.keys():
+        with capture.latency.time('trigger'):
+            return run_prediction(valid_commands[command], config, client_address, params)
+    else:
+        print('COMMAND INVALID')
+        return b'Invalid Command\n'
+
+def pulse_width(config):
+    pulse_ms = config.get('pulse_ms') if config else None
+    return pulse_ms / 1000 if pulse_ms else None
+
+def run_prediction(preset, config, client_address, params):
+    """Call the predict endpoint for a preset, set the result pins and build the response"""
+    path    = '/api/capture/predict/snap/'+preset['modelName']+'/'+str(preset['modelVersion'])+'/'+str(preset['cameraId'])+'?workstation='+'TCP: '+client_address[0]+':'+preset['ioVal']+'&preset_id='+str(preset['presetId'])+params
+    resp    = request_prediction(path)
+
+    if resp.status_code == 200:
+        data           = resp.json()
+        try:
+            if platform.processor() != 'aarch64':
+                with capture.latency.time('gpio'):
+                    set_pass_fail_pins(data, pulse_width(config))
+            else:
+                print('Running on arm device - no GPIO')
+        except:
+            print('failed to set pass fail pins')
+        keys_to_remove = [k for k in config if not config[k] and k != 'packet_header']
+        for k in keys_to_remove:
+            if k in data: del data[k]
+
+        data_bytes = json.dumps(data).encode('utf-8')
+        packet_header = b''
+        if config['packet_header']:
+            packet_header = b'\x01'+str(len(data_bytes)).encode('utf-8')
+            data_bytes = packet_header+b'\x02'+data_bytes+b'\x03'+b'\x0d'
+        return data_bytes
+    else:
+        return b'request failed\n'
 
-while True:
-    print('Waiting for connection...')
-    connections, client_address = sock.accept()
+if __name__ == '__main__':
+    cache.start_watching(client['fvonprem'])
+    server = CommandServer(handle_command, on_connect=load_session, host='0.0.0.0', port=5300,
+                           request_timeout=REQUEST_TIMEOUT, max_workers=MAX_WORKERS)
     try:
-        print('neighbor connected: ', client_address)
-        query = {'ioType': 'TCP'}
-        presets = io_ref.find(query)
-        valid_commands = {}
-        config = config_ref.find_one({'type': 'tcp_config'})
-        for preset in presets: valid_commands[preset['ioVal']] = preset
-        while True:
-            try:
-                data = connections.recv(100)
-                print('received: ', data)
-                if data:
-                    try:
-                        incoming_command = data.decode('utf-8')
-                        command          = None
-                        actions          = None
-                        params           = ''
-                        if incoming_command == "help":
-                            help_map = {
-                                "commands": {
-                                    "Read Input Pins": "GPIread",
-                                    "Read Output Pins": "GPOread",
-                                    "Set Output Pin State (on/off)": ["{\"1\": true}", "{\"1\": false}"],
-                                    "Run Prediction": {
-                                        "Valid Commands (based on your presets)": list(valid_commands.keys()),
-                                        "Format": "{\"cmd1\": {\"did\": \"12345\"}}"
-                                    }
-                                }
-                            }
-
-                            b_help_string = json.dumps(help_map).encode('utf-8')
-                            connections.send(b_help_string)
-                            continue
-                        elif incoming_command == "GPIread":
-                            io_state_str  = read_gpio_state('input')
-                            b_io_state = json.dumps(io_state_str).encode('utf-8')
-                            connections.send(b_io_state)
-                            continue
-
-                        elif incoming_command == "GPOread":
-                            io_state_str  = read_gpio_state('output')
-                            b_io_state = json.dumps(io_state_str).encode('utf-8')
-                            connections.send(b_io_state)
-                            continue
-
-                        incoming_command = json.loads(incoming_command)
-                        command          = list(incoming_command.keys())[0]
-                        actions          = incoming_command[command]
-                        if len(command) == 1:
-                            #treat as an output pin command
-                            log_signal(data)
-                            state = set_pin_state(command, actions)
-                            bstate = str.encode(state + '\n')
-                            connections.send(bstate)
-                            continue
-                        else:
-                            params           = take_action(actions)
-                    except Exception as error:
-                        print(error, ' <<<<<<< error')
-                        print('INVALID COMMAND PARSE')
-
-                    if command in valid_commands.keys():
-                        preset  = valid_commands[command]
-                        res     = util_ref.find_one({'type': 'id_token'}, {'_id': 0})
-                        token   = res['token']
-                        host    = 'http://172.17.0.1'
-                        port    = '5000'
-                        path    = '/api/capture/predict/snap/'+preset['modelName']+'/'+str(preset['modelVersion'])+'/'+str(preset['cameraId'])+'?workstation='+'TCP: '+client_address[0]+':'+preset['ioVal']+'&preset_id='+str(preset['presetId'])+params
-                        url     = host+':'+port+path
-                        headers = {'Authorization': 'Bearer '+ token}
-                        resp    = requests.get(url, headers=headers)
-
-                        if resp.status_code == 200:
-                            data           = resp.json()
-                            try:
-                                if platform.processor() != 'aarch64':
-                                    set_pass_fail_pins(data)
-                                else:
-                                    print('Running on arm device - no GPIO')
-                            except:
-                                print('failed to set pass fail pins')
-                            keys_to_remove = [k for k in config if not config[k] and k != 'packet_header']
-                            for k in keys_to_remove: 
-                                if k in data: del data[k]
-
-                            data_bytes = json.dumps(data).encode('utf-8')
-                            packet_header = b''
-                            if config['packet_header']:
-                                packet_header = b'\x01'+str(len(data_bytes)).encode('utf-8')
-                                data_bytes = packet_header+b'\x02'+data_bytes+b'\x03'+b'\x0d'
-                            try:
-                                connections.sendall(data_bytes)
-                            except socket.error as msg:
-                                print('failed', msg)
-                                connections.sendall(b'-1')
-                        else:
-                            connections.send(b'request failed\n')
-                            
-                    else:
-                        print('COMMAND INVALID')
-                        connections.send(b'Invalid Command\n')
-                else:
-                    break
-            except socket.error as msg:
-                print('failed', msg)
+        server.serve_forever()
     finally:
-        connections.close()
-
-
-
-    
+        try:
+            if pulses is not None:
+                pulses.stop()
+        finally:
+            close_logs()
@@ -157,38 +157,44 @@ class TestUploadModelEndpoint:
     """Tests for model upload endpoint"""
 
     @pytest.mark.integration
-    @patch('os.path.exists', return_value=True)
-    @patch('os.system')
-    @patch('zipfile.ZipFile')
-    @patch('tempfile.gettempdir', return_value='/tmp/')
+    @patch('os.path.exists', return_value=False)
+    @patch('routes.model_routes.extract_model_archive', return_value='v1.0.0')
     @patch('rq.Queue.enqueue')
     @patch('worker_scripts.job_manager.insert_job')
-    def test_upload_model_success(self, mock_insert_job, mock_enqueue, mock_tempdir,
-                                  mock_zipfile, mock_system, mock_exists, model_client):
+    def test_upload_model_success(self, mock_insert_job, mock_enqueue, mock_extract,
+                                  mock_exists, model_client):
         """Test successful model upload"""
-        # Create mock ZIP file
-        mock_zip_instance = MagicMock()
-        mock_zipfile.return_value.__enter__.return_value = mock_zip_instance
+        file_data = BytesIO(b'fake zip content')
+        data = {
+            'file': (file_data, 'test_model#v1.zip')
+        }
 
-        # Mock job.json content
-        job_data = {'model_version': 'v1.0.0'}
+        mock_job = MagicMock()
+        mock_job.id = 'upload_job_789'
+        mock_enqueue.return_value = mock_job
 
-        with patch('builtins.open', mock_open(read_data=json.dumps(job_data))):
-            # Create file data
-            file_data = BytesIO(b'fake zip content')
-            data = {
-                'file': (file_data, 'test_model#v1.zip')
-            }
+        response = model_client.post('/upload_model',
+                                    data=data,
+                                    content_type='multipart/form-data')
 
-            mock_job = MagicMock()
-            mock_job.id = 'upload_job_789'
-            mock_enqueue.return_value = mock_job
+        assert response.status_code == 200
+        # extracted from the upload stream into the staging folder, no temp zip
+        assert mock_extract.call_args[0][1] == '/test_model'
+        assert mock_enqueue.call_args[0][1:] == ('/test_model', 'test_model#v1.zip')
+
+    @pytest.mark.integration
+    @patch('routes.model_routes.extract_model_archive', return_value=None)
+    @patch('rq.Queue.enqueue')
+    def test_upload_model_no_job_data(self, mock_enqueue, mock_extract, model_client):
+        """Test that an archive without job.json is not queued"""
+        data = {'file': (BytesIO(b'zip'), 'test_model#v1.zip')}
 
-            response = model_client.post('/upload_model',
-                                        data=data,
-                                        content_type='multipart/form-data')
+        response = model_client.post('/upload_model',
+                                    data=data,
+                                    content_type='multipart/form-data')
 
-            assert response.status_code == 200
+        assert response.get_json() == 'no job data'
+        mock_enqueue.assert_not_called()
 
     @pytest.mark.integration
     def test_upload_model_no_file(self, model_client):
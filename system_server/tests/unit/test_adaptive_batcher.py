@@ -0,0 +1,130 @@
+"""
+Unit tests for worker_scripts/adaptive_batcher.py
+"""
+import json
+import pytest
+from unittest.mock import MagicMock
+
+
+@pytest.fixture
+def batcher(fake_redis_with_data):
+    from worker_scripts.adaptive_batcher import AdaptiveBatcher
+    return AdaptiveBatcher(fake_redis_with_data, min_size=10, max_size=100,
+                           max_bytes=10000, target_latency_ms=1000)
+
+
+class TestCurrentSize:
+    """Tests for current_size"""
+
+    @pytest.mark.unit
+    def test_current_size_defaults_to_min(self, batcher):
+        """Test that a fresh batcher starts at the minimum size"""
+        assert batcher.current_size() == 10
+
+    @pytest.mark.unit
+    def test_current_size_clamped(self, batcher, fake_redis_with_data):
+        """Test that a stored size outside the limits is clamped"""
+        fake_redis_with_data.hset('analytics_batcher', 'batch_size', 1000)
+        assert batcher.current_size() == 100
+
+    @pytest.mark.unit
+    def test_current_size_redis_down(self):
+        """Test that redis errors fall back to the minimum size"""
+        from worker_scripts.adaptive_batcher import AdaptiveBatcher
+
+        redis_con = MagicMock()
+        redis_con.hget.side_effect = Exception('redis down')
+
+        assert AdaptiveBatcher(redis_con, min_size=7).current_size() == 7
+
+
+class TestMakeBatches:
+    """Tests for make_batches"""
+
+    @pytest.mark.unit
+    def test_make_batches_by_count(self, batcher):
+        """Test that batches are capped at the current size"""
+        records = [{'id': f'rec{i}'} for i in range(25)]
+
+        batches = batcher.make_batches(records)
+
+        assert [len(b) for b in batches] == [10, 10, 5]
+        assert sum(batches, []) == records
+
+    @pytest.mark.unit
+    def test_make_batches_by_bytes(self, batcher):
+        """Test that large payloads split batches before the count limit"""
+        records = [{'id': f'rec{i}', 'payload': 'x' * 3000} for i in range(5)]
+
+        batches = batcher.make_batches(records)
+
+        assert [len(b) for b in batches] == [3, 2]
+
+    @pytest.mark.unit
+    def test_make_batches_oversized_record(self, batcher):
+        """Test that a single record larger than max_bytes still gets its own batch"""
+        records = [{'id': 'big', 'payload': 'x' * 20000}, {'id': 'small'}]
+
+        assert [len(b) for b in batcher.make_batches(records)] == [1, 1]
+
+    @pytest.mark.unit
+    def test_make_batches_saves_cycle_stats(self, batcher):
+        """Test that the chosen batch size and cycle totals are recorded"""
+        records = [{'id': f'rec{i}'} for i in range(12)]
+
+        batcher.make_batches(records)
+        stats = batcher.stats()
+
+        assert stats['cycle_records'] == '12'
+        assert stats['cycle_batches'] == '2'
+        assert stats['cycle_batch_size'] == '10'
+        assert stats['cycle_bytes'] == str(sum(len(json.dumps(r)) for r in records))
+
+
+class TestRecordResult:
+    """Tests for record_result"""
+
+    @pytest.mark.unit
+    def test_record_result_grows_when_healthy(self, batcher):
+        """Test that fast successful uploads grow the batch size"""
+        assert batcher.record_result(10, 1000, 0.2, True) == 13
+        assert batcher.record_result(13, 1300, 0.2, True) == 17
+        assert batcher.current_size() == 17
+
+    @pytest.mark.unit
+    def test_record_result_capped_at_max(self, batcher):
+        """Test that growth stops at max_size"""
+        for _ in range(30):
+            batcher.record_result(10, 1000, 0.1, True)
+
+        assert batcher.current_size() == 100
+
+    @pytest.mark.unit
+    def test_record_result_shrinks_on_error(self, batcher, fake_redis_with_data):
+        """Test that a failed upload halves the batch size"""
+        fake_redis_with_data.hset('analytics_batcher', 'batch_size', 80)
+
+        assert batcher.record_result(80, 8000, 0.2, False) == 40
+
+    @pytest.mark.unit
+    def test_record_result_shrinks_when_slow(self, batcher, fake_redis_with_data):
+        """Test that uploads slower than the target latency shrink the batch"""
+        fake_redis_with_data.hset('analytics_batcher', 'batch_size', 80)
+
+        assert batcher.record_result(80, 8000, 1.5, True) == 60
+
+    @pytest.mark.unit
+    def test_record_result_never_below_min(self, batcher):
+        """Test that shrinking stops at min_size"""
+        assert batcher.record_result(10, 1000, 5, False) == 10
+
+    @pytest.mark.unit
+    def test_record_result_throughput_stats(self, batcher):
+        """Test that records/sec and bytes/sec are stored"""
+        batcher.record_result(20, 4000, 2, True)
+        stats = batcher.stats()
+
+        assert stats['last_records_per_sec'] == '10.0'
+        assert stats['last_bytes_per_sec'] == '2000.0'
+        assert stats['last_latency_ms'] == '2000'
+        assert stats['last_success'] == '1'
@@ -0,0 +1,123 @@
+"""
+Unit tests for utils/capture_client.py
+"""
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+
+@pytest.fixture
+def capture_server():
+    """Local HTTP/1.1 stand-in for the capture backend that counts connections"""
+    state = {'connections': 0, 'requests': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            state['connections'] += 1
+            super().setup()
+
+        def _reply(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            state['requests'].append((self.command, self.path, self.rfile.read(length)))
+            body = json.dumps({'pass_fail': 'PASS'}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_PUT = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state['url'] = 'http://127.0.0.1:%d' % server.server_address[1]
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+class TestCaptureClient:
+    """Tests for the keep-alive capture backend client"""
+
+    @pytest.mark.unit
+    def test_connection_reused(self, capture_server):
+        """Test that consecutive predictions share one connection and connect is timed once"""
+        from utils.capture_client import CaptureClient
+        client = CaptureClient(base_url=capture_server['url'], timeout=2)
+
+        for _ in range(5):
+            assert client.get('/api/capture/predict/snap/m/1/0').json() == {'pass_fail': 'PASS'}
+        client.put('/api/capture/predict/single_inference/1/1', json={'frame': 'b64'})
+
+        assert capture_server['connections'] == 1
+        report = client.latency.snapshot()
+        assert report['predict']['count'] == 6
+        assert report['connect']['count'] == 1
+        assert capture_server['requests'][-1] == ('PUT', '/api/capture/predict/single_inference/1/1',
+                                                  b'{"frame": "b64"}')
+
+    @pytest.mark.unit
+    def test_full_url(self, capture_server):
+        """Test that a full url bypasses the base url, e.g. the thermal server"""
+        from utils.capture_client import CaptureClient
+        client = CaptureClient(base_url='http://127.0.0.1:9', timeout=2)
+
+        assert client.get(capture_server['url'] + '/api/ir/vision/b64Frame/0').status_code == 200
+        assert capture_server['requests'][0][1] == '/api/ir/vision/b64Frame/0'
+
+    @pytest.mark.unit
+    def test_failed_request_recorded(self):
+        """Test that a request that cannot connect still records its time and is not retried"""
+        import requests
+        from utils.capture_client import CaptureClient
+        client = CaptureClient(base_url='http://127.0.0.1:9', timeout=1)
+
+        with patch('socket.socket.connect', side_effect=ConnectionRefusedError) as connect:
+            with pytest.raises(requests.ConnectionError):
+                client.get('/api/capture/predict/snap/m/1/0')
+
+        assert connect.call_count == 1
+        assert client.latency.snapshot()['predict']['count'] == 1
+
+
+class TestLatencyHistogram:
+    """Tests for the latency histogram"""
+
+    @pytest.mark.unit
+    def test_snapshot(self):
+        """Test counts, percentiles and bucket placement"""
+        from utils.capture_client import LatencyHistogram
+        histogram = LatencyHistogram(buckets_ms=(1, 10, 100, float('inf')))
+
+        for ms in [0.5] * 98 + [50, 5000]:
+            histogram.record('predict', ms / 1000)
+        report = histogram.snapshot()['predict']
+
+        assert report['count'] == 100
+        assert report['buckets'] == {'1': 98, '10': 0, '100': 1, 'inf': 1}
+        assert report['p50_ms'] == 1
+        assert report['p99_ms'] == 100
+        assert report['max_ms'] == 5000
+        json.dumps(histogram.snapshot())
+
+    @pytest.mark.unit
+    def test_time_and_reset(self):
+        """Test timing a block and clearing the histogram"""
+        from utils.capture_client import LatencyHistogram
+        histogram = LatencyHistogram()
+
+        with pytest.raises(ValueError):
+            with histogram.time('gpio'):
+                raise ValueError('pin write failed')
+
+        assert histogram.snapshot()['gpio']['count'] == 1
+        histogram.reset()
+        assert histogram.snapshot() == {}
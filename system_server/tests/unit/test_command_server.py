@@ -0,0 +1,349 @@
+"""
+Unit tests for tcp/command_server.py and the tcp_server command handlers
+"""
+import asyncio
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import types
+import pytest
+from unittest.mock import MagicMock, patch
+
+# tcp/ modules import their siblings by bare name, like when run as scripts
+TCP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tcp'))
+if TCP_DIR not in sys.path:
+    sys.path.insert(0, TCP_DIR)
+
+
+async def _request(port, payload, read_size=65536):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(payload)
+    await writer.drain()
+    response = await reader.read(read_size)
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+def _run(server, scenario):
+    """Start the server on an ephemeral port, run scenario(port) and shut down"""
+    async def main():
+        await server.start()
+        try:
+            return await scenario(server.port)
+        finally:
+            # let connection handlers finish closing before the loop goes away
+            await asyncio.sleep(0.05)
+            server.server.close()
+            await server.server.wait_closed()
+            server.executor.shutdown(wait=False)
+    return asyncio.run(main())
+
+
+def _server(handle_command, **kwargs):
+    from command_server import CommandServer
+    return CommandServer(handle_command, host='127.0.0.1', port=0, **kwargs)
+
+
+class TestCommandServer:
+    """Tests for the asyncio command server"""
+
+    @pytest.mark.unit
+    def test_serves_clients_concurrently(self):
+        """Test that a slow command on one connection does not block another client"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def handle_command(session, data):
+            barrier.wait()
+            return b'ok:' + data
+
+        async def scenario(port):
+            return await asyncio.gather(_request(port, b'one'), _request(port, b'two'))
+
+        assert _run(_server(handle_command), scenario) == [b'ok:one', b'ok:two']
+
+    @pytest.mark.unit
+    def test_session_state_per_connection(self):
+        """Test that each connection gets its own session loaded on connect"""
+        def on_connect(session):
+            session.data['greeting'] = f'hello {session.client_address[0]}'
+
+        def handle_command(session, data):
+            return f"{session.data['greeting']} #{session.commands}".encode('utf-8')
+
+        async def scenario(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            for command in (b'a', b'b'):
+                writer.write(command)
+                await writer.drain()
+                responses.append(await reader.read(100))
+            writer.close()
+            await writer.wait_closed()
+            responses.append(await _request(port, b'c'))
+            return responses
+
+        responses = _run(_server(handle_command, on_connect=on_connect), scenario)
+
+        assert responses == [b'hello 127.0.0.1 #1', b'hello 127.0.0.1 #2', b'hello 127.0.0.1 #1']
+
+    @pytest.mark.unit
+    def test_request_timeout(self):
+        """Test that a command past the request timeout gets a timeout response"""
+        release = threading.Event()
+
+        def handle_command(session, data):
+            release.wait(5)
+            return b'late'
+
+        async def scenario(port):
+            try:
+                return await _request(port, b'slow')
+            finally:
+                release.set()
+
+        assert _run(_server(handle_command, request_timeout=0.1), scenario) == b'request timed out\n'
+
+    @pytest.mark.unit
+    def test_handler_error(self):
+        """Test that an unexpected handler error is reported and the connection stays usable"""
+        def handle_command(session, data):
+            if data == b'bad':
+                raise ValueError('boom')
+            return b'good'
+
+        async def scenario(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            for command in (b'bad', b'fine'):
+                writer.write(command)
+                await writer.drain()
+                responses.append(await reader.read(100))
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+        assert _run(_server(handle_command), scenario) == [b'request failed\n', b'good']
+
+    @pytest.mark.unit
+    def test_sessions_tracked_while_connected(self):
+        """Test that sessions are registered while connected and dropped on disconnect"""
+        seen = []
+        server = _server(lambda session, data: seen.append(len(server.sessions)) or b'ok')
+
+        async def scenario(port):
+            await _request(port, b'x')
+            await asyncio.sleep(0.05)
+            return len(server.sessions)
+
+        assert _run(server, scenario) == 0
+        assert seen == [1]
+
+    @pytest.mark.unit
+    def test_pipelined_commands(self):
+        """Test that newline framed commands sent together each get a framed response"""
+        def on_connect(session):
+            session.newline_responses = True
+
+        async def scenario(port):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'help\nGPIread\n{"1":')
+            writer.write(b' true}\n')
+            await writer.drain()
+            responses = [await reader.readline() for _ in range(3)]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+        responses = _run(_server(lambda session, data: b'got ' + data, on_connect=on_connect), scenario)
+
+        assert responses == [b'got help\n', b'got GPIread\n', b'got {"1": true}\n']
+
+    @pytest.mark.unit
+    def test_newline_responses_off_by_default(self):
+        """Test that a newline framed command gets its response unchanged unless enabled"""
+        async def scenario(port):
+            return await _request(port, b'help\n')
+
+        assert _run(_server(lambda session, data: b'got ' + data), scenario) == b'got help'
+
+    @pytest.mark.unit
+    def test_partial_command_flushed(self):
+        """Test that an unfinished command is still handled after PARTIAL_TIMEOUT"""
+        async def scenario(port):
+            return await asyncio.wait_for(_request(port, b'{"broken": '), 2)
+
+        assert _run(_server(lambda session, data: b'got ' + data), scenario) == b'got {"broken": '
+
+
+@pytest.fixture
+def tcp_server():
+    """tcp_server imported with stand-in hardware modules and mongomock collections"""
+    import mongomock
+
+    gpio_helper = types.ModuleType('gpio_helper')
+    gpio_helper.read_all_gpio_states_as_json = MagicMock(
+        return_value={'inputs': [0] * 8, 'outputs': [1] * 8})
+    gpio_helper.set_pin_state = MagicMock(return_value='on')
+    csv_logger = types.ModuleType('gpio_csv_logger')
+    csv_logger.log_signal = MagicMock()
+
+    with patch.dict(sys.modules, {'gpio_helper': gpio_helper, 'gpio_csv_logger': csv_logger}), \
+         patch('ctypes.CDLL'), \
+         patch('pymongo.MongoClient', mongomock.MongoClient):
+        sys.modules.pop('tcp_server', None)
+        module = importlib.import_module('tcp_server')
+        module.io_ref.insert_one({'ioType': 'TCP', 'ioVal': 'cmd1', 'modelName': 'model',
+                                  'modelVersion': 3, 'cameraId': 0, 'presetId': 'p1'})
+        module.config_ref.insert_one({'type': 'tcp_config', 'packet_header': False, 'score': False})
+        module.util_ref.insert_one({'type': 'id_token', 'token': 'tok'})
+        yield module
+        if hasattr(module, 'pulses'):
+            module.pulses.stop()
+        sys.modules.pop('tcp_server', None)
+
+
+def _session(module):
+    from command_server import Session
+    session = Session(('10.0.0.5', 40000))
+    module.load_session(session)
+    return session
+
+
+class TestHandleCommand:
+    """Tests for the tcp_server command protocol"""
+
+    @pytest.mark.unit
+    def test_help_lists_presets(self, tcp_server):
+        """Test that help lists the commands loaded for the session"""
+        response = json.loads(tcp_server.handle_command(_session(tcp_server), b'help'))
+
+        assert response['commands']['Run Prediction']['Valid Commands (based on your presets)'] == ['cmd1']
+
+    @pytest.mark.unit
+    def test_newline_responses_from_config(self, tcp_server):
+        """Test that tcp_config newline_responses turns on newline terminated responses"""
+        assert _session(tcp_server).newline_responses is False
+
+        tcp_server.config_ref.update_one({'type': 'tcp_config'}, {'$set': {'newline_responses': True}})
+        tcp_server.cache.invalidate(['config'])
+
+        assert _session(tcp_server).newline_responses is True
+
+    @pytest.mark.unit
+    def test_gpio_reads(self, tcp_server):
+        """Test GPIread and GPOread responses"""
+        session = _session(tcp_server)
+
+        assert json.loads(tcp_server.handle_command(session, b'GPIread')) == {'inputs': [0] * 8}
+        assert json.loads(tcp_server.handle_command(session, b'GPOread')) == {'outputs': [1] * 8}
+
+    @pytest.mark.unit
+    def test_pin_command(self, tcp_server):
+        """Test that single character commands set output pins"""
+        assert tcp_server.handle_command(_session(tcp_server), b'{"1": true}') == b'on\n'
+        tcp_server.set_pin_state.assert_called_once_with('1', True)
+
+    @pytest.mark.unit
+    def test_invalid_command(self, tcp_server):
+        """Test unknown and unparsable commands"""
+        session = _session(tcp_server)
+
+        assert tcp_server.handle_command(session, b'{"nope": {}}') == b'Invalid Command\n'
+        assert tcp_server.handle_command(session, b'garbage') == b'Invalid Command\n'
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('packet_header', [False, True])
+    def test_prediction_command(self, tcp_server, packet_header):
+        """Test that preset commands call the predict endpoint and filter the result"""
+        tcp_server.config_ref.update_one({'type': 'tcp_config'}, {'$set': {'packet_header': packet_header}})
+        session = _session(tcp_server)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {'pass_fail': 'PASS', 'score': 0.9}
+
+        with patch.object(tcp_server.capture, 'get', return_value=resp) as mock_get:
+            response = tcp_server.handle_command(session, b'{"cmd1": {"did": "42"}}')
+
+        url = mock_get.call_args[0][0]
+        assert url.startswith('/api/capture/predict/snap/model/3/0?')
+        assert 'workstation=TCP: 10.0.0.5:cmd1' in url and url.endswith('&preset_id=p1&did=42')
+        assert mock_get.call_args[1]['headers'] == {'Authorization': 'Bearer tok'}
+        body = b'{"pass_fail": "PASS"}'
+        if packet_header:
+            assert response == b'\x01' + str(len(body)).encode() + b'\x02' + body + b'\x03\x0d'
+        else:
+            assert response == body
+
+    @pytest.mark.unit
+    def test_prediction_failure(self, tcp_server):
+        """Test the response when the predict endpoint fails"""
+        with patch.object(tcp_server.capture, 'get', return_value=MagicMock(status_code=500)):
+            assert tcp_server.handle_command(_session(tcp_server), b'{"cmd1": {}}') == b'request failed\n'
+
+    @pytest.mark.unit
+    def test_no_mongo_reads_per_trigger(self, tcp_server):
+        """Test that presets, config and token are cached after the session is loaded"""
+        session = _session(tcp_server)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {'pass_fail': 'PASS'}
+
+        with patch.object(tcp_server.io_ref, 'find') as find, \
+             patch.object(tcp_server.config_ref, 'find_one') as config_find, \
+             patch.object(tcp_server.util_ref, 'find_one') as util_find, \
+             patch.object(tcp_server.capture, 'get', return_value=resp):
+            for _ in range(3):
+                tcp_server.handle_command(session, b'{"cmd1": {}}')
+
+        assert find.call_count == config_find.call_count == util_find.call_count == 0
+
+    @pytest.mark.unit
+    def test_rejected_token_reloaded(self, tcp_server):
+        """Test that a 401 reloads the cached token and retries once"""
+        session = _session(tcp_server)
+        tcp_server.util_ref.update_one({'type': 'id_token'}, {'$set': {'token': 'new'}})
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {'pass_fail': 'PASS'}
+
+        with patch.object(tcp_server.capture, 'get', side_effect=[MagicMock(status_code=401), ok]) as mock_get:
+            assert tcp_server.handle_command(session, b'{"cmd1": {}}') == b'{"pass_fail": "PASS"}'
+
+        assert [c[1]['headers'] for c in mock_get.call_args_list] == [
+            {'Authorization': 'Bearer tok'}, {'Authorization': 'Bearer new'}]
+
+    @pytest.mark.unit
+    def test_latency_command(self, tcp_server):
+        """Test that trigger and gpio timings are reported by the latency command"""
+        session = _session(tcp_server)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {'pass_fail': 'PASS'}
+
+        with patch.object(tcp_server.capture.session, 'request', return_value=resp), \
+             patch.object(tcp_server.platform, 'processor', return_value='x86_64'):
+            tcp_server.handle_command(session, b'{"cmd1": {}}')
+            tcp_server.handle_command(session, b'{"cmd1": {}}')
+        report = json.loads(tcp_server.handle_command(session, b'latency'))
+
+        assert report['trigger']['count'] == report['predict']['count'] == report['gpio']['count'] == 2
+        assert sum(report['trigger']['buckets'].values()) == 2
+
+    @pytest.mark.unit
+    def test_response_not_delayed_by_pulse(self, tcp_server):
+        """Test that the prediction response is sent while the pass pin is still pulsing"""
+        tcp_server.config_ref.update_one({'type': 'tcp_config'}, {'$set': {'pulse_ms': 300}})
+        session = _session(tcp_server)
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {'pass_fail': 'PASS'}
+
+        with patch.object(tcp_server.capture, 'get', return_value=resp), \
+             patch.object(tcp_server.platform, 'processor', return_value='x86_64'):
+            start = time.monotonic()
+            tcp_server.handle_command(session, b'{"cmd1": {}}')
+            elapsed = time.monotonic() - start
+
+        assert elapsed < 0.2
+        assert tcp_server.pulses.active() == {tcp_server.PASS_PIN}
+        tcp_server.pulses.stop()
+        assert tcp_server.pin_state_ref.find_one({'type': 'gpio_pin_state'})['GPO5'] is False
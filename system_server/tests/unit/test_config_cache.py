@@ -0,0 +1,171 @@
+"""
+Unit tests for utils/config_cache.py
+"""
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+@pytest.fixture
+def collections():
+    import mongomock
+    db = mongomock.MongoClient()['fvonprem']
+    db['io_presets'].insert_one({'ioType': 'TCP', 'ioVal': 'cmd1'})
+    db['utils'].insert_one({'type': 'id_token', 'token': 'tok'})
+    return db
+
+
+def _cache(db, ttl=30):
+    from utils.config_cache import ConfigCache
+    cache = ConfigCache(ttl=ttl)
+    presets = MagicMock(side_effect=lambda: [p['ioVal'] for p in db['io_presets'].find()])
+    token = MagicMock(side_effect=lambda: db['utils'].find_one({'type': 'id_token'})['token'])
+    cache.register('presets', db['io_presets'], presets)
+    cache.register('token', db['utils'], token)
+    return cache, presets, token
+
+
+class _Stream(object):
+    """Stand-in for a change stream yielding the given events"""
+    def __init__(self, events):
+        self.events = events
+
+    def __enter__(self):
+        return self.events
+
+    def __exit__(self, *args):
+        return False
+
+
+class TestConfigCache:
+    """Tests for the TCP server config cache"""
+
+    @pytest.mark.unit
+    def test_loads_once(self, collections):
+        """Test that repeated gets are served from memory"""
+        cache, presets, _ = _cache(collections)
+
+        assert cache.get('presets') == ['cmd1']
+        assert cache.get('presets') == ['cmd1']
+        assert presets.call_count == 1
+
+    @pytest.mark.unit
+    def test_ttl_fallback(self, collections):
+        """Test that entries expire after the ttl while there is no change stream"""
+        cache, presets, _ = _cache(collections, ttl=10)
+
+        with patch('utils.config_cache.time.time', return_value=1000):
+            cache.get('presets')
+        collections['io_presets'].insert_one({'ioType': 'TCP', 'ioVal': 'cmd2'})
+        with patch('utils.config_cache.time.time', return_value=1005):
+            assert cache.get('presets') == ['cmd1']
+        with patch('utils.config_cache.time.time', return_value=1011):
+            assert cache.get('presets') == ['cmd1', 'cmd2']
+        assert presets.call_count == 2
+
+    @pytest.mark.unit
+    def test_no_expiry_while_watching(self, collections):
+        """Test that entries are kept past the ttl while the change stream is open"""
+        cache, presets, _ = _cache(collections, ttl=10)
+        cache.watching = True
+
+        with patch('utils.config_cache.time.time', return_value=1000):
+            cache.get('presets')
+        with patch('utils.config_cache.time.time', return_value=5000):
+            cache.get('presets')
+        assert presets.call_count == 1
+
+    @pytest.mark.unit
+    def test_invalidate(self, collections):
+        """Test invalidating one entry and all entries"""
+        cache, presets, token = _cache(collections)
+        cache.get('presets')
+        cache.get('token')
+
+        cache.invalidate(['token'])
+        cache.get('presets')
+        cache.get('token')
+        assert (presets.call_count, token.call_count) == (1, 2)
+
+        cache.invalidate()
+        cache.get('presets')
+        cache.get('token')
+        assert (presets.call_count, token.call_count) == (2, 3)
+
+    @pytest.mark.unit
+    def test_value_invalidated_while_loading_not_kept(self, collections):
+        """Test that a load racing with an invalidation is not cached"""
+        cache, _, _ = _cache(collections)
+        cache.loaders['token'] = MagicMock(side_effect=lambda: cache.invalidate() or 'stale')
+
+        assert cache.get('token') == 'stale'
+        assert 'token' not in cache.entries
+
+    @pytest.mark.unit
+    def test_get_nowait_serves_stale_while_reloading(self, collections):
+        """Test that an invalidated entry is served stale and reloaded once in the background"""
+        import threading
+        cache, presets, _ = _cache(collections)
+        cache.warm()
+        release = threading.Event()
+        cache.loaders['presets'] = MagicMock(side_effect=lambda: release.wait(5) and ['cmd1', 'cmd2'])
+        collections['io_presets'].insert_one({'ioType': 'TCP', 'ioVal': 'cmd2'})
+
+        cache.invalidate()
+        assert cache.get_nowait('presets') == ['cmd1']
+        assert cache.get_nowait('presets') == ['cmd1']
+        release.set()
+
+        for _ in range(200):
+            if not cache.refreshing:
+                break
+            time.sleep(0.01)
+        assert cache.get_nowait('presets') == ['cmd1', 'cmd2']
+        assert cache.loaders['presets'].call_count == 1
+        assert presets.call_count == 1
+
+    @pytest.mark.unit
+    def test_get_nowait_loads_when_never_loaded(self, collections):
+        """Test that get_nowait falls back to a normal load when there is nothing to serve"""
+        cache, presets, _ = _cache(collections)
+
+        assert cache.get_nowait('presets') == ['cmd1']
+        assert presets.call_count == 1
+        assert not cache.refreshing
+
+    @pytest.mark.unit
+    def test_change_stream_invalidates_collection(self, collections):
+        """Test that a change event drops only the entries loaded from its collection"""
+        cache, _, _ = _cache(collections)
+        seen = {}
+
+        def events():
+            seen['watching'] = cache.watching
+            cache.get('presets')
+            cache.get('token')
+            yield {'operationType': 'update', 'ns': {'db': 'fvonprem', 'coll': 'utils'}}
+            seen['cached'] = set(cache.entries)
+
+        database = MagicMock()
+        database.watch.return_value = _Stream(events())
+
+        with patch('utils.config_cache.time.sleep', side_effect=KeyboardInterrupt), pytest.raises(KeyboardInterrupt):
+            cache.watch(database)
+
+        pipeline = database.watch.call_args[0][0]
+        assert set(pipeline[0]['$match']['ns.coll']['$in']) == {'io_presets', 'utils'}
+        assert seen == {'watching': True, 'cached': {'presets'}}
+        assert cache.entries == {} and cache.watching is False
+
+    @pytest.mark.unit
+    def test_change_stream_unavailable(self, collections):
+        """Test that a standalone mongod falls back to the ttl"""
+        from pymongo.errors import OperationFailure
+        cache, _, _ = _cache(collections)
+        database = MagicMock()
+        database.watch.side_effect = OperationFailure('only supported on replica sets')
+
+        with patch('utils.config_cache.time.sleep', side_effect=KeyboardInterrupt), pytest.raises(KeyboardInterrupt):
+            cache.watch(database)
+
+        assert cache.watching is False
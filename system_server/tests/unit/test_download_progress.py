@@ -0,0 +1,170 @@
+"""
+Unit tests for worker_scripts/download_progress.py
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _reporter(total, **kwargs):
+    from worker_scripts.download_progress import ProgressReporter
+    clock = Clock()
+    report = MagicMock()
+    return ProgressReporter(report, total, clock=clock, **kwargs), report, clock
+
+
+class TestProgressReporter:
+    """Tests for throttled progress reports"""
+
+    @pytest.mark.unit
+    def test_reports_only_on_percent_change(self):
+        """Test that thousands of small chunks give one report per percent"""
+        progress, report, clock = _reporter(100 * 1000)
+
+        for _ in range(10000):
+            progress.advance(10)
+            clock.now += 0.0001
+        progress.finish()
+
+        percents = [c[0][0] for c in report.call_args_list]
+        assert percents == list(range(0, 101))
+
+    @pytest.mark.unit
+    def test_reports_on_interval(self):
+        """Test that a stalled percentage is still reported every interval"""
+        progress, report, clock = _reporter(1000, interval=2)
+
+        progress.advance(100)
+        clock.now += 1
+        progress.advance(1)
+        clock.now += 1.5
+        progress.advance(1)
+
+        assert [c[0][0] for c in report.call_args_list] == [10, 10]
+
+    @pytest.mark.unit
+    def test_rate_and_eta(self):
+        """Test MB/s and seconds left"""
+        from worker_scripts.download_progress import MB
+        progress, report, clock = _reporter(10 * MB)
+
+        clock.now += 2
+        progress.advance(4 * MB)
+
+        report.assert_called_once_with(40, 2.0, 3)
+
+    @pytest.mark.unit
+    def test_span(self):
+        """Test that a download covering part of a job reports inside its share"""
+        progress, report, clock = _reporter(200, start=50, span=25)
+
+        progress.advance(100)
+        progress.advance(100)
+
+        assert [c[0][0] for c in report.call_args_list] == [62, 75]
+
+    @pytest.mark.unit
+    def test_unknown_size(self):
+        """Test that without a Content-length the share is reported when finished"""
+        progress, report, clock = _reporter(0, start=0, span=50)
+
+        progress.advance(100)
+        clock.now += 0.1
+        progress.advance(100)
+        progress.finish()
+
+        assert [c[0][0] for c in report.call_args_list] == [0, 50]
+        assert report.call_args_list[0][0][2] is None
+
+
+class TestProgressGroup:
+    """Tests for one progress stream over concurrent downloads"""
+
+    @pytest.mark.unit
+    def test_equal_shares(self):
+        """Test that each download is an equal share of the span, whatever its size"""
+        from worker_scripts.download_progress import ProgressGroup
+        clock, report = Clock(), MagicMock()
+        group = ProgressGroup(report, 2, start=50, span=50, clock=clock)
+        small, large = group.item(), group.item()
+
+        small.begin(10)
+        large.begin(1000)
+        small.advance(10)
+        large.advance(500)
+        small.finish()
+        large.advance(500)
+        large.finish()
+        group.finish()
+
+        assert [c[0][0] for c in report.call_args_list] == [50, 75, 88, 100]
+
+    @pytest.mark.unit
+    def test_resumed_bytes(self):
+        """Test that resumed bytes count towards the percentage but not the rate"""
+        from worker_scripts.download_progress import ProgressGroup, MB
+        clock, report = Clock(), MagicMock()
+        group = ProgressGroup(report, 1, clock=clock)
+        item = group.item()
+
+        item.begin(10 * MB, offset=6 * MB)
+        clock.now += 2
+        item.advance(2 * MB)
+
+        assert report.call_args_list[-1][0] == (80, 1.0, 2)
+
+    @pytest.mark.unit
+    def test_threads(self):
+        """Test that items advanced from several threads add up"""
+        import threading
+        from worker_scripts.download_progress import ProgressGroup
+        report = MagicMock()
+        group = ProgressGroup(report, 4)
+
+        def download():
+            item = group.item()
+            item.begin(1000)
+            for _ in range(100):
+                item.advance(10)
+            item.finish()
+
+        threads = [threading.Thread(target=download) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert group.written == 4000
+        assert report.call_args_list[-1][0][0] == 100
+
+
+class TestDownloadByLinkProgress:
+    """Tests for progress reporting from retrieve_models.download_by_link"""
+
+    @pytest.mark.unit
+    @patch('requests.Session.get')
+    def test_few_progress_writes(self, mock_get, tmp_path):
+        """Test that a many-chunk download writes progress a bounded number of times"""
+        from worker_scripts import retrieve_models
+
+        link = MagicMock()
+        link.json.return_value = 'https://signed-url.com/model.zip'
+        download = MagicMock()
+        download.headers = {'Content-length': str(5000 * 100)}
+        download.iter_content.return_value = [b'x' * 100] * 5000
+        download.__enter__.return_value = download
+        mock_get.side_effect = [link, download]
+
+        with patch.object(retrieve_models, 'update_job_progress') as update:
+            retrieve_models.download_by_link('token', 'p1', '1', str(tmp_path / 'model.zip'))
+
+        assert update.call_count <= 101
+        assert update.call_args[0][0] == 100
+        assert (tmp_path / 'model.zip').stat().st_size == 500000
@@ -0,0 +1,186 @@
+"""
+Unit tests for gpio/edge_monitor.py and the gpio/fake_gpio.py shim
+"""
+import os
+import sys
+import time
+import pytest
+
+GPIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'gpio'))
+if GPIO_DIR not in sys.path:
+    sys.path.append(GPIO_DIR)
+
+from edge_monitor import EdgeMonitor
+from fake_gpio import FakeGpioLib
+
+
+def _read(lib):
+    def read():
+        state = lib.read_all_gpio_states()
+        return state.inputs | state.outputs << 8
+    return read
+
+
+def _wait(lib):
+    def wait(timeout):
+        state = lib.wait_gpio_change(int(timeout * 1000))
+        return state.inputs | state.outputs << 8
+    return wait
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestSample:
+    """Tests for edge detection on single readings"""
+
+    @pytest.mark.unit
+    def test_first_reading_dispatches_everything(self):
+        """Test that the caller is told about every pin on the first reading"""
+        edges = []
+        monitor = EdgeMonitor(None, lambda state, changed: edges.append((state, changed)))
+
+        assert monitor.sample(0xffff) == 0xffff
+        assert edges == [(0xffff, 0xffff)]
+
+    @pytest.mark.unit
+    def test_dispatches_only_transitions(self):
+        """Test that unchanged readings dispatch nothing and changes report the flipped bits"""
+        edges = []
+        monitor = EdgeMonitor(None, lambda state, changed: edges.append((state, changed)))
+        monitor.sample(0xffff)
+
+        for _ in range(100):
+            monitor.sample(0xffff)
+        monitor.sample(0xfffb)
+        monitor.sample(0x7ffb)
+
+        assert edges[1:] == [(0xfffb, 0x0004), (0x7ffb, 0x8000)]
+        assert monitor.samples == 103 and monitor.edges == 3
+
+    @pytest.mark.unit
+    def test_debounce_per_pin(self):
+        """Test that a debounced pin has to hold its value while other pins dispatch at once"""
+        edges = []
+        monitor = EdgeMonitor(None, lambda state, changed: edges.append(changed), debounce={0: 0.01})
+        monitor.sample(0xff, now=0)
+        edges.clear()
+
+        assert monitor.sample(0xfe, now=1.000) == 0
+        assert monitor.sample(0xfc, now=1.005) == 0x02
+        assert monitor.sample(0xfc, now=1.011) == 0x01
+        assert edges == [0x02, 0x01]
+
+    @pytest.mark.unit
+    def test_debounce_drops_bounce(self):
+        """Test that a glitch shorter than the debounce is never dispatched"""
+        edges = []
+        monitor = EdgeMonitor(None, lambda state, changed: edges.append(changed), debounce={0: 0.01})
+        monitor.sample(0xff, now=0)
+        edges.clear()
+
+        monitor.sample(0xfe, now=1.000)
+        monitor.sample(0xff, now=1.002)
+        monitor.sample(0xfe, now=1.004)
+        monitor.sample(0xfe, now=1.012)
+
+        assert monitor.pending == {0: 1.004}
+        assert edges == []
+
+    @pytest.mark.unit
+    def test_handler_error_does_not_stop_monitor(self):
+        """Test that a failing edge handler is reported and the state still advances"""
+        def on_edges(state, changed):
+            raise RuntimeError('mongo down')
+
+        monitor = EdgeMonitor(None, on_edges)
+        monitor.sample(0xff)
+
+        assert monitor.sample(0xfe) == 0x01
+        assert monitor.state == 0xfe
+
+
+class TestBackends:
+    """Tests for the sampler thread against the fake gpio.so"""
+
+    @pytest.mark.unit
+    def test_poll_backend(self):
+        """Test that a press and release on the fake board are dispatched as two edges"""
+        lib = FakeGpioLib()
+        edges = []
+        monitor = EdgeMonitor(_read(lib), lambda state, changed: edges.append((state & 0xff, changed)))
+        monitor.start()
+        try:
+            assert _wait_for(lambda: monitor.samples > 0)
+            lib.press(3)
+            assert _wait_for(lambda: len(edges) == 2)
+            lib.release(3)
+            assert _wait_for(lambda: len(edges) == 3)
+        finally:
+            monitor.stop()
+
+        assert edges[1:] == [(0xfb, 0x04), (0xff, 0x04)]
+        stats = monitor.stats()
+        assert stats['backend'] == 'poll'
+        assert stats['sample_rate_hz'] > 0 and stats['cpu_percent'] >= 0
+
+    @pytest.mark.unit
+    def test_interrupt_backend(self):
+        """Test that the driver wait is used instead of polling when available"""
+        lib = FakeGpioLib(interrupts=True)
+        edges = []
+        monitor = EdgeMonitor(_read(lib), lambda state, changed: edges.append(changed),
+                              wait=_wait(lib), idle_timeout=0.05)
+        monitor.start()
+        try:
+            time.sleep(0.2)
+            lib.press(1)
+            assert _wait_for(lambda: len(edges) == 2)
+        finally:
+            monitor.stop()
+
+        assert edges[1] == 0x01
+        assert monitor.backend == 'interrupt'
+        # woken by the change and the idle timeouts, not every millisecond
+        assert lib.read_all_gpio_states.calls == 1
+        assert monitor.samples < 20
+
+    @pytest.mark.unit
+    def test_interrupt_backend_polls_during_debounce(self):
+        """Test that a pending debounce is resolved without waiting for another interrupt"""
+        lib = FakeGpioLib(interrupts=True)
+        edges = []
+        monitor = EdgeMonitor(_read(lib), lambda state, changed: edges.append(changed),
+                              wait=_wait(lib), debounce={1: 0.02}, idle_timeout=5)
+        monitor.start()
+        try:
+            assert _wait_for(lambda: monitor.samples > 0)
+            lib.press(2)
+            assert _wait_for(lambda: len(edges) == 2, timeout=1)
+        finally:
+            lib.release(2)
+            monitor.stop()
+
+        assert edges[1] == 0x02
+
+
+class TestFakeGpioLib:
+    """Tests for the fake gpio.so"""
+
+    @pytest.mark.unit
+    def test_pins_read_like_the_board(self):
+        """Test active low inputs and outputs"""
+        lib = FakeGpioLib()
+
+        lib.press(2)
+        lib.set_gpio(1, 5, 0)
+        state = lib.read_all_gpio_states()
+
+        assert (state.inputs, state.outputs) == (0xfd, 0xef)
+        assert lib.read_gpo(5) == 0 and lib.read_gpo(6) == 1
+        assert lib.read_gpi(2) == 0 and lib.read_gpi(3) == 3
+        assert not hasattr(lib, 'wait_gpio_change')
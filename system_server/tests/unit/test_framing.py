@@ -0,0 +1,172 @@
+"""
+Unit tests for tcp/framing.py
+"""
+import os
+import struct
+import sys
+import pytest
+
+TCP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tcp'))
+if TCP_DIR not in sys.path:
+    sys.path.insert(0, TCP_DIR)
+
+from framing import Frame, FrameParser, encode_response
+
+
+def _feed_bytewise(parser, data):
+    frames = []
+    for i in range(len(data)):
+        frames.extend(parser.feed(data[i:i + 1]))
+    return frames
+
+
+class TestNewlineFraming:
+    """Tests for newline delimited commands"""
+
+    @pytest.mark.unit
+    def test_pipelined_commands(self):
+        """Test that several commands in one segment are split"""
+        frames = FrameParser().feed(b'help\r\nGPIread\n{"1": true}\n')
+
+        assert frames == [Frame(b'help', 'newline'), Frame(b'GPIread', 'newline'),
+                          Frame(b'{"1": true}', 'newline')]
+
+    @pytest.mark.unit
+    def test_partial_command_buffered(self):
+        """Test that a command split over reads is held until its newline arrives"""
+        parser = FrameParser(mode='newline')
+
+        assert parser.feed(b'{"cmd1": {"did": ') == []
+        assert parser.pending
+        assert parser.feed(b'"42"}}\nGPO') == [Frame(b'{"cmd1": {"did": "42"}}', 'newline')]
+        assert parser.feed(b'read\n') == [Frame(b'GPOread', 'newline')]
+        assert not parser.pending
+
+
+class TestStxFraming:
+    """Tests for STX/ETX framed commands"""
+
+    @staticmethod
+    def _stx(payload):
+        return b'\x01' + str(len(payload)).encode() + b'\x02' + payload + b'\x03\x0d'
+
+    @pytest.mark.unit
+    def test_stx_frames(self):
+        """Test back to back STX/ETX frames, including one longer than the old 100 byte read"""
+        long_command = b'{"cmd1": {"did": "' + b'9' * 200 + b'"}}'
+        frames = FrameParser().feed(self._stx(b'GPIread') + self._stx(long_command))
+
+        assert frames == [Frame(b'GPIread', 'stx'), Frame(long_command, 'stx')]
+
+    @pytest.mark.unit
+    def test_stx_bytewise(self):
+        """Test that STX/ETX frames survive arriving one byte at a time"""
+        data = self._stx(b'help') + self._stx(b'{"1": false}')
+
+        assert _feed_bytewise(FrameParser(), data) == [Frame(b'help', 'stx'), Frame(b'{"1": false}', 'stx')]
+
+    @pytest.mark.unit
+    def test_stx_payload_may_contain_newlines(self):
+        """Test that the declared length wins over delimiters inside the payload"""
+        assert FrameParser().feed(self._stx(b'a\nb')) == [Frame(b'a\nb', 'stx')]
+
+    @pytest.mark.unit
+    def test_stx_bad_length(self):
+        """Test that a malformed header is dropped and parsing resynchronises"""
+        frames = FrameParser().feed(b'\x01xx\x02' + self._stx(b'help'))
+
+        assert frames[-1] == Frame(b'help', 'stx')
+
+
+class TestLengthFraming:
+    """Tests for length prefixed commands"""
+
+    @pytest.mark.unit
+    def test_length_prefixed(self):
+        """Test 4 byte big-endian length prefixes, split across reads"""
+        data = struct.pack('>I', 7) + b'GPIread' + struct.pack('>I', 4) + b'help'
+        parser = FrameParser()
+
+        assert parser.feed(data[:6]) == []
+        assert parser.feed(data[6:]) == [Frame(b'GPIread', 'length'), Frame(b'help', 'length')]
+
+
+class TestRawFraming:
+    """Tests for legacy clients that send commands without delimiters"""
+
+    @pytest.mark.unit
+    def test_single_command(self):
+        """Test that a bare command is handled as soon as it arrives"""
+        assert FrameParser().feed(b'GPIread') == [Frame(b'GPIread', 'raw')]
+        assert FrameParser().feed(b'{"1": true}') == [Frame(b'{"1": true}', 'raw')]
+
+    @pytest.mark.unit
+    def test_concatenated_commands(self):
+        """Test that commands coalesced into one segment are split"""
+        frames = FrameParser().feed(b'{"1": true}{"cmd1": {"did": "7"}}GPOread')
+
+        assert frames == [Frame(b'{"1": true}', 'raw'), Frame(b'{"cmd1": {"did": "7"}}', 'raw'),
+                          Frame(b'GPOread', 'raw')]
+
+    @pytest.mark.unit
+    def test_long_json_command_waits_for_rest(self):
+        """Test that a JSON command longer than one read is not truncated"""
+        command = b'{"cmd1": {"did": "' + b'1' * 150 + b'"}}'
+        parser = FrameParser()
+
+        assert parser.feed(command[:100]) == []
+        assert parser.feed(command[100:]) == [Frame(command, 'raw')]
+
+    @pytest.mark.unit
+    def test_partial_keyword_waits(self):
+        """Test that a keyword split over reads is reassembled"""
+        parser = FrameParser()
+
+        assert parser.feed(b'GPI') == []
+        assert parser.feed(b'read') == [Frame(b'GPIread', 'raw')]
+
+    @pytest.mark.unit
+    def test_invalid_command_passed_through(self):
+        """Test that unknown text is handed on so the client gets Invalid Command"""
+        assert FrameParser().feed(b'garbage') == [Frame(b'garbage', 'raw')]
+
+    @pytest.mark.unit
+    def test_flush_returns_partial(self):
+        """Test that flush gives up on an unfinished command"""
+        parser = FrameParser()
+        parser.feed(b'{"cmd1": ')
+
+        assert parser.flush() == [Frame(b'{"cmd1": ', 'raw')]
+        assert not parser.pending
+
+    @pytest.mark.unit
+    def test_max_frame(self):
+        """Test that an unterminated command cannot grow the buffer without bound"""
+        parser = FrameParser(max_frame=50)
+
+        frames = parser.feed(b'{"x": "' + b'a' * 60)
+
+        assert len(frames) == 1 and frames[0].kind == 'raw'
+        assert not parser.pending
+
+
+class TestEncodeResponse:
+    """Tests for framing responses like their commands"""
+
+    @pytest.mark.unit
+    def test_encode_response(self):
+        """Test each framing"""
+        assert encode_response(b'{"a": 1}', 'raw') == b'{"a": 1}'
+        assert encode_response(b'{"a": 1}', 'newline') == b'{"a": 1}'
+        assert encode_response(b'{"a": 1}', 'newline', newline=True) == b'{"a": 1}\n'
+        assert encode_response(b'on\n', 'newline', newline=True) == b'on\n'
+        assert encode_response(b'on\n', 'stx') == b'\x013\x02on\n\x03\x0d'
+        assert encode_response(b'on\n', 'length') == b'\x00\x00\x00\x03on\n'
+
+    @pytest.mark.unit
+    def test_stx_response_not_wrapped_twice(self):
+        """Test that responses already framed by packet_header are left alone"""
+        framed = b'\x018\x02{"a": 1}\x03\x0d'
+
+        assert encode_response(framed, 'stx') == framed
+
@@ -0,0 +1,221 @@
+"""
+Unit tests for gpio/gpio_controller.py, run against the fake gpio.so
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+GPIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'gpio'))
+
+
+@pytest.fixture
+def gpio_controller(monkeypatch):
+    """gpio_controller imported with FV_FAKE_GPIO and mongomock collections"""
+    import mongomock
+
+    monkeypatch.setenv('FV_FAKE_GPIO', '1')
+    # gpio/ and tcp/ both have a gpio_helper module, make sure gpio/ wins
+    monkeypatch.setattr(sys, 'path', [GPIO_DIR] + sys.path)
+    mongo = mongomock.MongoClient()
+    pins = {'GP%s%d' % (io, pin): False for io in 'IO' for pin in range(1, 9)}
+    mongo['fvonprem']['pin_state'].insert_one(dict(pins, type='gpio_pin_state'))
+    with patch.dict(sys.modules), patch('pymongo.MongoClient', return_value=mongo):
+        for name in ('gpio_helper', 'gpio_controller', 'fake_gpio', 'edge_monitor'):
+            sys.modules.pop(name, None)
+        module = importlib.import_module('gpio_controller')
+        module.socketio.emit = MagicMock()
+        module.init_gpio.pool.stop()
+        module.init_gpio.pool = MagicMock()
+        module.io_ref.insert_many([
+            {'ioVal': 'GPI3', 'presetId': 'a', 'cameraId': 0, 'modelName': 'm', 'modelVersion': 1},
+            {'ioVal': 'GPI3', 'presetId': 'b', 'cameraId': 1, 'modelName': 'm', 'modelVersion': 1},
+        ])
+        yield module
+        monitor = module.init_gpio.monitor
+        if monitor and monitor.thread:
+            monitor.stop()
+        module.init_gpio.store.stop()
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestHandleEdges:
+    """Tests for dispatching input edges"""
+
+    @pytest.mark.unit
+    def test_trigger_once_per_press(self, gpio_controller):
+        """Test that a press runs each preset once and held or extra pins do not retrigger"""
+        gpio = gpio_controller.init_gpio
+        submit = gpio.pool.submit
+
+        gpio.handle_edges(0xffff, 0xffff)
+        assert submit.call_count == 0
+
+        gpio.handle_edges(0xfffb, 0x0004)
+        assert [c[0][1]['presetId'] for c in submit.call_args_list] == ['a', 'b']
+        assert all(c[0][2] == 3 for c in submit.call_args_list)
+
+        gpio.handle_edges(0xffeb, 0x0010)
+        assert submit.call_count == 2
+
+        gpio.handle_edges(0xffff, 0x0014)
+        assert gpio.last_input_state == 'wait'
+        assert gpio.cur_pin_state['GPI3'] is False
+
+        gpio.handle_edges(0xfffb, 0x0004)
+        assert submit.call_count == 4
+
+    @pytest.mark.unit
+    def test_output_edge(self, gpio_controller):
+        """Test that an output change updates the GPO state without touching inputs"""
+        gpio = gpio_controller.init_gpio
+        gpio.handle_edges(0xffff, 0xffff)
+
+        gpio.handle_edges(0xefff, 0x1000)
+        gpio.store.flush()
+
+        assert gpio.cur_pin_state['GPO5'] is True
+        assert gpio_controller.pin_state_ref.find_one({'type': 'gpio_pin_state'})['GPO5'] is True
+        assert gpio_controller.init_gpio.pool.submit.call_count == 0
+
+    @pytest.mark.unit
+    def test_changes_coalesced_into_one_write(self, gpio_controller):
+        """Test that a press, release and re-press reach pin_state as one $set of the changed pin"""
+        gpio = gpio_controller.init_gpio
+        gpio.store.stop()
+        gpio.handle_edges(0xffff, 0xffff)
+        gpio.store.flush()
+        gpio_controller.socketio.emit.reset_mock()
+
+        with patch.object(gpio_controller.pin_state_ref, 'update_one') as update_one:
+            gpio.handle_edges(0xfffe, 0x0001)
+            gpio.handle_edges(0xffff, 0x0001)
+            gpio.handle_edges(0xfffe, 0x0001)
+            gpio.store.flush()
+
+        update_one.assert_called_once_with({'type': 'gpio_pin_state'}, {'$set': {'GPI1': True}}, True)
+        assert gpio_controller.socketio.emit.call_count == 1
+        assert gpio_controller.init_gpio.pool.submit.call_count == 0
+
+    @pytest.mark.unit
+    def test_result_hold_without_sleeping(self, gpio_controller):
+        """Test that the input stays on in the UI for RESULT_HOLD after inference, without blocking"""
+        gpio = gpio_controller.init_gpio
+        gpio_controller.RESULT_HOLD = 0.1
+        gpio.pin_switch_inference_start(2)
+
+        start = time.monotonic()
+        gpio.pin_switch_inference_end(2)
+        assert time.monotonic() - start < 0.05
+        assert gpio.cur_pin_state['GPI2'] is True
+
+        assert _wait_for(lambda: gpio_controller.pin_state_ref.find_one({'type': 'gpio_pin_state'})['GPI2'] is False)
+
+    @pytest.mark.unit
+    def test_presets_cached(self, gpio_controller):
+        """Test that triggers after the first do not query io_presets"""
+        gpio = gpio_controller.init_gpio
+        gpio.handle_edges(0xfffb, 0xffff)
+        gpio.handle_edges(0xffff, 0x0004)
+
+        with patch.object(gpio_controller.io_ref, 'find') as find:
+            gpio.handle_edges(0xfffb, 0x0004)
+
+        find.assert_not_called()
+        assert gpio.pool.submit.call_count == 4
+
+    @pytest.mark.unit
+    def test_changed_presets_not_read_on_edge_thread(self, gpio_controller):
+        """Test that after a preset change the edge is served from the cache and io_presets is read elsewhere"""
+        gpio = gpio_controller.init_gpio
+        gpio_controller.cache.warm(['presets'])
+        gpio.handle_edges(0xffff, 0xffff)
+        gpio_controller.cache.invalidate(['presets'])
+        readers = []
+        find = gpio_controller.io_ref.find
+
+        def recording_find(*args, **kwargs):
+            readers.append(threading.current_thread())
+            return find(*args, **kwargs)
+
+        with patch.object(gpio_controller.io_ref, 'find', side_effect=recording_find):
+            gpio.handle_edges(0xfffb, 0x0004)
+            assert gpio.pool.submit.call_count == 2
+            assert _wait_for(lambda: readers and not gpio_controller.cache.refreshing)
+
+        assert threading.current_thread() not in readers
+
+    @pytest.mark.unit
+    def test_all_dropped_releases_pin(self, gpio_controller):
+        """Test that the input is shown off again when every preset's job was dropped"""
+        gpio = gpio_controller.init_gpio
+        gpio.pool.submit.return_value = False
+        gpio_controller.RESULT_HOLD = 0
+
+        gpio.handle_edges(0xfffb, 0xffff)
+
+        assert _wait_for(lambda: gpio.cur_pin_state['GPI3'] is False)
+
+    @pytest.mark.unit
+    def test_inference_stats_route(self, gpio_controller):
+        """Test that /inference_stats reports the pool's stats"""
+        gpio_controller.init_gpio.pool.stats.return_value = {'queued': 2, 'dropped': 1}
+
+        stats = gpio_controller.app.test_client().get('/inference_stats').get_json()
+
+        assert stats == {'queued': 2, 'dropped': 1}
+
+
+class TestRun:
+    """Tests for the monitoring thread"""
+
+    @pytest.mark.unit
+    def test_press_on_fake_board(self, gpio_controller):
+        """Test that pressing a pin on the fake board triggers inference"""
+        gpio = gpio_controller.init_gpio
+        thread = threading.Thread(target=gpio.run, daemon=True)
+        thread.start()
+        assert _wait_for(lambda: gpio.monitor is not None and gpio.monitor.samples > 0)
+
+        gpio_controller.functions.press(3)
+        assert _wait_for(lambda: gpio_controller.init_gpio.pool.submit.call_count == 2)
+        gpio_controller.functions.release(3)
+        assert _wait_for(lambda: gpio.last_input_state == 'wait')
+        gpio.monitor.stop()
+        thread.join(2)
+
+        stats = gpio_controller.app.test_client().get('/monitor_stats').get_json()
+        assert stats['backend'] == 'poll'
+        assert stats['edges'] == 3
+
+    @pytest.mark.unit
+    def test_load_debounce(self, gpio_controller):
+        """Test reading per pin debounce from the gpio_config document"""
+        gpio_controller.config_ref.insert_one({'type': 'gpio_config', 'debounce_ms': {'GPI1': 5, 'GPI8': 20, 'GPO1': 1}})
+
+        assert gpio_controller.load_debounce() == {0: 0.005, 7: 0.02, 8: 0.001}
+
+
+class TestGpioHelper:
+    """Tests for gpio_helper against the fake gpio.so"""
+
+    @pytest.mark.unit
+    def test_toggle_pin_sets_one_pin(self, gpio_controller):
+        """Test that toggle_pin drives the pin and writes only its key"""
+        import gpio_helper
+
+        with patch.object(gpio_helper.pin_state_ref, 'update_one') as update_one:
+            gpio_helper.toggle_pin(2)
+
+        update_one.assert_called_once_with({'type': 'gpio_pin_state'}, {'$set': {'GPO2': True}}, True)
+        assert gpio_helper.read_pin_state().is_on('GPO2')
+        assert gpio_helper.read_all_gpio_states_as_json()['outputs'][1] == 0
@@ -0,0 +1,54 @@
+"""
+Unit tests for utils/http_session.py
+"""
+import pytest
+from unittest.mock import patch
+
+
+class TestBuildSession:
+    """Tests for build_session function"""
+
+    @pytest.mark.unit
+    def test_build_session_mounts_pooled_adapter(self):
+        """Test that http and https share a pooled adapter with the configured size"""
+        from utils.http_session import build_session
+
+        session = build_session(pool_size=4, max_retries=2, backoff_factor=0.1)
+
+        adapter = session.get_adapter('https://test.flexiblevision.com')
+        assert adapter is session.get_adapter('http://172.17.0.1')
+        assert adapter._pool_maxsize == 4
+        assert adapter.max_retries.total == 2
+        assert adapter.max_retries.backoff_factor == 0.1
+
+    @pytest.mark.unit
+    def test_build_session_does_not_retry_post_on_status(self):
+        """Test that non-idempotent requests are not retried on a bad status"""
+        from utils.http_session import build_session
+
+        retry = build_session().get_adapter('https://test.com').max_retries
+
+        assert retry.is_retry('GET', 503)
+        assert not retry.is_retry('POST', 503)
+
+
+class TestGetSession:
+    """Tests for get_session function"""
+
+    @pytest.mark.unit
+    def test_get_session_reused_within_process(self):
+        """Test that the same session is returned for repeated calls"""
+        from utils.http_session import get_session
+
+        assert get_session() is get_session()
+
+    @pytest.mark.unit
+    def test_get_session_rebuilt_after_fork(self):
+        """Test that a forked process gets its own session"""
+        from utils import http_session
+
+        parent = http_session.get_session()
+        with patch('utils.http_session.os.getpid', return_value=-1):
+            child = http_session.get_session()
+
+        assert child is not parent
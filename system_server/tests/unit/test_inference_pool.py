@@ -0,0 +1,193 @@
+"""
+Unit tests for gpio/inference_pool.py
+"""
+import os
+import sys
+import threading
+import time
+import pytest
+
+GPIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'gpio'))
+if GPIO_DIR not in sys.path:
+    sys.path.append(GPIO_DIR)
+
+from inference_pool import InferencePool, DROP_NEWEST, COALESCE
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class Recorder(object):
+    """run() for the pool: records its args, blocking while the gate is closed"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        self.gate.wait(2)
+        with self.lock:
+            self.active -= 1
+            self.calls.append(args)
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+def _pool(recorder, **kwargs):
+    pool = InferencePool(recorder, **kwargs)
+    pool.start()
+    return pool
+
+
+class TestInferencePool:
+    """Tests for the bounded per-preset inference pool"""
+
+    @pytest.mark.unit
+    def test_runs_jobs(self, recorder):
+        """Test that submitted jobs run with their args"""
+        recorder.gate.set()
+        pool = _pool(recorder)
+
+        assert pool.submit('a', 1) and pool.submit('b', 2)
+
+        assert _wait_for(lambda: sorted(recorder.calls) == [(1,), (2,)])
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_worker_bound(self, recorder):
+        """Test that no more than workers jobs run at once, and one per preset"""
+        pool = _pool(recorder, workers=2)
+        for key in 'abcd':
+            pool.submit(key, key)
+            pool.submit(key, key)
+
+        assert _wait_for(lambda: recorder.active == 2)
+        time.sleep(0.05)
+        assert recorder.peak == 2
+        assert pool.stats()['running'] == 2
+        recorder.gate.set()
+        assert _wait_for(lambda: len(recorder.calls) == 8)
+        assert recorder.peak == 2
+        assert len(pool.threads) == 2
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_drop_oldest(self, recorder):
+        """Test that a full queue drops its longest waiting job"""
+        pool = _pool(recorder, workers=1, queue_size=2)
+        pool.submit('a', 0)
+        assert _wait_for(lambda: recorder.active == 1)
+        assert all(pool.submit('a', n) for n in (1, 2, 3))
+
+        stats = pool.stats()
+        assert stats['queue_depth'] == {'a': 2}
+        assert stats['dropped'] == 1 and stats['dropped_by_preset'] == {'a': 1}
+        recorder.gate.set()
+        assert _wait_for(lambda: recorder.calls == [(0,), (2,), (3,)])
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_drop_newest(self, recorder):
+        """Test that a full queue rejects new jobs"""
+        pool = _pool(recorder, workers=1, queue_size=2, overflow=DROP_NEWEST)
+        pool.submit('a', 0)
+        assert _wait_for(lambda: recorder.active == 1)
+
+        assert [pool.submit('a', n) for n in (1, 2, 3)] == [True, True, False]
+        recorder.gate.set()
+        assert _wait_for(lambda: recorder.calls == [(0,), (1,), (2,)])
+        assert pool.stats()['dropped'] == 1
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_coalesce(self, recorder):
+        """Test that a preset keeps only the latest waiting trigger"""
+        pool = _pool(recorder, workers=1, queue_size=4, overflow=COALESCE)
+        pool.submit('a', 0)
+        assert _wait_for(lambda: recorder.active == 1)
+        for n in range(1, 6):
+            pool.submit('a', n)
+        pool.submit('b', 'x')
+
+        assert pool.stats()['queue_depth'] == {'a': 1, 'b': 1}
+        recorder.gate.set()
+        assert _wait_for(lambda: len(recorder.calls) == 3)
+        assert recorder.calls == [(0,), ('x',), (5,)]
+        assert pool.stats()['dropped'] == 4
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_coalesce_while_workers_busy(self, recorder):
+        """Test that coalesced triggers queued behind busy workers keep the workers alive"""
+        pool = _pool(recorder, workers=1, overflow=COALESCE)
+        pool.submit('b', 'x')
+        assert _wait_for(lambda: recorder.active == 1)
+        pool.submit('a', 1)
+        pool.submit('a', 2)
+        pool.submit('a', 3)
+
+        assert list(pool.ready) == ['a']
+        recorder.gate.set()
+        assert _wait_for(lambda: len(recorder.calls) == 2)
+        pool.submit('c', 'y')
+        assert _wait_for(lambda: len(recorder.calls) == 3)
+        assert recorder.calls == [('x',), (3,), ('y',)]
+        assert all(thread.is_alive() for thread in pool.threads)
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_failed_job_counted(self):
+        """Test that an exception in run is counted and the worker keeps going"""
+        calls = []
+
+        def run(n):
+            calls.append(n)
+            if n == 1:
+                raise RuntimeError('capture down')
+
+        pool = InferencePool(run, workers=1)
+        pool.start()
+        pool.submit('a', 1)
+        pool.submit('a', 2)
+
+        assert _wait_for(lambda: pool.stats()['completed'] == 2)
+        assert calls == [1, 2]
+        assert pool.stats()['failed'] == 1
+        pool.stop()
+
+    @pytest.mark.unit
+    def test_stop_drops_waiting(self, recorder):
+        """Test that stop drops waiting jobs and later submits are refused"""
+        pool = _pool(recorder, workers=1)
+        pool.submit('a', 0)
+        assert _wait_for(lambda: recorder.active == 1)
+        pool.submit('a', 1)
+
+        stopping = threading.Thread(target=pool.stop)
+        stopping.start()
+        assert _wait_for(lambda: pool.stopped)
+        recorder.gate.set()
+        stopping.join(2)
+
+        assert recorder.calls == [(0,)]
+        assert pool.submit('a', 2) is False
+        assert not any(thread.is_alive() for thread in pool.threads)
+
+    @pytest.mark.unit
+    def test_unknown_policy(self, recorder):
+        """Test that a bad overflow policy is rejected"""
+        with pytest.raises(ValueError):
+            InferencePool(recorder, overflow='drop_all')
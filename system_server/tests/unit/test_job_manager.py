@@ -115,6 +115,7 @@ class TestGetUnsyncedRecords:
     """Tests for get_unsynced_records function"""
 
     @pytest.mark.unit
+    @patch('worker_scripts.job_manager.CLAIM_MODE', 'loop')
     @patch('worker_scripts.job_manager.mark_as_processing')
     @patch('worker_scripts.job_manager.analytics_coll')
     @patch('worker_scripts.job_manager.util_collection')
@@ -167,6 +168,69 @@ class TestGetUnsyncedRecords:
         assert 'ms_time' in call_args
 
 
+class TestClaimRecordsBulk:
+    """Tests for the bulk claim mode of get_unsynced_records"""
+
+    @pytest.fixture
+    def analytics(self):
+        import mongomock
+        coll = mongomock.MongoClient()['fvonprem']['img_analytics']
+        with patch('worker_scripts.job_manager.analytics_coll', coll):
+            yield coll
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time_now_ms')
+    def test_claim_records_bulk_marks_processing(self, mock_time_now_ms, analytics):
+        """Test that a whole batch is claimed and returned without the claim token"""
+        from worker_scripts.job_manager import claim_records_bulk
+
+        mock_time_now_ms.return_value = 5000
+        analytics.insert_many([{'id': f'rec{i}', 'synced': False, 'modified': 100} for i in range(5)])
+
+        result = claim_records_bulk({'synced': False, 'modified': {'$lt': 1000}}, 3)
+
+        assert len(result) == 3
+        assert all(r['synced'] == 'processing' for r in result)
+        assert all('claim_token' not in r for r in result)
+        assert analytics.count_documents({'synced': 'processing', 'modified': 5000}) == 3
+        assert analytics.count_documents({'synced': False}) == 2
+
+    @pytest.mark.unit
+    def test_claim_records_bulk_no_records(self, analytics):
+        """Test that nothing is written when no records match"""
+        from worker_scripts.job_manager import claim_records_bulk
+
+        result = claim_records_bulk({'synced': False}, 10)
+
+        assert result == []
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.CLAIM_MODE', 'bulk')
+    @patch('worker_scripts.job_manager.use_aws', False)
+    @patch('worker_scripts.job_manager.find_utility')
+    @patch('worker_scripts.job_manager.time_now_ms')
+    @patch('time.sleep')
+    def test_get_unsynced_records_bulk_recovers_stuck(self, mock_sleep, mock_time_now_ms,
+                                                      mock_find_utility, analytics):
+        """Test bulk mode claims pending and stuck records without sleeping"""
+        from worker_scripts.job_manager import get_unsynced_records
+
+        now = 10 * 60 * 60 * 1000
+        mock_time_now_ms.return_value = now
+        mock_find_utility.return_value = [{'type': 'predict_sync'}]
+        analytics.insert_many([
+            {'id': 'pending', 'synced': False, 'modified': now - 200000},
+            {'id': 'too_new', 'synced': False, 'modified': now},
+            {'id': 'stuck', 'synced': 'processing', 'modified': now - (60000 * 60 * 2)},
+            {'id': 'too_old', 'synced': 'processing', 'modified': now - (60000 * 60 * 6)},
+        ])
+
+        result = get_unsynced_records()
+
+        assert sorted(r['id'] for r in result) == ['pending', 'stuck']
+        mock_sleep.assert_not_called()
+
+
 class TestMarkAsProcessing:
     """Tests for mark_as_processing function"""
 
@@ -205,14 +269,113 @@ class TestMarkAsSynced:
         mock_analytics_coll.delete_one.assert_called_once_with({"id": record_id})
 
 
+class TestBulkSyncStatus:
+    """Tests for the batched mark/tracker helpers used by cloud_call and kinesis_call"""
+
+    @pytest.fixture
+    def analytics(self):
+        import mongomock
+        coll = mongomock.MongoClient()['fvonprem']['img_analytics']
+        with patch('worker_scripts.job_manager.analytics_coll', coll):
+            yield coll
+
+    @pytest.fixture
+    def tracker(self):
+        import mongomock
+        coll = mongomock.MongoClient()['fvonprem']['sync_tracker']
+        with patch('worker_scripts.job_manager._get_tracker_collection', return_value=coll):
+            yield coll
+
+    @pytest.mark.unit
+    def test_mark_many_as_synced(self, analytics):
+        """Test that synced records are removed in one delete"""
+        from worker_scripts.job_manager import mark_many_as_synced
+
+        analytics.insert_many([{'id': 'rec1'}, {'id': 'rec2'}, {'id': 'rec3'}])
+
+        mark_many_as_synced(['rec1', 'rec3'])
+
+        assert [r['id'] for r in analytics.find()] == ['rec2']
+
+    @pytest.mark.unit
+    def test_mark_many_for_retry(self, analytics):
+        """Test that failed records are flipped back to unsynced and lose their claim token"""
+        from worker_scripts.job_manager import mark_many_for_retry
+
+        analytics.insert_many([{'id': 'rec1', 'synced': 'processing', 'claim_token': 'abc'},
+                               {'id': 'rec2', 'synced': 'processing', 'claim_token': 'abc'}])
+
+        mark_many_for_retry(['rec1'])
+
+        assert analytics.find_one({'id': 'rec1'})['synced'] is False
+        assert 'claim_token' not in analytics.find_one({'id': 'rec1'})
+        assert analytics.find_one({'id': 'rec2'})['synced'] == 'processing'
+        assert analytics.find_one({'id': 'rec2'})['claim_token'] == 'abc'
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time_now_ms')
+    def test_update_sync_tracker_batch_groups_by_did(self, mock_time_now_ms, tracker):
+        """Test that counts and errors are grouped per did"""
+        from worker_scripts.job_manager import update_sync_tracker_batch
+
+        mock_time_now_ms.return_value = 1000
+        synced = [{'id': 'r1', 'did': 'a'}, {'id': 'r2', 'did': 'a'}, {'id': 'r3', 'did': 'b'}]
+        failed = [({'id': 'r4', 'did': 'a'}, 'HTTP 500'), ({'id': 'r5'}, 'HTTP 500')]
+
+        update_sync_tracker_batch(synced=synced, failed=failed)
+
+        a = tracker.find_one({'_id': 'a'})
+        assert a['count'] == 2
+        assert [e['record_id'] for e in a['errors']] == ['r4']
+        assert tracker.find_one({'_id': 'b'})['count'] == 1
+        assert tracker.find_one({'_id': 'unknown'})['count'] == 0
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time_now_ms')
+    def test_update_sync_tracker_batch_marks_completed(self, mock_time_now_ms, tracker):
+        """Test that a did crossing the completion threshold is completed"""
+        from worker_scripts.job_manager import update_sync_tracker_batch, SYNC_COMPLETION_THRESHOLD
+
+        mock_time_now_ms.return_value = 1000
+        tracker.insert_one({'_id': 'a', 'count': SYNC_COMPLETION_THRESHOLD - 1,
+                            'completed': False, 'first_sync_ms': 0, 'errors': []})
+
+        update_sync_tracker_batch(synced=[{'id': 'r1', 'did': 'a'}])
+
+        a = tracker.find_one({'_id': 'a'})
+        assert a['completed'] is True
+        assert a['total_time_seconds'] == 1.0
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time_now_ms')
+    def test_update_sync_tracker_batch_completed_did(self, mock_time_now_ms, tracker):
+        """Test that an already completed did does not stop the rest of the batch"""
+        from worker_scripts.job_manager import update_sync_tracker_batch, SYNC_COMPLETION_THRESHOLD
+
+        mock_time_now_ms.return_value = 1000
+        tracker.insert_one({'_id': 'done', 'count': SYNC_COMPLETION_THRESHOLD,
+                            'completed': True, 'first_sync_ms': 0, 'errors': []})
+        tracker.insert_one({'_id': 'a', 'count': SYNC_COMPLETION_THRESHOLD - 1,
+                            'completed': False, 'first_sync_ms': 0, 'errors': []})
+
+        update_sync_tracker_batch(synced=[{'id': 'r1', 'did': 'done'}, {'id': 'r2', 'did': 'a'}],
+                                  failed=[({'id': 'r3', 'did': 'done'}, 'HTTP 500')])
+
+        done = tracker.find_one({'_id': 'done'})
+        assert done['count'] == SYNC_COMPLETION_THRESHOLD
+        assert [e['record_id'] for e in done['errors']] == ['r3']
+        assert tracker.find_one({'_id': 'a'})['completed'] is True
+
+
 class TestCloudCall:
     """Tests for cloud_call function"""
 
     @pytest.mark.unit
-    @patch('worker_scripts.job_manager.mark_as_synced')
-    @patch('requests.post')
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('requests.Session.post')
     @patch('time.sleep')
-    def test_cloud_call_success(self, mock_sleep, mock_post, mock_mark_synced):
+    def test_cloud_call_success(self, mock_sleep, mock_post, mock_mark_synced, mock_wait):
         """Test successful cloud API call"""
         from worker_scripts.job_manager import cloud_call
 
@@ -228,11 +391,12 @@ class TestCloudCall:
 
         assert result is True
         assert mock_post.call_count == 2  # One for main URL, one for BQ_INGEST_PATH
-        assert mock_mark_synced.call_count == 2
-        mock_sleep.assert_called_once_with(1)
+        mock_mark_synced.assert_called_once_with(['rec1', 'rec2'])
+        mock_wait.assert_called_once()
+        mock_sleep.assert_not_called()
 
     @pytest.mark.unit
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_cloud_call_empty_analytics(self, mock_post):
         """Test cloud call with empty analytics returns True"""
         from worker_scripts.job_manager import cloud_call
@@ -243,7 +407,7 @@ class TestCloudCall:
         mock_post.assert_not_called()
 
     @pytest.mark.unit
-    @patch('requests.post')
+    @patch('requests.Session.post')
     @patch('time.sleep')
     def test_cloud_call_failure(self, mock_sleep, mock_post):
         """Test cloud call handles request failure"""
@@ -260,10 +424,12 @@ class TestCloudCall:
         assert result is False
 
     @pytest.mark.unit
-    @patch('worker_scripts.job_manager.mark_as_synced')
-    @patch('requests.post')
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('requests.Session.post')
     @patch('time.sleep')
-    def test_cloud_call_non_200_status(self, mock_sleep, mock_post, mock_mark_synced):
+    def test_cloud_call_non_200_status(self, mock_sleep, mock_post, mock_mark_synced,
+                                       mock_mark_retry):
         """Test cloud call with non-200 status code"""
         from worker_scripts.job_manager import cloud_call
 
@@ -279,20 +445,234 @@ class TestCloudCall:
 
         assert result is False
         mock_mark_synced.assert_not_called()
+        mock_mark_retry.assert_called_once_with(['rec1'])
+
+
+class TestCloudCallDestinations:
+    """Tests for concurrent dual-destination posting and the success policy"""
+
+    @staticmethod
+    def _response(status_code):
+        res = MagicMock()
+        res.status_code = status_code
+        res.text = 'body'
+        return res
+
+    def _post_by_url(self, primary_status, bq_status):
+        from worker_scripts.job_manager import BQ_INGEST_PATH
+
+        def post(url, **kwargs):
+            status = bq_status if url == BQ_INGEST_PATH else primary_status
+            if isinstance(status, Exception):
+                raise status
+            return self._response(status)
+        return post
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('policy,primary,bq,expected', [
+        ('primary', 200, 500, True),
+        ('primary', 500, 200, False),
+        ('both', 200, 500, False),
+        ('both', 200, 200, True),
+        ('any', 500, 200, True),
+        ('any', Exception('down'), Exception('down'), False),
+    ])
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('requests.Session.post')
+    def test_cloud_call_success_policy(self, mock_post, mock_mark_synced, mock_mark_retry,
+                                       mock_wait, policy, primary, bq, expected):
+        """Test that each destination is tracked independently against the policy"""
+        from worker_scripts.job_manager import cloud_call
+
+        mock_post.side_effect = self._post_by_url(primary, bq)
+
+        with patch('worker_scripts.job_manager.SYNC_SUCCESS_POLICY', policy):
+            result = cloud_call('http://test.com/api', [{'id': 'rec1'}], {})
+
+        assert result is expected
+        assert mock_post.call_count == 2
+        if expected:
+            mock_mark_synced.assert_called_once_with(['rec1'])
+            mock_mark_retry.assert_not_called()
+        else:
+            mock_mark_retry.assert_called_once_with(['rec1'])
+            mock_mark_synced.assert_not_called()
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('requests.Session.post')
+    def test_cloud_call_posts_concurrently(self, mock_post, mock_mark_synced, mock_wait):
+        """Test that both posts are in flight at the same time"""
+        import threading
+        from worker_scripts.job_manager import cloud_call
+
+        barrier = threading.Barrier(2, timeout=5)
+
+        def post(url, **kwargs):
+            barrier.wait()
+            return self._response(200)
+        mock_post.side_effect = post
+
+        assert cloud_call('http://test.com/api', [{'id': 'rec1'}], {}) is True
+
+
+@pytest.fixture
+def ingest_server():
+    """Local stand-in for the cloud ingest endpoints that decodes request bodies"""
+    import gzip
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            encoding = self.headers.get('Content-Encoding')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            received.append({'path': self.path, 'encoding': encoding,
+                             'content_type': self.headers.get('Content-Type'),
+                             'payload': json.loads(body)})
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.received = received
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestCloudCallCompression:
+    """Tests for payload encoding and compressed uploads"""
+
+    @pytest.mark.unit
+    def test_to_json_types_matches_json_util(self):
+        """Test that the single pass conversion matches a json_util round trip"""
+        import json
+        from bson import json_util, ObjectId, Int64
+        from worker_scripts.job_manager import to_json_types
+
+        record = {'_id': ObjectId(), 'created': datetime(2024, 1, 2, 3, 4, 5),
+                  'nested': [1, {'count': Int64(5), 'ref': ObjectId()}],
+                  'score': 1.5, 'empty': None, 'flag': True}
+
+        assert to_json_types(record) == json.loads(json_util.dumps(record))
+
+    @pytest.mark.unit
+    def test_encode_payload_gzip(self):
+        """Test that gzip payloads decompress to the plain payload on every call"""
+        import gzip
+        from worker_scripts.job_manager import encode_payload
+
+        analytics = [{'id': f'rec{i}', 'value': 'x' * 100} for i in range(50)]
+        plain, plain_headers = encode_payload(analytics, 'none')
+
+        for _ in range(2):
+            body, headers = encode_payload(analytics, 'gzip')
+            assert headers == {'Content-Encoding': 'gzip'}
+            assert gzip.decompress(body) == plain
+            assert len(body) < len(plain)
+        assert plain_headers == {}
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('compression', ['gzip', 'none'])
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    def test_cloud_call_against_local_server(self, mock_mark_synced, mock_wait,
+                                             ingest_server, compression):
+        """Test that both destinations receive a payload they can decode"""
+        from worker_scripts.job_manager import cloud_call
+
+        analytics = [{'id': 'rec1', 'value': 1}, {'id': 'rec2', 'value': 2}]
+
+        with patch('worker_scripts.job_manager.SYNC_COMPRESSION', compression), \
+             patch('worker_scripts.job_manager.BQ_INGEST_PATH', ingest_server.url + '/bq'):
+            result = cloud_call(ingest_server.url + '/primary', analytics, {'Authorization': 'Bearer t'})
+
+        assert result is True
+        assert sorted(r['path'] for r in ingest_server.received) == ['/bq', '/primary']
+        for request in ingest_server.received:
+            assert request['encoding'] == ('gzip' if compression == 'gzip' else None)
+            assert request['content_type'] == 'application/json'
+            assert request['payload'] == [{'id': 'rec1', 'value': 1, 'synced': True},
+                                          {'id': 'rec2', 'value': 2, 'synced': True}]
+        mock_mark_synced.assert_called_once_with(['rec1', 'rec2'])
+
+
+class TestWaitForSyncSlot:
+    """Tests for the redis backed sync rate limiter"""
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time.sleep')
+    @patch('worker_scripts.job_manager.time.time')
+    def test_wait_for_sync_slot_limits_per_window(self, mock_time, mock_sleep, fake_redis_with_data):
+        """Test that calls past the limit wait for the next window"""
+        from worker_scripts.job_manager import wait_for_sync_slot
+
+        clock = [100.25]
+        mock_time.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda secs: clock.__setitem__(0, clock[0] + secs)
+
+        with patch('worker_scripts.job_manager.redis_con', fake_redis_with_data):
+            for _ in range(3):
+                wait_for_sync_slot(rate=2)
+
+        mock_sleep.assert_called_once_with(0.75)
+        assert int(clock[0]) == 101
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time.sleep')
+    def test_wait_for_sync_slot_disabled(self, mock_sleep):
+        """Test that a rate of zero never touches redis"""
+        from worker_scripts.job_manager import wait_for_sync_slot
+
+        with patch('worker_scripts.job_manager.redis_con') as mock_redis:
+            wait_for_sync_slot(rate=0)
+
+        mock_redis.pipeline.assert_not_called()
+        mock_sleep.assert_not_called()
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.time.sleep')
+    def test_wait_for_sync_slot_redis_down(self, mock_sleep):
+        """Test that a redis failure does not block the sync"""
+        from worker_scripts.job_manager import wait_for_sync_slot
+
+        with patch('worker_scripts.job_manager.redis_con') as mock_redis:
+            mock_redis.pipeline.return_value.execute.side_effect = Exception('redis down')
+            wait_for_sync_slot(rate=1)
+
+        mock_sleep.assert_not_called()
 
 
 class TestKinesisCall:
     """Tests for kinesis_call function (AWS integration)"""
 
     @pytest.mark.unit
-    @patch('worker_scripts.job_manager.mark_as_synced')
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
     @patch('worker_scripts.job_manager.aws_client')
     @patch('time.sleep')
-    def test_kinesis_call_success(self, mock_sleep, mock_aws_client, mock_mark_synced):
+    def test_kinesis_call_success(self, mock_sleep, mock_aws_client, mock_mark_synced,
+                                  mock_mark_retry, mock_wait):
         """Test successful Kinesis stream call"""
         from worker_scripts.job_manager import kinesis_call
 
-        mock_aws_client.send_stream.return_value = True
+        mock_aws_client.send_batch.return_value = [True, True]
 
         analytics = [
             {'id': 'rec1', '_id': 'mongo_id_1'},
@@ -302,9 +682,29 @@ class TestKinesisCall:
         result = kinesis_call(analytics)
 
         assert result is True
-        assert mock_aws_client.send_stream.call_count == 2
-        assert mock_mark_synced.call_count == 2
-        mock_sleep.assert_called_once_with(1)
+        mock_aws_client.send_batch.assert_called_once_with(analytics)
+        mock_mark_synced.assert_called_once_with(['rec1', 'rec2'])
+        mock_mark_retry.assert_called_once_with([])
+        mock_wait.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('worker_scripts.job_manager.aws_client')
+    @patch('time.sleep')
+    def test_kinesis_call_partial_failure(self, mock_sleep, mock_aws_client, mock_mark_synced,
+                                          mock_mark_retry):
+        """Test that per-record batch results drive synced and retry marking"""
+        from worker_scripts.job_manager import kinesis_call
+
+        mock_aws_client.send_batch.return_value = [True, 'InternalFailure: boom']
+
+        result = kinesis_call([{'id': 'rec1'}, {'id': 'rec2'}])
+
+        assert result is False
+        mock_mark_synced.assert_called_once_with(['rec1'])
+        mock_mark_retry.assert_called_once_with(['rec2'])
 
     @pytest.mark.unit
     @patch('worker_scripts.job_manager.aws_client')
@@ -312,7 +712,7 @@ class TestKinesisCall:
         """Test that _id field is removed before sending to Kinesis"""
         from worker_scripts.job_manager import kinesis_call
 
-        mock_aws_client.send_stream.return_value = True
+        mock_aws_client.send_batch.return_value = [True]
 
         analytics = [{'id': 'rec1', '_id': 'should_be_removed', 'data': 'test'}]
 
@@ -336,7 +736,7 @@ class TestKinesisCall:
         """Test Kinesis call handles errors"""
         from worker_scripts.job_manager import kinesis_call
 
-        mock_aws_client.send_stream.side_effect = Exception('Kinesis error')
+        mock_aws_client.send_batch.side_effect = Exception('Kinesis error')
 
         analytics = [{'id': 'rec1'}]
 
@@ -444,6 +844,225 @@ class TestPushAnalyticsToCloud:
         assert 'kinesis_call' in str(call_args) or call_args[0][0].__name__ == 'kinesis_call'
 
 
+class TestPushAnalyticsAdaptiveBatches:
+    """Tests for adaptive batch sizing in push_analytics_to_cloud"""
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.use_aws', False)
+    @patch('worker_scripts.job_manager.job_queue')
+    @patch('worker_scripts.job_manager.get_unsynced_records')
+    @patch('worker_scripts.job_manager.insert_job')
+    def test_push_analytics_uses_batcher_size(self, mock_insert_job, mock_get_unsynced,
+                                              mock_job_queue, fake_redis_with_data):
+        """Test that one job is enqueued per adaptive batch"""
+        from worker_scripts.adaptive_batcher import AdaptiveBatcher
+        from worker_scripts.job_manager import push_analytics_to_cloud
+
+        fake_redis_with_data.hset('analytics_batcher', 'batch_size', 40)
+        batcher = AdaptiveBatcher(fake_redis_with_data, min_size=10, max_size=500)
+        mock_get_unsynced.return_value = [{'id': f'rec{i}'} for i in range(100)]
+
+        with patch('worker_scripts.job_manager.batcher', batcher):
+            push_analytics_to_cloud('http://test.com', 'token123')
+
+        sizes = [len(c[0][2]) for c in mock_job_queue.enqueue.call_args_list]
+        assert sizes == [40, 40, 20]
+        assert mock_insert_job.call_count == 3
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_as_synced')
+    @patch('requests.Session.post')
+    def test_cloud_call_reports_to_batcher(self, mock_post, mock_mark_synced, mock_wait):
+        """Test that cloud_call feeds upload size, latency and outcome back"""
+        from worker_scripts.job_manager import cloud_call
+
+        mock_post.return_value = MagicMock(status_code=200)
+        batcher = MagicMock()
+
+        with patch('worker_scripts.job_manager.batcher', batcher):
+            cloud_call('http://test.com/api', [{'id': 'rec1'}, {'id': 'rec2'}], {})
+
+        num_records, num_bytes, latency, success = batcher.record_result.call_args[0]
+        assert num_records == 2
+        assert num_bytes > 0
+        assert latency >= 0
+        assert success is True
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.SYNC_SUCCESS_POLICY', 'both')
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('requests.Session.post')
+    def test_cloud_call_reports_policy_outcome(self, mock_post, mock_mark_retry, mock_wait):
+        """Test that the batcher sees the success policy's outcome, not just the primary post"""
+        from worker_scripts.job_manager import cloud_call, BQ_INGEST_PATH
+
+        mock_post.side_effect = lambda url, **kwargs: MagicMock(status_code=500 if url == BQ_INGEST_PATH else 200)
+        batcher = MagicMock()
+
+        with patch('worker_scripts.job_manager.batcher', batcher):
+            assert cloud_call('http://test.com/api', [{'id': 'rec1'}], {}) is False
+
+        assert batcher.record_result.call_args[0][3] is False
+
+
+class TestSyncBreakerIntegration:
+    """Tests for the sync circuit breaker in the analytics pipeline"""
+
+    @staticmethod
+    def _open_breaker(redis_con, open_until):
+        from worker_scripts.sync_breaker import SyncBreaker
+
+        redis_con.hset('analytics_breaker', mapping={'state': 'open', 'open_until': open_until,
+                                                     'open_seconds': 30})
+        return SyncBreaker(redis_con)
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.count_backlog', return_value=500)
+    @patch('worker_scripts.job_manager.probe_endpoint')
+    @patch('worker_scripts.job_manager.job_queue')
+    @patch('worker_scripts.job_manager.get_unsynced_records')
+    def test_push_skips_claim_while_open(self, mock_get_unsynced, mock_job_queue, mock_probe,
+                                         mock_backlog, fake_redis_with_data):
+        """Test that nothing is claimed or enqueued while the breaker is open"""
+        from worker_scripts.job_manager import push_analytics_to_cloud
+
+        breaker = self._open_breaker(fake_redis_with_data, time.time() + 60)
+
+        with patch('worker_scripts.job_manager.breaker', breaker):
+            assert push_analytics_to_cloud('http://test.com', 'token123') is True
+
+        mock_get_unsynced.assert_not_called()
+        mock_job_queue.enqueue.assert_not_called()
+        mock_probe.assert_not_called()
+        assert breaker.stats()['backlog'] == '500'
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.use_aws', False)
+    @patch('worker_scripts.job_manager.count_backlog', return_value=500)
+    @patch('worker_scripts.job_manager.probe_endpoint', return_value=True)
+    @patch('worker_scripts.job_manager.job_queue')
+    @patch('worker_scripts.job_manager.insert_job')
+    @patch('worker_scripts.job_manager.get_unsynced_records')
+    def test_push_resumes_after_probe(self, mock_get_unsynced, mock_insert_job, mock_job_queue,
+                                      mock_probe, mock_backlog, fake_redis_with_data):
+        """Test that a successful probe resumes claiming in drain mode"""
+        from worker_scripts.job_manager import push_analytics_to_cloud
+
+        breaker = self._open_breaker(fake_redis_with_data, time.time() - 1)
+        mock_get_unsynced.return_value = [{'id': 'rec1'}]
+
+        with patch('worker_scripts.job_manager.breaker', breaker):
+            push_analytics_to_cloud('http://test.com', 'token123')
+
+        mock_probe.assert_called_once_with('http://test.com')
+        assert mock_job_queue.enqueue.call_count == 1
+        assert breaker.state() == 'half_open'
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('requests.Session.post')
+    def test_cloud_call_returns_batch_while_open(self, mock_post, mock_mark_retry, fake_redis_with_data):
+        """Test that queued batches go back to the spool without posting while open"""
+        from worker_scripts.job_manager import cloud_call
+
+        breaker = self._open_breaker(fake_redis_with_data, time.time() + 60)
+
+        with patch('worker_scripts.job_manager.breaker', breaker):
+            assert cloud_call('http://test.com/api', [{'id': 'rec1'}], {}) is False
+
+        mock_post.assert_not_called()
+        mock_mark_retry.assert_called_once_with(['rec1'])
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.wait_for_sync_slot')
+    @patch('worker_scripts.job_manager.mark_many_for_retry')
+    @patch('requests.Session.post')
+    def test_cloud_call_failures_open_breaker(self, mock_post, mock_mark_retry, mock_wait,
+                                              fake_redis_with_data):
+        """Test that repeated upload failures open the breaker"""
+        from worker_scripts.job_manager import cloud_call
+        from worker_scripts.sync_breaker import SyncBreaker
+
+        breaker = SyncBreaker(fake_redis_with_data, failure_threshold=2)
+        mock_post.return_value = MagicMock(status_code=503, text='unavailable')
+
+        with patch('worker_scripts.job_manager.breaker', breaker):
+            cloud_call('http://test.com/api', [{'id': 'rec1'}], {})
+            cloud_call('http://test.com/api', [{'id': 'rec2'}], {})
+
+        assert breaker.state() == 'open'
+
+    @pytest.mark.unit
+    def test_count_backlog(self):
+        """Test that the backlog counts unsynced and in-flight records"""
+        import mongomock
+        from worker_scripts.job_manager import count_backlog
+
+        coll = mongomock.MongoClient()['fvonprem']['img_analytics']
+        coll.insert_many([{'synced': False}, {'synced': 'processing'}, {'synced': True}])
+
+        with patch('worker_scripts.job_manager.analytics_coll', coll):
+            assert count_backlog() == 2
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.BACKLOG_COUNT_LIMIT', 2)
+    def test_count_backlog_capped(self):
+        """Test that counting stops at the backlog count limit"""
+        import mongomock
+        from worker_scripts.job_manager import count_backlog
+
+        coll = mongomock.MongoClient()['fvonprem']['img_analytics']
+        coll.insert_many([{'synced': False} for _ in range(3)])
+
+        with patch('worker_scripts.job_manager.analytics_coll', coll):
+            assert count_backlog() == 2
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.count_backlog')
+    @patch('worker_scripts.job_manager.get_unsynced_records', return_value=[])
+    def test_push_skips_backlog_count_while_closed(self, mock_get_unsynced, mock_backlog,
+                                                   fake_redis_with_data):
+        """Test that the spool is not counted once the breaker is closed and the last drain finished"""
+        from worker_scripts.job_manager import push_analytics_to_cloud
+        from worker_scripts.sync_breaker import SyncBreaker
+
+        fake_redis_with_data.hset('analytics_breaker', mapping={'state': 'closed', 'drain_started': 0,
+                                                                'last_drain_seconds': 12.5})
+
+        with patch('worker_scripts.job_manager.breaker', SyncBreaker(fake_redis_with_data)):
+            push_analytics_to_cloud('http://test.com', 'token123')
+
+        mock_backlog.assert_not_called()
+        mock_get_unsynced.assert_called_once()
+
+    @pytest.mark.unit
+    @patch('worker_scripts.job_manager.count_backlog', return_value=0)
+    @patch('worker_scripts.job_manager.get_unsynced_records', return_value=[])
+    def test_push_finishes_drain_after_close(self, mock_get_unsynced, mock_backlog, fake_redis_with_data):
+        """Test that a drain still running when the breaker closes records its duration once the spool is empty"""
+        from worker_scripts.job_manager import push_analytics_to_cloud
+        from worker_scripts.sync_breaker import SyncBreaker
+
+        breaker = SyncBreaker(fake_redis_with_data, failure_threshold=1, recovery_successes=1)
+        breaker.update_backlog(500)
+        breaker.record_result(False)
+        fake_redis_with_data.hset('analytics_breaker', 'open_until', time.time() - 1)
+        breaker.allow_claim(lambda: True)
+        breaker.record_result(True)
+        assert breaker.state() == 'closed'
+
+        with patch('worker_scripts.job_manager.breaker', breaker):
+            push_analytics_to_cloud('http://test.com', 'token123')
+
+        mock_backlog.assert_called_once()
+        stats = breaker.stats()
+        assert 'last_drain_seconds' in stats
+        assert stats['drain_started'] == '0'
+        assert stats['backlog'] == '0'
+
+
 class TestEnableOCR:
     """Tests for enable_ocr function"""
 
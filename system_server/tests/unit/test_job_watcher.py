@@ -824,3 +824,204 @@ class TestJobDeletionOperations:
 
         mock_job_collection.delete_one.assert_called_once_with({'_id': job_id})
         mock_job.delete.assert_called_once()
+
+
+@pytest.fixture
+def watcher(fake_redis_with_data):
+    """job_watcher wired to fakeredis and mongomock collections"""
+    import mongomock
+    from rq import Queue
+    import job_watcher
+
+    db = mongomock.MongoClient()['fvonprem']
+    queue = Queue('default', connection=fake_redis_with_data)
+    # rq asks the server for its version, which fakeredis does not implement
+    with patch.object(fake_redis_with_data, 'info', return_value={'redis_version': '6.2.0'}), \
+         patch.object(job_watcher, 'redis_con', fake_redis_with_data), \
+         patch.object(job_watcher, 'job_queue', queue), \
+         patch.object(job_watcher, 'job_collection', db['jobs']), \
+         patch.object(job_watcher, 'failed_jobs', db['failed_jobs']):
+        yield job_watcher
+
+
+def _enqueue(watcher, track=True):
+    job = watcher.job_queue.enqueue('builtins.print', 'x')
+    if track:
+        watcher.job_collection.insert_one({'_id': job.id, 'type': 'test_job', 'status': 'running'})
+    return job
+
+
+class TestApplyStatuses:
+    """Tests for applying job statuses to mongo"""
+
+    @pytest.mark.unit
+    def test_apply_statuses_finished(self, watcher):
+        """Test that finished jobs are removed from mongo and redis"""
+        job = _enqueue(watcher)
+        job.set_status('finished')
+
+        watcher.apply_statuses([job.id])
+
+        assert watcher.job_collection.count_documents({}) == 0
+        assert watcher.job_queue.fetch_job(job.id) is None
+
+    @pytest.mark.unit
+    def test_apply_statuses_failed(self, watcher):
+        """Test that failed jobs move to failed_jobs"""
+        job = _enqueue(watcher)
+        job.set_status('failed')
+
+        watcher.apply_statuses([job.id])
+
+        assert watcher.job_collection.count_documents({}) == 0
+        assert watcher.failed_jobs.find_one({'job_id': job.id})['origin'] == 'default'
+
+    @pytest.mark.unit
+    def test_apply_statuses_queued(self, watcher):
+        """Test that waiting jobs get their status in the type field"""
+        job = _enqueue(watcher)
+
+        watcher.apply_statuses([job.id])
+
+        assert watcher.job_collection.find_one({'_id': job.id})['type'] == f'job_{job.id}_queued'
+
+    @pytest.mark.unit
+    def test_apply_statuses_missing(self, watcher):
+        """Test that jobs no longer in redis are left alone"""
+        watcher.job_collection.insert_one({'_id': 'gone', 'type': 'test_job'})
+
+        watcher.apply_statuses(['gone'])
+
+        assert watcher.job_collection.find_one({'_id': 'gone'})['type'] == 'test_job'
+
+
+class TestKeyspaceEvents:
+    """Tests for event driven job tracking"""
+
+    @pytest.mark.unit
+    def test_job_id_from_event(self):
+        """Test parsing job ids out of keyspace channels"""
+        from job_watcher import job_id_from_event
+
+        assert job_id_from_event({'channel': b'__keyspace@0__:rq:job:abc-123'}) == 'abc-123'
+        assert job_id_from_event({'channel': '__keyspace@0__:rq:job:abc:dependents'}) is None
+        assert job_id_from_event({'channel': b'__keyspace@0__:rq:queue:default'}) is None
+
+    @pytest.mark.unit
+    def test_enable_keyspace_events_keeps_flags(self):
+        """Test that existing notification flags are preserved"""
+        import job_watcher
+
+        redis_con = MagicMock()
+        redis_con.config_get.return_value = {'notify-keyspace-events': 'Ex'}
+        with patch.object(job_watcher, 'redis_con', redis_con):
+            assert job_watcher.enable_keyspace_events() is True
+
+        redis_con.config_set.assert_called_once_with('notify-keyspace-events', 'ExKh')
+
+    @pytest.mark.unit
+    def test_enable_keyspace_events_unavailable(self):
+        """Test that a refused CONFIG command falls back to polling"""
+        import job_watcher
+
+        redis_con = MagicMock()
+        redis_con.config_get.side_effect = Exception('unknown command CONFIG')
+        with patch.object(job_watcher, 'redis_con', redis_con):
+            assert job_watcher.enable_keyspace_events() is False
+
+    @pytest.mark.unit
+    def test_events_update_only_changed_jobs(self, watcher):
+        """Test that status changes arrive as events and only tracked jobs are touched"""
+        watcher.redis_con.config_set('notify-keyspace-events', 'Kh')
+        pubsub = watcher.redis_con.pubsub()
+        pubsub.psubscribe('__keyspace@0__:rq:job:*')
+
+        finished = _enqueue(watcher)
+        failed = _enqueue(watcher)
+        untracked = _enqueue(watcher, track=False)
+        idle = _enqueue(watcher)
+        assert watcher.drain_events(pubsub, timeout=0.1) == {finished.id, failed.id, untracked.id, idle.id}
+
+        finished.set_status('finished')
+        failed.set_status('failed')
+        untracked.set_status('finished')
+        job_ids = watcher.drain_events(pubsub, timeout=0.1)
+        assert job_ids == {finished.id, failed.id, untracked.id}
+
+        with patch.object(watcher, 'apply_statuses', wraps=watcher.apply_statuses) as mock_apply:
+            watcher.handle_events(job_ids)
+
+        assert sorted(mock_apply.call_args[0][0]) == sorted([finished.id, failed.id])
+        assert [j['_id'] for j in watcher.job_collection.find()] == [idle.id]
+        assert watcher.failed_jobs.find_one({'job_id': failed.id})
+        assert watcher.job_queue.fetch_job(untracked.id) is not None
+
+
+class TestReconcile:
+    """Tests for the bulk reconciliation sweep"""
+
+    @pytest.mark.unit
+    def test_reconcile_batches_lookups_and_deletes(self, watcher):
+        """Test that statuses come from pipelined fetches and mongo deletes are batched"""
+        from rq.job import Job
+
+        jobs = [_enqueue(watcher) for _ in range(7)]
+        for j in jobs[:4]:
+            j.set_status('finished')
+        jobs[4].set_status('failed')
+
+        with patch.object(watcher, 'FETCH_CHUNK', 3), \
+             patch.object(Job, 'fetch_many', wraps=Job.fetch_many) as mock_fetch_many, \
+             patch.object(watcher.job_queue, 'fetch_job') as mock_fetch_job, \
+             patch.object(watcher.job_collection, 'delete_many',
+                          wraps=watcher.job_collection.delete_many) as mock_delete_many, \
+             patch.object(watcher.job_collection, 'delete_one') as mock_delete_one:
+            watcher.reconcile()
+
+        assert mock_fetch_many.call_count == 3
+        mock_fetch_job.assert_not_called()
+        mock_delete_one.assert_not_called()
+        mock_delete_many.assert_called_once()
+        assert sorted(j['_id'] for j in watcher.job_collection.find()) == sorted(j.id for j in jobs[5:])
+        for j in jobs[5:]:
+            assert watcher.job_collection.find_one({'_id': j.id})['type'] == f'job_{j.id}_queued'
+
+    @pytest.mark.unit
+    def test_failed_jobs_written_in_one_bulk_write(self, watcher):
+        """Test that all failed jobs of a sweep reach failed_jobs in a single bulk_write"""
+        jobs = [_enqueue(watcher) for _ in range(3)]
+        for j in jobs:
+            j.set_status('failed')
+
+        with patch.object(watcher.failed_jobs, 'bulk_write',
+                          wraps=watcher.failed_jobs.bulk_write) as mock_bulk_write, \
+             patch.object(watcher.failed_jobs, 'update_one') as mock_update_one:
+            watcher.reconcile()
+
+        mock_bulk_write.assert_called_once()
+        mock_update_one.assert_not_called()
+        assert sorted(f['job_id'] for f in watcher.failed_jobs.find()) == sorted(j.id for j in jobs)
+
+    @pytest.mark.unit
+    def test_finished_jobs_leave_redis(self, watcher):
+        """Test that finished jobs are removed from their registry and their hash deleted"""
+        from rq.registry import FinishedJobRegistry
+
+        job = _enqueue(watcher)
+        registry = FinishedJobRegistry('default', connection=watcher.redis_con)
+        registry.add(job, -1)
+        job.set_status('finished')
+
+        watcher.reconcile()
+
+        assert job.id not in registry.get_job_ids()
+        assert not watcher.redis_con.exists(job.key)
+
+    @pytest.mark.unit
+    def test_reconcile_projects_ids_only(self, watcher):
+        """Test that the sweep only reads _id from the jobs collection"""
+        with patch.object(watcher, 'job_collection') as mock_collection:
+            mock_collection.find.return_value = []
+            watcher.reconcile()
+
+        mock_collection.find.assert_called_once_with({}, {'_id': 1})
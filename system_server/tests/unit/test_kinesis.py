@@ -566,3 +566,139 @@ class TestStreamARN:
 
         assert kinesis.stream == 'arn:aws:kinesis:us-east-1:123456789:stream/test-stream'
         assert kinesis.stream.startswith('arn:aws:kinesis:')
+
+
+class TestSendBatch:
+    """Tests for send_batch (PutRecords) using a local botocore Stubber"""
+
+    STREAM_ARN = 'arn:aws:kinesis:us-east-1:123456789012:stream/test'
+
+    @pytest.fixture
+    def kinesis(self):
+        import boto3
+        from botocore.stub import Stubber
+        from aws.Kinesis import Kinesis, ms_timestamp
+
+        with patch.object(Kinesis, 'authorize', return_value=True):
+            k = Kinesis()
+        k.authorized = True
+        k.stream = self.STREAM_ARN
+        k.expiration = ms_timestamp() + 60 * 60 * 1000
+        k.CLIENT = boto3.client('kinesis', region_name='us-east-1',
+                                aws_access_key_id='test', aws_secret_access_key='test')
+        with Stubber(k.CLIENT) as stubber, patch('aws.Kinesis.time.sleep'):
+            yield k, stubber
+
+    @pytest.mark.unit
+    def test_send_batch_success(self, kinesis):
+        """Test that all records go out in a single PutRecords call"""
+        k, stubber = kinesis
+        records = [{'id': 'rec1'}, {'id': 'rec2'}]
+        stubber.add_response('put_records', {
+            'Records': [{'SequenceNumber': '1', 'ShardId': 's'}, {'SequenceNumber': '2', 'ShardId': 's'}]
+        }, {
+            'StreamARN': self.STREAM_ARN,
+            'Records': [
+                {'Data': (json.dumps(r) + '\n').encode('utf-8'), 'PartitionKey': 'key'} for r in records
+            ]
+        })
+
+        result = k.send_batch(records, partition_key='key')
+
+        assert result == [True, True]
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_batch_retries_only_failed_records(self, kinesis):
+        """Test that only records with an ErrorCode are resent"""
+        k, stubber = kinesis
+        records = [{'id': 'rec1'}, {'id': 'rec2'}, {'id': 'rec3'}]
+        stubber.add_response('put_records', {
+            'FailedRecordCount': 1,
+            'Records': [
+                {'SequenceNumber': '1', 'ShardId': 's'},
+                {'ErrorCode': 'ProvisionedThroughputExceededException', 'ErrorMessage': 'slow down'},
+                {'SequenceNumber': '3', 'ShardId': 's'},
+            ]
+        })
+        stubber.add_response('put_records', {
+            'Records': [{'SequenceNumber': '4', 'ShardId': 's'}]
+        }, {
+            'StreamARN': self.STREAM_ARN,
+            'Records': [{'Data': (json.dumps(records[1]) + '\n').encode('utf-8'), 'PartitionKey': 'key'}]
+        })
+
+        result = k.send_batch(records, partition_key='key')
+
+        assert result == [True, True, True]
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_batch_reports_persistent_failures(self, kinesis):
+        """Test that records still failing after all retries carry their error"""
+        from aws.Kinesis import MAX_BATCH_RETRIES
+        k, stubber = kinesis
+        for _ in range(MAX_BATCH_RETRIES + 1):
+            stubber.add_response('put_records', {
+                'FailedRecordCount': 1,
+                'Records': [{'ErrorCode': 'InternalFailure', 'ErrorMessage': 'boom'}]
+            })
+
+        result = k.send_batch([{'id': 'rec1'}])
+
+        assert result == ['InternalFailure: boom']
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_batch_splits_at_record_limit(self, kinesis):
+        """Test that more than 500 records are split across calls"""
+        k, stubber = kinesis
+        records = [{'id': f'rec{i}'} for i in range(501)]
+        stubber.add_response('put_records', {
+            'Records': [{'SequenceNumber': str(i), 'ShardId': 's'} for i in range(500)]
+        })
+        stubber.add_response('put_records', {
+            'Records': [{'SequenceNumber': '500', 'ShardId': 's'}]
+        })
+
+        result = k.send_batch(records)
+
+        assert result == [True] * 501
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_batch_client_error_fails_only_its_chunk(self, kinesis):
+        """Test that a chunk raising ClientError does not fail chunks already written"""
+        k, stubber = kinesis
+        records = [{'id': f'rec{i}'} for i in range(502)]
+        stubber.add_response('put_records', {
+            'Records': [{'SequenceNumber': str(i), 'ShardId': 's'} for i in range(500)]
+        })
+        stubber.add_client_error('put_records', 'ResourceNotFoundException', 'stream gone')
+
+        result = k.send_batch(records)
+
+        assert result == [True] * 500 + ['ResourceNotFoundException: stream gone'] * 2
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_stream_client_error_raised(self, kinesis):
+        """Test that a ClientError from put_record reaches the caller and drops expired credentials"""
+        import botocore.exceptions
+        k, stubber = kinesis
+        stubber.add_client_error('put_record', 'ExpiredTokenException', 'token expired')
+
+        with pytest.raises(botocore.exceptions.ClientError) as error:
+            k.send_stream({'id': 'rec1'}, partition_key='key')
+
+        assert error.value.response['Error']['Code'] == 'ExpiredTokenException'
+        assert k.CLIENT is None and k.expiration is None
+        stubber.assert_no_pending_responses()
+
+    @pytest.mark.unit
+    def test_send_batch_unauthorized(self, kinesis):
+        """Test that every record is reported as failed when unauthorized"""
+        k, _ = kinesis
+        k.authorized = False
+
+        assert k.send_batch([{'id': 'rec1'}, {'id': 'rec2'}]) == ['Service not authorized'] * 2
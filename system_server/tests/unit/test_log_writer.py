@@ -0,0 +1,204 @@
+"""
+Unit tests for tcp/log_writer.py and the GPIO CSV loggers built on it
+"""
+import csv
+import glob
+import itertools
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+TCP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tcp'))
+if TCP_DIR not in sys.path:
+    sys.path.insert(0, TCP_DIR)
+
+from log_writer import CsvLogWriter
+
+
+def _rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / 'logs' / 'gpio_log.csv')
+
+
+class TestCsvLogWriter:
+    """Tests for the background CSV writer"""
+
+    @pytest.mark.unit
+    def test_rows_written_in_background(self, log_path):
+        """Test that write returns before the row is on disk and flush waits for it"""
+        writer = CsvLogWriter(log_path, ['a', 'b'], flush_interval=10)
+        writer.write([1, 2])
+        writer.write([3, 4])
+
+        assert not os.path.exists(log_path)
+        assert writer.flush()
+        assert _rows(log_path) == [['a', 'b'], ['1', '2'], ['3', '4']]
+        writer.close()
+
+    @pytest.mark.unit
+    def test_batch_uses_one_open(self, log_path):
+        """Test that the file is opened once and flushed once per batch"""
+        writer = CsvLogWriter(log_path, ['a'], flush_interval=0.05)
+        real_open = open
+        with patch('builtins.open', side_effect=real_open) as opened:
+            for i in range(100):
+                writer.write([i])
+            writer.flush()
+            for i in range(100):
+                writer.write([i])
+            writer.close()
+
+        assert opened.call_count == 1
+        assert len(_rows(log_path)) == 201
+
+    @pytest.mark.unit
+    def test_existing_file_keeps_header(self, log_path):
+        """Test that appending to an existing log does not repeat the header"""
+        first = CsvLogWriter(log_path, ['a'])
+        first.write([1])
+        first.close()
+        second = CsvLogWriter(log_path, ['a'])
+        second.write([2])
+        second.close()
+
+        assert _rows(log_path) == [['a'], ['1'], ['2']]
+
+    @pytest.mark.unit
+    def test_full_queue_drops(self, log_path):
+        """Test that rows are dropped and counted instead of blocking when the queue is full"""
+        writer = CsvLogWriter(log_path, ['a'], queue_size=2)
+        with patch.object(writer, '_ensure_started'):
+            results = [writer.write([i]) for i in range(4)]
+
+        assert results == [True, True, False, False]
+        assert writer.dropped == 2
+
+    @pytest.mark.unit
+    def test_rotate_by_size(self, log_path):
+        """Test that a full file is renamed, a new one started with the header, and old ones pruned"""
+        writer = CsvLogWriter(log_path, ['value'], max_bytes=200, backups=2)
+        stamps = itertools.count(1)
+        with patch('log_writer.time.strftime', side_effect=lambda fmt, now: '.%d' % next(stamps)):
+            for i in range(100):
+                writer.write(['x' * 20])
+            writer.close()
+
+        rotated = glob.glob(log_path[:-4] + '.[0-9]*.csv')
+        assert writer.rotations >= 3
+        assert len(rotated) == 2
+        assert _rows(log_path)[0] == ['value']
+        assert all(_rows(path)[0] == ['value'] for path in rotated)
+
+    @pytest.mark.unit
+    def test_rotate_by_age(self, log_path):
+        """Test that a file written for max_age seconds is rotated"""
+        writer = CsvLogWriter(log_path, ['a'], max_age=60)
+        writer.write([1])
+        writer.flush()
+        writer.opened_at -= 61
+        writer.write([2])
+        writer.close()
+
+        assert writer.rotations == 1
+        assert _rows(log_path) == [['a'], ['2']]
+
+    @pytest.mark.unit
+    def test_close_all(self, log_path):
+        """Test that the shutdown hook writes out queued rows"""
+        import log_writer
+        writer = CsvLogWriter(log_path, ['a'], flush_interval=10)
+        writer.write([1])
+
+        log_writer.close_all()
+
+        assert _rows(log_path) == [['a'], ['1']]
+        assert writer.thread is None
+
+
+    @pytest.mark.unit
+    def test_close_joins_before_clearing(self, log_path):
+        """Test that close waits for the writer thread before dropping it"""
+        writer = CsvLogWriter(log_path, ['a'], flush_interval=10)
+        writer.write([1])
+        thread = writer.thread
+        seen = []
+        real_join = thread.join
+
+        def join(timeout=None):
+            seen.append(writer.thread)
+            real_join(timeout)
+
+        with patch.object(thread, 'join', side_effect=join):
+            writer.close()
+
+        assert seen == [thread]
+        assert not thread.is_alive()
+        assert writer.thread is None
+
+    @pytest.mark.unit
+    def test_write_after_close_rejected(self, log_path):
+        """Test that a closed writer rejects rows and never starts another thread"""
+        writer = CsvLogWriter(log_path, ['a'])
+        writer.write([1])
+        writer.close()
+
+        assert writer.write([2]) is False
+        assert writer.thread is None
+        assert writer.flush()
+        assert _rows(log_path) == [['a'], ['1']]
+
+
+class TestGpioCsvLogger:
+    """Tests for log_signal on the background writer"""
+
+    @pytest.mark.unit
+    def test_cycle_logged(self, log_path):
+        """Test that a FAIL cycle becomes one row without touching the disk on the caller's thread"""
+        import gpio_csv_logger
+
+        writer = CsvLogWriter(log_path, gpio_csv_logger.CSV_HEADERS, flush_interval=10)
+        with patch.object(gpio_csv_logger, 'writer', writer), patch.object(gpio_csv_logger, '_current_cycle', None):
+            for raw in (b'{"2": true}', b'{"1": true}', b'{"1": false}', b'{"2": false}'):
+                gpio_csv_logger.log_signal(raw)
+            assert not os.path.exists(log_path)
+            writer.close()
+
+        rows = _rows(log_path)
+        assert rows[0] == gpio_csv_logger.CSV_HEADERS
+        assert len(rows) == 2 and rows[1][0] == 'FAIL'
+
+    @pytest.mark.unit
+    def test_cycle_updates_serialized(self, log_path):
+        """Test that a signal waits for the cycle lock before touching the shared cycle"""
+        import threading
+        import gpio_csv_logger
+
+        writer = CsvLogWriter(log_path, gpio_csv_logger.CSV_HEADERS, flush_interval=10)
+        with patch.object(gpio_csv_logger, 'writer', writer), patch.object(gpio_csv_logger, '_current_cycle', None):
+            with gpio_csv_logger._cycle_lock:
+                signal = threading.Thread(target=gpio_csv_logger.log_signal, args=(b'{"2": true}',))
+                signal.start()
+                signal.join(0.1)
+                assert signal.is_alive()
+                assert gpio_csv_logger._current_cycle is None
+            signal.join(5)
+            assert gpio_csv_logger._current_cycle['result'] == 'FAIL'
+            writer.close()
+
+    @pytest.mark.unit
+    def test_error_logged(self, log_path):
+        """Test that log_gpio_error writes through its writer when DEBUG is on"""
+        import gpio_error_logger
+
+        writer = CsvLogWriter(log_path, gpio_error_logger.ERROR_HEADERS)
+        with patch.object(gpio_error_logger, 'writer', writer), patch.object(gpio_error_logger, 'DEBUG', True):
+            gpio_error_logger.log_gpio_error('set_gpio', 3, 1, 0, -1, 'boom')
+            writer.close()
+
+        assert _rows(log_path)[1][1:] == ['set_gpio', '3', '1', '0', '-1', 'boom']
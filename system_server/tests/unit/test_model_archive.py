@@ -0,0 +1,156 @@
+"""
+Unit tests for worker_scripts/model_archive.py
+"""
+import io
+import json
+import os
+import zipfile
+import pytest
+from unittest.mock import patch
+
+
+def _archive(version='3', extra=None):
+    """A model zip in the layout the cloud serves"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('job.json', json.dumps({'model_version': int(version)}))
+        zf.writestr('object-detection.pbtxt', 'item {}')
+        zf.writestr(version + '/saved_model/saved_model.pb', b'graph')
+        zf.writestr(version + '/saved_model/variables/variables.index', b'index')
+        zf.writestr(version + '/saved_model/variables/variables.data-00000-of-00001', b'data')
+        zf.writestr(version + '/saved_model/assets/', b'')
+        for name, content in (extra or {}).items():
+            zf.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def _files(root):
+    found = []
+    for path, dirs, files in os.walk(root):
+        for name in files:
+            found.append(os.path.relpath(os.path.join(path, name), root))
+    return sorted(found)
+
+
+class TestExtractModelArchive:
+    """Tests for extracting a model zip into its version directory"""
+
+    @pytest.mark.unit
+    def test_flat_layout(self, tmp_path):
+        """Test that members land where the prediction servers expect them"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        version = extract_model_archive(_archive(), str(tmp_path / 'model'))
+
+        assert version == '3'
+        assert _files(tmp_path / 'model') == [
+            '3/job.json', '3/object-detection.pbtxt', '3/saved_model.pb',
+            '3/variables/variables.data-00000-of-00001', '3/variables/variables.index',
+        ]
+        assert (tmp_path / 'model' / '3' / 'saved_model' / 'assets').is_dir()
+        assert (tmp_path / 'model' / '3' / 'saved_model.pb').read_bytes() == b'graph'
+
+    @pytest.mark.unit
+    def test_raw_layout(self, tmp_path):
+        """Test that flatten=False keeps every member at its archive path, as OCR models need"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        version = extract_model_archive(_archive(extra={'ocr/weights.bin': b'w'}), str(tmp_path / 'model'),
+                                        3, flatten=False)
+
+        assert version == '3'
+        assert _files(tmp_path / 'model' / '3') == [
+            '3/saved_model/saved_model.pb',
+            '3/saved_model/variables/variables.data-00000-of-00001',
+            '3/saved_model/variables/variables.index',
+            'job.json', 'object-detection.pbtxt', 'ocr/weights.bin',
+        ]
+
+    @pytest.mark.unit
+    def test_from_path_without_shell(self, tmp_path):
+        """Test extracting a zip on disk with an explicit version, and no subprocesses"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        archive = tmp_path / 'model.zip'
+        archive.write_bytes(_archive('7').getvalue())
+        with patch('os.system') as system:
+            assert extract_model_archive(str(archive), str(tmp_path / 'model'), 7) == '7'
+
+        system.assert_not_called()
+        assert (tmp_path / 'model' / '7' / 'job.json').exists()
+        assert sorted(os.listdir(tmp_path / 'model')) == ['7']
+
+    @pytest.mark.unit
+    def test_replaces_existing_version(self, tmp_path):
+        """Test that a re-extracted version replaces the old files"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        stale = tmp_path / 'model' / '3'
+        stale.mkdir(parents=True)
+        (stale / 'stale.txt').write_text('old')
+
+        extract_model_archive(_archive(), str(tmp_path / 'model'))
+
+        assert not (stale / 'stale.txt').exists()
+        assert sorted(os.listdir(tmp_path / 'model')) == ['3']
+
+    @pytest.mark.unit
+    def test_unsafe_members_skipped(self, tmp_path):
+        """Test that members cannot escape the version directory"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        extract_model_archive(_archive(extra={'../escape.txt': 'x', '/abs/../../x.txt': 'x'}),
+                              str(tmp_path / 'model'))
+
+        assert not (tmp_path / 'escape.txt').exists()
+        assert all(not name.endswith('x.txt') for name in _files(tmp_path))
+
+    @pytest.mark.unit
+    def test_no_job_data(self, tmp_path):
+        """Test that an archive without job.json and no version is not extracted"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            zf.writestr('1/saved_model/saved_model.pb', b'graph')
+
+        assert extract_model_archive(buffer, str(tmp_path / 'model')) is None
+        assert not (tmp_path / 'model').exists()
+
+    @pytest.mark.unit
+    def test_failed_extract_leaves_nothing(self, tmp_path):
+        """Test that a failure while copying removes the staging directory"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        with patch('shutil.copyfileobj', side_effect=OSError('disk full')), pytest.raises(OSError):
+            extract_model_archive(_archive(), str(tmp_path / 'model'))
+
+        assert os.listdir(tmp_path / 'model') == []
+
+    @pytest.mark.unit
+    def test_bad_zip(self, tmp_path):
+        """Test that a corrupt archive raises BadZipfile"""
+        from worker_scripts.model_archive import extract_model_archive
+
+        with pytest.raises(zipfile.BadZipfile):
+            extract_model_archive(io.BytesIO(b'not a zip'), str(tmp_path / 'model'))
+
+
+class TestInstallVersion:
+    """Tests for moving a version directory into place"""
+
+    @pytest.mark.unit
+    def test_install(self, tmp_path):
+        """Test moving a staged version into a new model folder"""
+        from worker_scripts.model_archive import install_version
+
+        source = tmp_path / 'upload' / '5'
+        source.mkdir(parents=True)
+        (source / 'saved_model.pb').write_bytes(b'graph')
+
+        target = install_version(str(source), str(tmp_path / 'models' / 'm'), '5')
+
+        assert target == str(tmp_path / 'models' / 'm' / '5')
+        assert (tmp_path / 'models' / 'm' / '5' / 'saved_model.pb').exists()
+        assert not source.exists()
@@ -0,0 +1,242 @@
+"""
+Unit tests for worker_scripts/model_deployer.py
+"""
+import json
+import os
+import subprocess
+import pytest
+from unittest.mock import patch
+
+
+CONFIG = """model_config_list {{
+{}}}
+"""
+
+
+class FakeDocker(object):
+    """Records docker commands; inspect returns the current container id"""
+
+    def __init__(self, container_id='abc'):
+        self.container_id = container_id
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        if args[0] == 'inspect':
+            return self.container_id + '\n'
+        return ''
+
+    def commands(self, name):
+        return [call for call in self.calls if call[0] == name]
+
+
+def _version(root, model, version, content=b'graph'):
+    path = root / model / version
+    path.mkdir(parents=True, exist_ok=True)
+    (path / 'saved_model.pb').write_bytes(content)
+    return path
+
+
+def _config(root, *models):
+    entries = ''.join("  config {{\n    name: '{}'\n  }}\n".format(model) for model in models)
+    (root / 'model.config').write_text(CONFIG.format(entries))
+
+
+def _deployer(root, docker, **kwargs):
+    from worker_scripts.model_deployer import ModelDeployer
+    return ModelDeployer('localprediction', str(root), '/models', docker=docker, **kwargs)
+
+
+class TestModelDeployer:
+    """Tests for incremental deploys into a container"""
+
+    @pytest.mark.unit
+    def test_first_deploy_copies_everything(self, tmp_path):
+        """Test that a container without a manifest gets a full deploy"""
+        _version(tmp_path, 'm1', '1')
+        _version(tmp_path, 'm2', '4')
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['full']
+        assert report['copied'] == ['m1/1', 'm2/4']
+        assert report['bytes'] == 10
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models') in docker.calls
+        assert docker.commands('cp') == [
+            ('cp', str(tmp_path / 'm1' / '1'), 'localprediction:/models/m1'),
+            ('cp', str(tmp_path / 'm2' / '4'), 'localprediction:/models/m2'),
+        ]
+        manifest = json.loads((tmp_path / '.deployed.json').read_text())
+        assert manifest['container'] == 'abc'
+        assert sorted(manifest['versions']) == ['m1/1', 'm2/4']
+
+    @pytest.mark.unit
+    def test_unchanged_tree_copies_nothing(self, tmp_path):
+        """Test that a second sync of the same tree only inspects the container"""
+        _version(tmp_path, 'm1', '1')
+        _deployer(tmp_path, FakeDocker()).deploy()
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert docker.calls == [('inspect', '-f', '{{.Id}}', 'localprediction')]
+        assert report['copied'] == [] and report['unchanged'] == 1
+        assert not report['full'] and not report['config_changed']
+
+    @pytest.mark.unit
+    def test_only_new_version_copied(self, tmp_path):
+        """Test that adding a version copies just that version"""
+        _version(tmp_path, 'm1', '1')
+        _deployer(tmp_path, FakeDocker()).deploy()
+        _version(tmp_path, 'm1', '2')
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['copied'] == ['m1/2']
+        assert docker.commands('cp') == [('cp', str(tmp_path / 'm1' / '2'), 'localprediction:/models/m1')]
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models') not in docker.calls
+
+    @pytest.mark.unit
+    def test_changed_version_replaced(self, tmp_path):
+        """Test that a re-extracted version is removed in the container and copied again"""
+        _version(tmp_path, 'm1', '1')
+        _deployer(tmp_path, FakeDocker()).deploy()
+        _version(tmp_path, 'm1', '1', content=b'new graph')
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['copied'] == ['m1/1']
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models/m1/1') in docker.calls
+
+    @pytest.mark.unit
+    def test_removed_versions_and_models(self, tmp_path):
+        """Test that versions and models gone from the host are removed from the container"""
+        _version(tmp_path, 'm1', '1')
+        _version(tmp_path, 'm1', '2')
+        _version(tmp_path, 'm2', '1')
+        _deployer(tmp_path, FakeDocker()).deploy()
+        (tmp_path / 'm1' / '1' / 'saved_model.pb').unlink()
+        os.rmdir(tmp_path / 'm1' / '1')
+        (tmp_path / 'm2' / '1' / 'saved_model.pb').unlink()
+        os.rmdir(tmp_path / 'm2' / '1')
+        os.rmdir(tmp_path / 'm2')
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['removed'] == ['m1/1', 'm2/1']
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models/m1/1') in docker.calls
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models/m2') in docker.calls
+        assert ('exec', 'localprediction', 'rm', '-rf', '/models/m1') not in docker.calls
+        assert docker.commands('cp') == []
+
+    @pytest.mark.unit
+    def test_recreated_container_full_deploy(self, tmp_path):
+        """Test that a different container id deploys everything again"""
+        _version(tmp_path, 'm1', '1')
+        _deployer(tmp_path, FakeDocker('abc')).deploy()
+        docker = FakeDocker('def')
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['full'] and report['copied'] == ['m1/1']
+
+    @pytest.mark.unit
+    def test_staging_directories_ignored(self, tmp_path):
+        """Test that dot-directories left by extraction are not deployed"""
+        _version(tmp_path, 'm1', '1')
+        _version(tmp_path, 'm1', '.2.partial')
+        _version(tmp_path, '.m1.model.zip.d', '1')
+        docker = FakeDocker()
+
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['copied'] == ['m1/1']
+
+    @pytest.mark.unit
+    def test_failed_copy_keeps_progress(self, tmp_path):
+        """Test that versions copied before a docker failure are not copied again"""
+        _version(tmp_path, 'm1', '1')
+        _version(tmp_path, 'm1', '2')
+        docker = FakeDocker()
+
+        def failing(*args):
+            if args[0] == 'cp' and args[1].endswith('2'):
+                raise subprocess.CalledProcessError(1, 'docker cp')
+            return docker(*args)
+
+        with pytest.raises(subprocess.CalledProcessError):
+            _deployer(tmp_path, failing).deploy()
+        docker.calls = []
+        report = _deployer(tmp_path, docker).deploy()
+
+        assert report['copied'] == ['m1/2']
+
+
+class TestDeployConfig:
+    """Tests for model.config handling"""
+
+    @pytest.mark.unit
+    def test_config_copied_only_when_changed(self, tmp_path):
+        """Test that model.config is copied when it changes and the server is never restarted"""
+        _version(tmp_path, 'm1', '1')
+        _config(tmp_path, 'm1')
+        deploy = lambda docker: _deployer(tmp_path, docker, config_name='model.config').deploy()
+
+        first = FakeDocker()
+        assert deploy(first)['config_changed']
+        assert ('cp', str(tmp_path / 'model.config'), 'localprediction:/models/model.config') in first.calls
+
+        _version(tmp_path, 'm1', '2')
+        second = FakeDocker()
+        assert not deploy(second)['config_changed']
+        assert second.commands('cp') == [('cp', str(tmp_path / 'm1' / '2'), 'localprediction:/models/m1')]
+
+        _version(tmp_path, 'm2', '1')
+        _config(tmp_path, 'm1', 'm2')
+        third = FakeDocker()
+        assert deploy(third)['config_changed']
+        assert ('cp', str(tmp_path / 'model.config'), 'localprediction:/models/model.config') in third.calls
+
+        assert first.commands('restart') + second.commands('restart') + third.commands('restart') == []
+
+
+class TestDeployModels:
+    """Tests for the deploy_models wrapper"""
+
+    @pytest.mark.unit
+    def test_docker_failure_returns_none(self, tmp_path):
+        """Test that a docker failure is reported and not raised"""
+        from worker_scripts.model_deployer import deploy_models
+
+        def missing(*args):
+            raise FileNotFoundError('docker')
+
+        assert deploy_models(_deployer(tmp_path, missing)) is None
+
+    @pytest.mark.unit
+    def test_report_returned(self, tmp_path):
+        """Test that the deploy report is returned"""
+        from worker_scripts.model_deployer import deploy_models
+        _version(tmp_path, 'm1', '1')
+
+        report = deploy_models(_deployer(tmp_path, FakeDocker()))
+
+        assert report['copied'] == ['m1/1']
+
+    @pytest.mark.unit
+    def test_factories(self):
+        """Test the localprediction and predictlite deployers"""
+        from worker_scripts.model_deployer import prediction_deployer, lite_deployer
+
+        prediction = prediction_deployer('/models/')
+        lite = lite_deployer('/lite_models')
+
+        assert (prediction.container, prediction.host_root, prediction.container_root) == \
+            ('localprediction', '/models', '/models')
+        assert prediction.config_name == 'model.config'
+        assert (lite.container, lite.container_root, lite.config_name) == \
+            ('predictlite', '/data/lite_models', None)
@@ -0,0 +1,194 @@
+"""
+Unit tests for worker_scripts/model_downloads.py
+
+A local HTTP server stands in for the cloud: it serves Range requests and
+can cut a response short, ignore ranges, send a wrong checksum or send
+Content-MD5 of the body instead of x-goog-hash.
+"""
+import base64
+import hashlib
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MB
+CHUNK   = 64 * 1024  # bytes of a cut read are lost, so resumes start at a chunk boundary
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        payload = server.payload
+        start = 0
+        ranged = self.headers.get('Range')
+        if ranged and server.ranges:
+            start = int(ranged.split('=')[1].rstrip('-'))
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % len(payload))
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, len(payload) - 1, len(payload)))
+        else:
+            self.send_response(200)
+        body = payload[start:]
+        self.send_header('Content-Length', str(len(body)))
+        if server.content_md5:
+            self.send_header('Content-MD5', base64.b64encode(hashlib.md5(body).digest()).decode())
+        else:
+            md5 = server.md5 or hashlib.md5(payload).digest()
+            self.send_header('x-goog-hash', 'crc32c=AAAAAA==,md5=' + base64.b64encode(md5).decode())
+        self.end_headers()
+        if server.cut_after:
+            # drop the connection part way through
+            self.wfile.write(body[:server.cut_after.pop(0)])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.payload, server.requests, server.cut_after = PAYLOAD, [], []
+    server.ranges, server.md5, server.content_md5 = True, None, False
+    server.url = 'http://127.0.0.1:%d/model.zip' % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _fetch(server, destination, **kwargs):
+    from worker_scripts.model_downloads import fetch
+    return fetch(server.url, str(destination), session=requests.Session(), **kwargs)
+
+
+class TestFetch:
+    """Tests for resumable, verified downloads"""
+
+    @pytest.mark.unit
+    def test_download(self, server, tmp_path):
+        """Test a plain download lands at the destination with no part file left"""
+        progress = MagicMock()
+
+        _fetch(server, tmp_path / 'model.zip', headers={'Authorization': 'Bearer t'}, progress=progress)
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+        assert not (tmp_path / 'model.zip.part').exists()
+        assert server.requests[0]['Authorization'] == 'Bearer t'
+        progress.begin.assert_called_once_with(len(PAYLOAD), 0)
+        assert sum(c[0][0] for c in progress.advance.call_args_list) == len(PAYLOAD)
+        progress.finish.assert_called_once()
+
+    @pytest.mark.unit
+    def test_resume_after_dropped_connection(self, server, tmp_path):
+        """Test that a cut transfer is resumed with a Range request from the last whole chunk"""
+        server.cut_after = [300000]
+
+        _fetch(server, tmp_path / 'model.zip', chunk_size=CHUNK)
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+        assert 'Range' not in server.requests[0]
+        assert server.requests[1]['Range'] == 'bytes=%d-' % (300000 // CHUNK * CHUNK)
+
+    @pytest.mark.unit
+    def test_resume_part_from_earlier_job(self, server, tmp_path):
+        """Test that a part file left by an earlier job is continued"""
+        (tmp_path / 'model.zip.part').write_bytes(PAYLOAD[:1000])
+        progress = MagicMock()
+
+        _fetch(server, tmp_path / 'model.zip', progress=progress)
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+        assert server.requests[0]['Range'] == 'bytes=1000-'
+        progress.begin.assert_called_once_with(len(PAYLOAD), 1000)
+
+    @pytest.mark.unit
+    def test_resume_with_range_content_md5(self, server, tmp_path):
+        """Test that a resumed download is not checked against a Content-MD5 of just the range"""
+        server.content_md5 = True
+        (tmp_path / 'model.zip.part').write_bytes(PAYLOAD[:1000])
+
+        _fetch(server, tmp_path / 'model.zip', attempts=1)
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+        assert server.requests[0]['Range'] == 'bytes=1000-'
+
+    @pytest.mark.unit
+    def test_complete_part(self, server, tmp_path):
+        """Test that a part file already holding everything is verified and renamed"""
+        (tmp_path / 'model.zip.part').write_bytes(PAYLOAD)
+
+        _fetch(server, tmp_path / 'model.zip')
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+
+    @pytest.mark.unit
+    def test_server_ignores_range(self, server, tmp_path):
+        """Test that a 200 answer to a Range request starts the file over"""
+        server.ranges = False
+        (tmp_path / 'model.zip.part').write_bytes(b'junk' * 100)
+
+        _fetch(server, tmp_path / 'model.zip')
+
+        assert (tmp_path / 'model.zip').read_bytes() == PAYLOAD
+
+    @pytest.mark.unit
+    def test_checksum_mismatch(self, server, tmp_path):
+        """Test that a file not matching the server's MD5 is never renamed into place"""
+        from worker_scripts.model_downloads import DownloadError
+        server.md5 = hashlib.md5(b'something else').digest()
+
+        with pytest.raises(DownloadError):
+            _fetch(server, tmp_path / 'model.zip', attempts=2)
+
+        assert not (tmp_path / 'model.zip').exists()
+        assert not (tmp_path / 'model.zip.part').exists()
+        assert len(server.requests) == 2
+
+    @pytest.mark.unit
+    def test_gives_up_after_attempts(self, server, tmp_path):
+        """Test that repeated failures raise, keeping the part file for the next job"""
+        from worker_scripts.model_downloads import DownloadError
+        server.cut_after = [100000, 100000]
+
+        with pytest.raises((DownloadError, requests.RequestException)):
+            _fetch(server, tmp_path / 'model.zip', attempts=2, chunk_size=CHUNK)
+
+        assert not (tmp_path / 'model.zip').exists()
+        assert (tmp_path / 'model.zip.part').stat().st_size == 2 * CHUNK
+
+
+class TestExpectedMd5:
+    """Tests for reading the server's checksum"""
+
+    @pytest.mark.unit
+    def test_headers(self):
+        """Test x-goog-hash, Content-MD5 and no checksum"""
+        from worker_scripts.model_downloads import expected_md5
+        digest = hashlib.md5(b'x')
+        encoded = base64.b64encode(digest.digest()).decode()
+
+        assert expected_md5(MagicMock(headers={'x-goog-hash': 'crc32c=abc=,md5=' + encoded})) == digest.hexdigest()
+        assert expected_md5(MagicMock(headers={'Content-MD5': encoded}, status_code=200)) == digest.hexdigest()
+        assert expected_md5(MagicMock(headers={})) is None
+
+    @pytest.mark.unit
+    def test_range_content_md5_ignored(self):
+        """Test that Content-MD5 on a 206 is not taken for the whole file, while x-goog-hash is"""
+        from worker_scripts.model_downloads import expected_md5
+        digest = hashlib.md5(b'x')
+        encoded = base64.b64encode(digest.digest()).decode()
+
+        assert expected_md5(MagicMock(headers={'Content-MD5': encoded}, status_code=206)) is None
+        assert expected_md5(MagicMock(headers={'x-goog-hash': 'md5=' + encoded}, status_code=206)) == digest.hexdigest()
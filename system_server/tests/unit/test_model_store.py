@@ -0,0 +1,201 @@
+"""
+Unit tests for worker_scripts/model_store.py
+"""
+import json
+import os
+import zipfile
+import pytest
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+def _archive(path, version='3', graph=b'graph'):
+    """A model zip in the layout the cloud serves, written to path"""
+    members = {
+        'job.json': json.dumps({'model_version': version}),
+        version + '/saved_model/saved_model.pb': graph,
+        version + '/saved_model/variables/variables.index': b'index',
+    }
+    with zipfile.ZipFile(path, 'w') as zf:
+        for name, content in members.items():
+            # fixed timestamps so identical archives hash the same
+            zf.writestr(zipfile.ZipInfo(name, date_time=(2020, 1, 1, 0, 0, 0)), content)
+    return str(path)
+
+
+def _store(tmp_path, budget=10 ** 9):
+    from worker_scripts.model_store import ModelStore
+    return ModelStore(str(tmp_path / 'model_store'), budget, clock=Clock())
+
+
+class TestModelStore:
+    """Tests for the content-addressed model store"""
+
+    @pytest.mark.unit
+    def test_add_and_link(self, tmp_path):
+        """Test that a stored version is hard-linked into a serving directory"""
+        store = _store(tmp_path)
+        archive = _archive(tmp_path / 'm.zip')
+
+        obj = store.add('p1', '3', archive)
+        assert store.link('p1', '3', str(tmp_path / 'models' / 'm' / '3'))
+
+        served = tmp_path / 'models' / 'm' / '3' / 'saved_model.pb'
+        assert served.read_bytes() == b'graph'
+        assert os.path.samefile(served, os.path.join(obj, 'saved_model.pb'))
+        assert (tmp_path / 'models' / 'm' / '3' / 'variables' / 'variables.index').exists()
+        assert sorted(os.listdir(tmp_path / 'models' / 'm')) == ['3']
+
+    @pytest.mark.unit
+    def test_miss(self, tmp_path):
+        """Test that linking an unknown version reports a miss"""
+        store = _store(tmp_path)
+
+        assert store.link('p1', '3', str(tmp_path / 'models' / 'm' / '3')) is False
+        assert not (tmp_path / 'models').exists()
+
+    @pytest.mark.unit
+    def test_index_persists(self, tmp_path):
+        """Test that a new store instance finds earlier versions"""
+        _store(tmp_path).add('p1', '3', _archive(tmp_path / 'm.zip'))
+
+        store = _store(tmp_path)
+
+        assert store.path('p1', '3') is not None
+        assert store.link('p1', '3', str(tmp_path / 'lite_models' / 'm' / '3'))
+
+    @pytest.mark.unit
+    def test_same_content_shared(self, tmp_path):
+        """Test that identical archives are stored once"""
+        store = _store(tmp_path)
+        first = store.add('p1', '3', _archive(tmp_path / 'a.zip'))
+        second = store.add('p2', '3', _archive(tmp_path / 'b.zip'))
+
+        assert first == second
+        assert len(os.listdir(store.objects)) == 1
+        assert store.size() == store.index['p1/3']['bytes']
+
+    @pytest.mark.unit
+    def test_raw_layout(self, tmp_path):
+        """Test that OCR archives are stored unflattened, apart from the flattened object"""
+        store = _store(tmp_path)
+        archive = _archive(tmp_path / 'm.zip')
+        flat = store.add('p1', '3', archive)
+
+        raw = store.add('ocr', '3', archive, flatten=False)
+        store.link('ocr', '3', str(tmp_path / 'tmp' / 'ocr_model'))
+
+        assert raw != flat
+        assert (tmp_path / 'tmp' / 'ocr_model' / 'job.json').exists()
+        assert (tmp_path / 'tmp' / 'ocr_model' / '3' / 'saved_model' / 'saved_model.pb').exists()
+        assert os.path.exists(os.path.join(flat, 'saved_model.pb'))
+
+    @pytest.mark.unit
+    def test_relink_keeps_mtime(self, tmp_path):
+        """Test that relinking a version leaves its files' mtimes unchanged for the deployer"""
+        from worker_scripts.model_deployer import version_signature
+        store = _store(tmp_path)
+        store.add('p1', '3', _archive(tmp_path / 'm.zip'))
+        target = str(tmp_path / 'models' / 'm' / '3')
+
+        store.link('p1', '3', target)
+        before = version_signature(target)
+        store.link('p1', '3', target)
+
+        assert version_signature(target) == before
+
+    @pytest.mark.unit
+    def test_bad_archive_leaves_store_unchanged(self, tmp_path):
+        """Test that a corrupt archive adds nothing"""
+        store = _store(tmp_path)
+        bad = tmp_path / 'bad.zip'
+        bad.write_bytes(b'not a zip')
+
+        with pytest.raises(zipfile.BadZipfile):
+            store.add('p1', '3', str(bad))
+
+        assert store.index == {}
+        assert not os.path.exists(store.objects) or os.listdir(store.objects) == []
+
+
+class TestEviction:
+    """Tests for LRU eviction under the disk budget"""
+
+    @pytest.mark.unit
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test that the oldest unused versions go first"""
+        store = _store(tmp_path)
+        for version in ('1', '2', '3'):
+            store.add('p1', version, _archive(tmp_path / (version + '.zip'), version, graph=b'g' * 100 + version.encode()))
+        size = store.index['p1/1']['bytes']
+        store.link('p1', '1', str(tmp_path / 'models' / 'm' / '1'))
+        store.budget = size * 2
+
+        evicted = store.evict()
+
+        assert evicted == ['p1/2']
+        assert store.path('p1', '2') is None
+        assert store.path('p1', '1') and store.path('p1', '3')
+        assert len(os.listdir(store.objects)) == 2
+
+    @pytest.mark.unit
+    def test_keep(self, tmp_path):
+        """Test that versions used by the current sync are never evicted"""
+        store = _store(tmp_path)
+        store.add('p1', '1', _archive(tmp_path / '1.zip', '1'))
+        store.add('p1', '2', _archive(tmp_path / '2.zip', '2'))
+        store.budget = 0
+
+        assert store.evict(keep={'p1/1', 'p1/2'}) == []
+        assert store.evict(keep={'p1/2'}) == ['p1/1']
+
+    @pytest.mark.unit
+    def test_shared_object_kept_until_unreferenced(self, tmp_path):
+        """Test that an object shared by two versions stays while one still uses it"""
+        store = _store(tmp_path)
+        obj = store.add('p1', '3', _archive(tmp_path / 'a.zip'))
+        store.add('p2', '3', _archive(tmp_path / 'b.zip'))
+        store.budget = 0
+
+        store.evict(keep={'p2/3'})
+
+        assert os.path.isdir(obj)
+        assert store.evict() == ['p2/3']
+        assert not os.path.isdir(obj)
+
+
+class TestClearServingDir:
+    """Tests for emptying a serving directory"""
+
+    @pytest.mark.unit
+    def test_keeps_manifest(self, tmp_path):
+        """Test that the deploy manifest survives while models are removed"""
+        from worker_scripts.model_store import clear_serving_dir
+        (tmp_path / 'm' / '1').mkdir(parents=True)
+        (tmp_path / 'model.config').write_text('x')
+        (tmp_path / '.deployed.json').write_text('{}')
+
+        clear_serving_dir(str(tmp_path))
+
+        assert os.listdir(tmp_path) == ['.deployed.json']
+
+    @pytest.mark.unit
+    def test_keeps_interrupted_downloads(self, tmp_path):
+        """Test that part files of interrupted downloads survive so the next sync resumes them"""
+        from worker_scripts.model_store import clear_serving_dir
+        (tmp_path / 'm' / '1').mkdir(parents=True)
+        (tmp_path / 'm' / '.2.model.zip.part').write_bytes(b'half')
+        (tmp_path / 'm' / '.3.model.zip').write_bytes(b'done')
+        (tmp_path / 'n' / '1').mkdir(parents=True)
+
+        clear_serving_dir(str(tmp_path))
+
+        assert sorted(os.listdir(tmp_path)) == ['m']
+        assert os.listdir(tmp_path / 'm') == ['.2.model.zip.part']
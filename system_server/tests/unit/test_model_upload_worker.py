@@ -7,6 +7,15 @@ import json
 from unittest.mock import Mock, patch, MagicMock, mock_open, call
 
 
+@pytest.fixture
+def mock_install():
+    """install_version, shutil.rmtree and deploy_models as seen by upload_model"""
+    with patch('worker_scripts.model_upload_worker.install_version') as install, \
+         patch('worker_scripts.model_upload_worker.shutil.rmtree') as rmtree, \
+         patch('worker_scripts.model_upload_worker.deploy_models') as deploy:
+        yield install, rmtree, deploy
+
+
 class TestCreateConfigFile:
     """Tests for create_config_file function"""
 
@@ -139,7 +148,7 @@ class TestUploadModel:
     @patch('worker_scripts.model_upload_worker.models_collection')
     @patch('worker_scripts.model_upload_worker.create_config_file')
     def test_upload_model_new_model(self, mock_create_config, mock_models_collection,
-                                     mock_read_job, mock_exists, mock_os_system):
+                                     mock_read_job, mock_exists, mock_os_system, mock_install):
         """Test uploading a completely new model"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -153,9 +162,9 @@ class TestUploadModel:
         result = upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
         assert result is True
-        # Should create directory and move version
-        assert any('mkdir' in str(call) for call in mock_os_system.call_args_list)
-        assert any('mv' in str(call) for call in mock_os_system.call_args_list)
+        # Should move the version into a new model folder without shelling out
+        mock_install[0].assert_called_once_with('/tmp/testmodel/v1', '/models/testmodel', 'v1')
+        assert not any('mv ' in str(call) or 'mkdir' in str(call) for call in mock_os_system.call_args_list)
         # Should create config file for high_accuracy models
         mock_create_config.assert_called_once()
         # Should update MongoDB
@@ -167,7 +176,7 @@ class TestUploadModel:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_upload_model_add_version(self, mock_models_collection, mock_read_job,
-                                       mock_exists, mock_os_system):
+                                       mock_exists, mock_os_system, mock_install):
         """Test adding a new version to existing model"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -184,9 +193,8 @@ class TestUploadModel:
         result = upload_model('/tmp/testmodel', 'testmodel#v2.zip')
 
         assert result is True
-        # Should move version but not create directory
-        mv_calls = [call for call in mock_os_system.call_args_list if 'mv' in str(call)]
-        assert len(mv_calls) > 0
+        # Should move version into the existing model folder
+        mock_install[0].assert_called_once_with('/tmp/testmodel/v2', '/models/testmodel', 'v2')
         # Should add version to existing model
         mock_models_collection.update_one.assert_called()
 
@@ -194,7 +202,7 @@ class TestUploadModel:
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.model_upload_worker.read_job_file')
-    def test_upload_model_already_exists(self, mock_read_job, mock_exists, mock_os_system):
+    def test_upload_model_already_exists(self, mock_read_job, mock_exists, mock_os_system, mock_install):
         """Test uploading a model version that already exists"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -209,8 +217,8 @@ class TestUploadModel:
 
         assert result is False
         # Should remove temp files
-        rm_calls = [call for call in mock_os_system.call_args_list if 'rm -rf' in str(call)]
-        assert len(rm_calls) > 0
+        mock_install[1].assert_called_once_with('/tmp/testmodel', ignore_errors=True)
+        mock_install[0].assert_not_called()
 
     @pytest.mark.unit
     @patch('os.system')
@@ -218,7 +226,7 @@ class TestUploadModel:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_upload_model_lite_model(self, mock_models_collection, mock_read_job,
-                                      mock_exists, mock_os_system):
+                                      mock_exists, mock_os_system, mock_install):
         """Test uploading a lite/high_speed model"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -232,9 +240,10 @@ class TestUploadModel:
         result = upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
         assert result is True
-        # Should use lite_models path
-        docker_calls = [str(call) for call in mock_os_system.call_args_list if 'docker' in str(call)]
-        assert any('predictlite' in call for call in docker_calls)
+        # Should deploy /lite_models to predictlite
+        deployer = mock_install[2].call_args[0][0]
+        assert deployer.container == 'predictlite'
+        assert deployer.host_root == '/lite_models'
         # Should update high_speed field in MongoDB
         update_call = mock_models_collection.update_one.call_args
         assert '$set' in str(update_call) and 'high_speed' in str(update_call)
@@ -269,7 +278,7 @@ class TestUploadModel:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_upload_model_version_from_filename(self, mock_models_collection, mock_read_job,
-                                                  mock_exists, mock_os_system):
+                                                  mock_exists, mock_os_system, mock_install):
         """Test extracting version from filename when not in job.json"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -281,8 +290,7 @@ class TestUploadModel:
 
         assert result is True
         # Version should be extracted from filename (v123)
-        mv_call = str(mock_os_system.call_args_list)
-        assert 'v123' in mv_call
+        assert mock_install[0].call_args[0][2] == 'v123'
 
 
 class TestModelTypeHandling:
@@ -302,7 +310,7 @@ class TestModelTypeHandling:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_model_default_type(self, mock_models_collection, mock_read_job,
-                                 mock_exists, mock_os_system):
+                                 mock_exists, mock_os_system, mock_install):
         """Test that model defaults to high_accuracy when type not specified"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -313,8 +321,9 @@ class TestModelTypeHandling:
         result = upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
         # Should use regular models path, not lite_models
-        docker_calls = [str(call) for call in mock_os_system.call_args_list if 'docker' in str(call)]
-        assert any('localprediction' in call for call in docker_calls)
+        deployer = mock_install[2].call_args[0][0]
+        assert deployer.container == 'localprediction'
+        assert deployer.host_root == '/models'
 
 
 class TestDockerOperations:
@@ -326,9 +335,9 @@ class TestDockerOperations:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     @patch('worker_scripts.model_upload_worker.create_config_file')
-    def test_docker_restart_prediction_server(self, mock_create_config, mock_models_collection,
-                                               mock_read_job, mock_exists, mock_os_system):
-        """Test that prediction server is restarted after model upload"""
+    def test_prediction_server_config_deployed(self, mock_create_config, mock_models_collection,
+                                               mock_read_job, mock_exists, mock_os_system, mock_install):
+        """Test that the prediction server gets model.config through the deployer, without a docker restart"""
         from worker_scripts.model_upload_worker import upload_model
 
         mock_read_job.return_value = {'model_version': 'v1', 'model_type': 'high_accuracy'}
@@ -336,11 +345,11 @@ class TestDockerOperations:
 
         upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
-        # Check for docker restart command
-        restart_calls = [str(call) for call in mock_os_system.call_args_list
-                        if 'docker restart' in str(call)]
-        assert len(restart_calls) > 0
-        assert any('localprediction' in call for call in restart_calls)
+        # The deployer copies model.config; the server polls it
+        deployer = mock_install[2].call_args[0][0]
+        assert deployer.container == 'localprediction'
+        assert deployer.config_name == 'model.config'
+        assert not any('docker restart' in str(call) for call in mock_os_system.call_args_list)
 
     @pytest.mark.unit
     @patch('os.system')
@@ -348,7 +357,7 @@ class TestDockerOperations:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_docker_copy_to_lite_server(self, mock_models_collection, mock_read_job,
-                                         mock_exists, mock_os_system):
+                                         mock_exists, mock_os_system, mock_install):
         """Test that lite models are copied to predictlite container"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -357,11 +366,11 @@ class TestDockerOperations:
 
         upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
-        # Check for docker cp command to predictlite
-        docker_calls = [str(call) for call in mock_os_system.call_args_list
-                       if 'docker cp' in str(call)]
-        assert len(docker_calls) > 0
-        assert any('predictlite' in call for call in docker_calls)
+        # Lite models are deployed to predictlite without a restart
+        deployer = mock_install[2].call_args[0][0]
+        assert deployer.container == 'predictlite'
+        assert deployer.container_root == '/data/lite_models'
+        assert deployer.config_name is None
 
 
 class TestFilePathConstruction:
@@ -372,7 +381,7 @@ class TestFilePathConstruction:
     @patch('os.path.exists')
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
-    def test_model_paths(self, mock_models_collection, mock_read_job, mock_exists, mock_os_system):
+    def test_model_paths(self, mock_models_collection, mock_read_job, mock_exists, mock_os_system, mock_install):
         """Test correct model path construction"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -383,17 +392,14 @@ class TestFilePathConstruction:
         upload_model('/tmp/mymodel', 'mymodel#v1.zip')
 
         # Verify paths include model name
-        system_calls = [str(call) for call in mock_os_system.call_args_list]
-        combined = ' '.join(system_calls)
-
-        assert '/models/mymodel' in combined or 'mymodel' in combined
+        assert mock_install[0].call_args[0][1] == '/models/mymodel'
 
     @pytest.mark.unit
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
-    def test_version_paths(self, mock_models_collection, mock_read_job, mock_exists, mock_os_system):
+    def test_version_paths(self, mock_models_collection, mock_read_job, mock_exists, mock_os_system, mock_install):
         """Test correct version path construction"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -407,10 +413,7 @@ class TestFilePathConstruction:
         upload_model('/tmp/mymodel', 'mymodel#v2.5.zip')
 
         # Verify version is in the paths
-        system_calls = [str(call) for call in mock_os_system.call_args_list]
-        combined = ' '.join(system_calls)
-
-        assert 'v2.5' in combined
+        assert mock_install[0].call_args[0] == ('/tmp/mymodel/v2.5', '/models/mymodel', 'v2.5')
 
 
 class TestCleanupOperations:
@@ -422,7 +425,7 @@ class TestCleanupOperations:
     @patch('worker_scripts.model_upload_worker.read_job_file')
     @patch('worker_scripts.model_upload_worker.models_collection')
     def test_temp_path_cleanup_success(self, mock_models_collection, mock_read_job,
-                                        mock_exists, mock_os_system):
+                                        mock_exists, mock_os_system, mock_install):
         """Test that temp path is cleaned up after successful upload"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -431,16 +434,14 @@ class TestCleanupOperations:
 
         upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
-        # Check for rm -rf of temp path
-        rm_calls = [str(call) for call in mock_os_system.call_args_list
-                   if 'rm -rf' in str(call)]
-        assert any('/tmp/testmodel' in call for call in rm_calls)
+        # Check that the temp path is removed
+        mock_install[1].assert_called_once_with('/tmp/testmodel', ignore_errors=True)
 
     @pytest.mark.unit
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.model_upload_worker.read_job_file')
-    def test_temp_path_cleanup_already_exists(self, mock_read_job, mock_exists, mock_os_system):
+    def test_temp_path_cleanup_already_exists(self, mock_read_job, mock_exists, mock_os_system, mock_install):
         """Test that temp path is cleaned up when model already exists"""
         from worker_scripts.model_upload_worker import upload_model
 
@@ -450,6 +451,4 @@ class TestCleanupOperations:
         upload_model('/tmp/testmodel', 'testmodel#v1.zip')
 
         # Should still clean up temp path
-        rm_calls = [str(call) for call in mock_os_system.call_args_list
-                   if 'rm -rf' in str(call)]
-        assert any('/tmp/testmodel' in call for call in rm_calls)
+        mock_install[1].assert_called_once_with('/tmp/testmodel', ignore_errors=True)
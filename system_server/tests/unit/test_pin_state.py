@@ -0,0 +1,77 @@
+"""
+Unit tests for utils/pin_state.py
+"""
+import json
+import pytest
+
+
+class TestPinState:
+    """Tests for the compact pin state"""
+
+    @pytest.mark.unit
+    def test_from_c_and_mask(self):
+        """Test building from the C struct and the combined mask layout"""
+        from types import SimpleNamespace
+        from utils.pin_state import PinState
+
+        state = PinState.from_c(SimpleNamespace(inputs=0xfb, outputs=0xef))
+
+        assert state.mask == 0xeffb
+        assert PinState.from_mask(0xeffb) == state
+        assert hash(state) == hash(PinState(0xfb, 0xef))
+
+    @pytest.mark.unit
+    def test_named_views(self):
+        """Test that pins read low while on"""
+        from utils.pin_state import PinState
+
+        state = PinState(0xfb, 0xef)
+
+        assert state.is_on('GPI3') and state.is_on('GPO5')
+        assert not state.is_on('GPI1') and not state.is_on('GPO8')
+        assert state.triggered() == [3]
+        view = state.as_dict()
+        assert len(view) == 16
+        assert [name for name, on in view.items() if on] == ['GPI3', 'GPO5']
+
+    @pytest.mark.unit
+    def test_diff_and_changes(self):
+        """Test that changes holds only the pins that differ"""
+        from utils.pin_state import PinState
+
+        before = PinState()
+        after = before.with_pin('GPI2', True).with_pin('GPO1', True)
+
+        assert after.diff(before) == 0x0102
+        assert after.changes(before) == {'GPI2': True, 'GPO1': True}
+        assert before.changes(after) == {'GPI2': False, 'GPO1': False}
+        assert after.changes(after) == {}
+
+    @pytest.mark.unit
+    def test_dict_round_trip(self):
+        """Test loading the pin_state document, ignoring other keys"""
+        from utils.pin_state import PinState
+
+        doc = {'type': 'gpio_pin_state', 'GPO6': True, 'GPI8': True, 'GPI1': False}
+        state = PinState.from_dict(doc)
+
+        assert state == PinState(0x7f, 0xdf)
+        assert PinState.from_dict(state.as_dict()) == state
+
+    @pytest.mark.unit
+    def test_to_json(self):
+        """Test the read_all_gpio_states_as_json format"""
+        from utils.pin_state import PinState
+
+        assert PinState(0xfe, 0xff).to_json() == {'inputs': [0, 1, 1, 1, 1, 1, 1, 1], 'outputs': [1] * 8}
+        json.dumps(PinState().to_json())
+
+    @pytest.mark.unit
+    def test_unknown_pin(self):
+        """Test that bad pin names are rejected"""
+        from utils.pin_state import pin_bit
+
+        assert pin_bit('GPO8') == 15
+        for name in ('GPI0', 'GPI9', 'GPX1'):
+            with pytest.raises(ValueError):
+                pin_bit(name)
@@ -0,0 +1,127 @@
+"""
+Unit tests for gpio/pin_store.py
+"""
+import os
+import sys
+import time
+import pytest
+
+GPIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'gpio'))
+if GPIO_DIR not in sys.path:
+    sys.path.append(GPIO_DIR)
+
+from pin_store import PinStateStore
+from utils.pin_state import PinState
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def _set(name, on):
+    return lambda pins: pins.with_pin(name, on)
+
+
+@pytest.fixture
+def recorded():
+    return {'writes': [], 'emits': []}
+
+
+@pytest.fixture
+def store(recorded):
+    store = PinStateStore(PinState(), recorded['writes'].append, recorded['emits'].append,
+                          flush_interval=0.05, max_emit_rate=10)
+    store.start()
+    yield store
+    store.stop()
+
+
+class TestPinStateStore:
+    """Tests for the write-behind pin state store"""
+
+    @pytest.mark.unit
+    def test_update_does_not_block(self, store, recorded):
+        """Test that updates are visible at once and written later"""
+        store.update(_set('GPI1', True))
+
+        assert store.pins.is_on('GPI1')
+        assert recorded['writes'] == []
+        assert _wait_for(lambda: recorded['writes'] == [{'GPI1': True}])
+
+    @pytest.mark.unit
+    def test_burst_coalesced(self, store, recorded):
+        """Test that changes inside the window become one $set of the net change"""
+        assert _wait_for(lambda: recorded['emits'])
+        recorded['emits'].clear()
+
+        store.update(_set('GPI1', True))
+        store.update(_set('GPO5', True))
+        store.update(_set('GPI1', False))
+        store.update(_set('GPI2', True))
+
+        assert _wait_for(lambda: recorded['writes'])
+        time.sleep(0.1)
+        assert recorded['writes'] == [{'GPO5': True, 'GPI2': True}]
+        assert recorded['emits'] == [PinState().with_pin('GPO5', True).with_pin('GPI2', True)]
+
+    @pytest.mark.unit
+    def test_emit_rate_limited(self, recorded):
+        """Test that a stream of changes is emitted at most max_emit_rate times a second and ends on the last state"""
+        store = PinStateStore(PinState(), recorded['writes'].append, recorded['emits'].append,
+                              flush_interval=0.01, max_emit_rate=20)
+        store.start()
+        start = time.monotonic()
+        for i in range(100):
+            store.update(_set('GPI1', i % 2 == 0))
+            time.sleep(0.005)
+        elapsed = time.monotonic() - start
+        store.update(_set('GPO1', True))
+        time.sleep(0.15)
+        store.stop()
+
+        assert len(recorded['emits']) <= elapsed * 20 + 3
+        assert recorded['emits'][-1] == store.pins
+
+    @pytest.mark.unit
+    def test_deferred_update(self, store, recorded):
+        """Test that a delayed update is applied after its delay"""
+        store.update(_set('GPI3', True))
+        store.update(_set('GPI3', False), delay=0.2)
+
+        assert _wait_for(lambda: recorded['writes'] == [{'GPI3': True}])
+        assert store.pins.is_on('GPI3')
+        assert _wait_for(lambda: recorded['writes'] == [{'GPI3': True}, {'GPI3': False}])
+
+    @pytest.mark.unit
+    def test_failed_write_retried(self, recorded):
+        """Test that a failed write stays pending and is written on a later pass"""
+        attempts = []
+
+        def persist(changes):
+            attempts.append(changes)
+            if len(attempts) == 1:
+                raise RuntimeError('mongo down')
+
+        store = PinStateStore(PinState(), persist, flush_interval=0.01)
+        store.start()
+        store.update(_set('GPO2', True))
+
+        assert _wait_for(lambda: len(attempts) == 2)
+        store.stop()
+        assert attempts == [{'GPO2': True}, {'GPO2': True}]
+        assert store.stored == store.pins
+
+    @pytest.mark.unit
+    def test_stop_flushes(self, recorded):
+        """Test that stopping writes out changes still inside the window"""
+        store = PinStateStore(PinState(), recorded['writes'].append, flush_interval=10)
+        store.start()
+        store.update(_set('GPO8', True))
+
+        store.stop()
+
+        assert recorded['writes'] == [{'GPO8': True}]
+        assert not store.thread.is_alive()
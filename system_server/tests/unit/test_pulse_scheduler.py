@@ -0,0 +1,142 @@
+"""
+Unit tests for tcp/pulse_scheduler.py
+"""
+import os
+import sys
+import threading
+import time
+import pytest
+
+TCP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'tcp'))
+if TCP_DIR not in sys.path:
+    sys.path.insert(0, TCP_DIR)
+
+
+class FakePins(object):
+    """Records pin writes and persisted changes"""
+    def __init__(self):
+        self.writes    = []
+        self.persisted = []
+        self.persisting = threading.Event()
+        self.persisting.set()
+
+    def set_pin(self, pin, on):
+        self.writes.append((pin, on))
+
+    def persist(self, changes):
+        self.persisting.wait(5)
+        self.persisted.append(changes)
+
+
+@pytest.fixture
+def pins():
+    return FakePins()
+
+
+def _scheduler(pins, width=0.05):
+    from pulse_scheduler import PulseScheduler
+    return PulseScheduler(pins.set_pin, pins.persist, width=width)
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestPulseScheduler:
+    """Tests for the pass/fail pin pulse scheduler"""
+
+    @pytest.mark.unit
+    def test_pulse_does_not_block(self, pins):
+        """Test that pulse returns with the pin on and the timer switches it off"""
+        scheduler = _scheduler(pins, width=0.2)
+        start = time.monotonic()
+
+        scheduler.pulse(5)
+
+        assert time.monotonic() - start < 0.05
+        assert pins.writes == [(5, True)]
+        assert _wait_for(lambda: pins.writes == [(5, True), (5, False)])
+        assert time.monotonic() - start >= 0.2
+        scheduler.stop()
+
+    @pytest.mark.unit
+    def test_overlapping_pulse_extends(self, pins):
+        """Test that a second pulse on a pin still on extends it instead of being cut short"""
+        scheduler = _scheduler(pins, width=0.15)
+
+        scheduler.pulse(5)
+        time.sleep(0.1)
+        scheduler.pulse(5)
+        time.sleep(0.1)
+
+        assert scheduler.active() == {5}
+        assert pins.writes == [(5, True)]
+        assert _wait_for(lambda: not scheduler.active())
+        assert pins.writes == [(5, True), (5, False)]
+        scheduler.stop()
+
+    @pytest.mark.unit
+    def test_pins_independent(self, pins):
+        """Test that a pass pulse ending does not switch off a fail pulse"""
+        scheduler = _scheduler(pins)
+
+        scheduler.pulse(5, 0.05)
+        scheduler.pulse(6, 0.3)
+
+        assert _wait_for(lambda: (5, False) in pins.writes)
+        assert scheduler.active() == {6}
+        scheduler.stop()
+
+    @pytest.mark.unit
+    def test_persist_off_the_pulse_path(self, pins):
+        """Test that a slow write neither delays pulses nor loses state, and changes are coalesced"""
+        pins.persisting.clear()
+        scheduler = _scheduler(pins, width=0.02)
+
+        scheduler.pulse(5)
+        scheduler.pulse(6)
+        assert _wait_for(lambda: (5, False) in pins.writes and (6, False) in pins.writes)
+        pins.persisting.set()
+
+        assert _wait_for(lambda: pins.persisted and pins.persisted[-1].get(6) is False)
+        merged = {}
+        for changes in pins.persisted:
+            merged.update(changes)
+        assert merged == {5: False, 6: False}
+        assert len(pins.persisted) <= 2
+        scheduler.stop()
+
+    @pytest.mark.unit
+    def test_stop_switches_off(self, pins):
+        """Test that stopping switches off pins still pulsing and flushes their state"""
+        scheduler = _scheduler(pins, width=10)
+
+        scheduler.pulse(6)
+        scheduler.stop()
+
+        assert pins.writes == [(6, True), (6, False)]
+        assert pins.persisted[-1] == {6: False}
+        assert not any(thread.is_alive() for thread in scheduler.threads)
+
+    @pytest.mark.unit
+    def test_persist_error(self, pins):
+        """Test that a failed write is reported and later changes are still written"""
+        calls = []
+
+        def persist(changes):
+            calls.append(changes)
+            if len(calls) == 1:
+                raise RuntimeError('mongo down')
+
+        from pulse_scheduler import PulseScheduler
+        scheduler = PulseScheduler(pins.set_pin, persist, width=0.01)
+
+        scheduler.pulse(5)
+        assert _wait_for(lambda: len(calls) >= 1)
+        scheduler.pulse(6)
+        scheduler.stop()
+
+        assert calls[-1].get(6) is False
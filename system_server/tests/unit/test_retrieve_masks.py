@@ -11,7 +11,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_basic(self, mock_get, mock_masks_collection):
         """Test basic mask retrieval"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -40,7 +40,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_correct_url(self, mock_get, mock_masks_collection):
         """Test that correct URL is constructed"""
         from worker_scripts.retrieve_masks import retrieve_masks, CLOUD_DOMAIN
@@ -65,7 +65,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_with_auth_headers(self, mock_get, mock_masks_collection):
         """Test that authorization headers are included"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -91,7 +91,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_with_timeout(self, mock_get, mock_masks_collection):
         """Test that request includes timeout"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -114,7 +114,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_generates_mask_id(self, mock_get, mock_masks_collection):
         """Test that maskId is generated when not present"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -143,7 +143,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_preserves_existing_mask_id(self, mock_get, mock_masks_collection):
         """Test that existing maskId is preserved"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -170,7 +170,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_updates_by_mask_name(self, mock_get, mock_masks_collection):
         """Test that masks are updated/upserted by maskName"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -201,7 +201,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_empty_response(self, mock_get, mock_masks_collection):
         """Test handling of empty mask response"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -223,7 +223,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_none_response(self, mock_get, mock_masks_collection):
         """Test handling of None response"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -245,7 +245,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_multiple_projects(self, mock_get, mock_masks_collection):
         """Test retrieving masks for multiple projects"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -273,7 +273,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_non_dict_items(self, mock_get, mock_masks_collection):
         """Test that non-dict items in response are skipped"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -301,7 +301,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_preserves_all_fields(self, mock_get, mock_masks_collection):
         """Test that all mask fields are preserved"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -342,7 +342,7 @@ class TestRetrieveMasks:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_masks_request_exception(self, mock_get, mock_masks_collection):
         """Test handling of request exceptions"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -375,7 +375,7 @@ class TestMaskIdGeneration:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     @patch('uuid.uuid4')
     def test_mask_id_generation_uses_uuid(self, mock_uuid, mock_get, mock_masks_collection):
         """Test that mask ID generation uses uuid4"""
@@ -401,7 +401,7 @@ class TestMaskIdGeneration:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_mask_id_unique_per_mask(self, mock_get, mock_masks_collection):
         """Test that each mask without ID gets a unique ID"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -437,7 +437,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_mask_name_used_as_key(self, mock_get, mock_masks_collection):
         """Test that maskName is consistently used as the query key"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -463,7 +463,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_upsert_flag_is_true(self, mock_get, mock_masks_collection):
         """Test that upsert flag is set to True"""
         from worker_scripts.retrieve_masks import retrieve_masks
@@ -488,7 +488,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_masks.masks_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_mask_data_not_modified(self, mock_get, mock_masks_collection):
         """Test that mask data is not modified during processing"""
         from worker_scripts.retrieve_masks import retrieve_masks
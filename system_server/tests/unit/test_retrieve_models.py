@@ -7,6 +7,41 @@ import zipfile
 import string
 from unittest.mock import Mock, patch, MagicMock, mock_open, call
 from io import BytesIO
+from pymongo import UpdateOne, DeleteOne
+
+
+@pytest.fixture(autouse=True)
+def mock_store():
+    """An empty model store, and no archives or serving directories touched on disk"""
+    store = MagicMock()
+    store.key.side_effect = lambda project_id, version: str(project_id) + '/' + str(version)
+    added = set()
+    store.add.side_effect = lambda project_id, version, archive, flatten=True: added.add((project_id, version))
+    store.link.side_effect = lambda project_id, version, target: (project_id, version) in added
+    store.evict.return_value = []
+    with patch('worker_scripts.retrieve_models.model_store', return_value=store), patch('os.remove'):
+        yield store
+
+
+@pytest.fixture(autouse=True)
+def mock_fetch():
+    """Keep model downloads off the network and the disk"""
+    with patch('worker_scripts.retrieve_models.fetch') as fetch:
+        yield fetch
+
+
+@pytest.fixture(autouse=True)
+def mock_clear():
+    """Keep retrieve_models from emptying the real serving directory"""
+    with patch('worker_scripts.retrieve_models.clear_serving_dir') as clear:
+        yield clear
+
+
+@pytest.fixture(autouse=True)
+def mock_deploy():
+    """Keep retrieve_models from running docker against the prediction containers"""
+    with patch('worker_scripts.retrieve_models.deploy_models') as deploy:
+        yield deploy
 
 
 class TestBasePath:
@@ -84,49 +119,37 @@ class TestDownloadByLink:
     """Tests for download_by_link function"""
 
     @pytest.mark.unit
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('requests.get')
-    def test_download_by_link_success(self, mock_get, mock_file):
+    @patch('requests.Session.get')
+    def test_download_by_link_success(self, mock_get, mock_fetch):
         """Test successful download by link"""
         from worker_scripts.retrieve_models import download_by_link
 
         # Mock the signed link response
         mock_link_response = MagicMock()
         mock_link_response.json.return_value = 'https://signed-url.com/model.zip'
-
-        # Mock the download response
-        mock_download_response = MagicMock()
-        mock_download_response.headers = {'Content-length': '1024'}
-        mock_download_response.iter_content.return_value = [b'chunk1', b'chunk2']
-        mock_download_response.__enter__ = Mock(return_value=mock_download_response)
-        mock_download_response.__exit__ = Mock(return_value=False)
-
-        mock_get.side_effect = [mock_link_response, mock_download_response]
+        mock_get.return_value = mock_link_response
 
         download_by_link('test_token', 'project123', 'v1', '/tmp/model.zip')
 
-        assert mock_get.call_count == 2
+        assert mock_get.call_count == 1
         # Verify headers include authorization
         first_call_kwargs = mock_get.call_args_list[0][1]
         assert 'headers' in first_call_kwargs
         assert 'Authorization' in first_call_kwargs['headers']
+        # The signed link is fetched without the cloud token
+        url, destination = mock_fetch.call_args[0]
+        assert (url, destination) == ('https://signed-url.com/model.zip', '/tmp/model.zip')
+        assert 'headers' not in mock_fetch.call_args[1]
 
     @pytest.mark.unit
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_download_by_link_with_correct_url(self, mock_get):
         """Test that download_by_link constructs correct URL"""
         from worker_scripts.retrieve_models import download_by_link, CLOUD_DOMAIN
 
         mock_link_response = MagicMock()
         mock_link_response.json.return_value = 'https://signed-url.com/model.zip'
-
-        mock_download_response = MagicMock()
-        mock_download_response.headers = {'Content-length': '1024'}
-        mock_download_response.iter_content.return_value = []
-        mock_download_response.__enter__ = Mock(return_value=mock_download_response)
-        mock_download_response.__exit__ = Mock(return_value=False)
-
-        mock_get.side_effect = [mock_link_response, mock_download_response]
+        mock_get.return_value = mock_link_response
 
         download_by_link('test_token', 'proj456', 'v2', '/tmp/model.zip')
 
@@ -211,7 +234,7 @@ class TestRetrieveModels:
     @patch('os.path.exists')
     @patch('worker_scripts.retrieve_models.save_models_versions')
     @patch('worker_scripts.retrieve_models.create_config_file')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_models_high_accuracy(self, mock_get, mock_create_config,
                                             mock_save_versions, mock_exists, mock_os_system, mock_file):
         """Test retrieving high accuracy models"""
@@ -253,7 +276,8 @@ class TestRetrieveModels:
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.retrieve_models.save_models_versions')
-    def test_retrieve_models_high_speed(self, mock_save_versions, mock_exists, mock_os_system, mock_file):
+    def test_retrieve_models_high_speed(self, mock_save_versions, mock_exists, mock_os_system, mock_file,
+                                        mock_deploy):
         """Test retrieving high speed (lite) models"""
         from worker_scripts.retrieve_models import retrieve_models
 
@@ -272,7 +296,7 @@ class TestRetrieveModels:
             'model_type': 'high_speed'
         }
 
-        with patch('requests.get') as mock_get, \
+        with patch('requests.Session.get') as mock_get, \
              patch('zipfile.ZipFile') as mock_zipfile:
 
             mock_response = MagicMock()
@@ -283,10 +307,10 @@ class TestRetrieveModels:
 
             result = retrieve_models(data, 'token123')
 
-            # Should use predictlite docker container
-            docker_calls = [str(call) for call in mock_os_system.call_args_list
-                           if 'docker' in str(call)]
-            assert any('predictlite' in call for call in docker_calls)
+            # Should deploy into the predictlite docker container
+            deployer = mock_deploy.call_args[0][0]
+            assert deployer.container == 'predictlite'
+            assert deployer.container_root == '/data/lite_models'
 
     @pytest.mark.unit
     @patch('builtins.open', new_callable=mock_open)
@@ -295,7 +319,7 @@ class TestRetrieveModels:
     @patch('worker_scripts.retrieve_models.save_models_versions')
     @patch('worker_scripts.retrieve_models.download_by_link')
     def test_retrieve_models_ocr(self, mock_download, mock_save_versions,
-                                  mock_exists, mock_os_system, mock_file):
+                                  mock_exists, mock_os_system, mock_file, mock_store):
         """Test retrieving OCR models"""
         from worker_scripts.retrieve_models import retrieve_models
 
@@ -322,11 +346,46 @@ class TestRetrieveModels:
 
             # Should use download_by_link for OCR
             mock_download.assert_called()
+            # Should keep the archive's layout, at the model folder's root
+            mock_store.add.assert_called_once_with('proj1', 'v1', '/tmp/OCR_Model/.v1.model.zip', flatten=False)
+            mock_store.link.assert_called_with('proj1', 'v1', '/tmp/OCR_Model')
             # Should use ocr docker container
             docker_calls = [str(call) for call in mock_os_system.call_args_list
                            if 'docker' in str(call)]
             assert any('ocr' in call for call in docker_calls)
 
+    @pytest.mark.unit
+    @patch('os.system')
+    @patch('os.path.exists')
+    @patch('worker_scripts.retrieve_models.save_models_versions')
+    @patch('worker_scripts.retrieve_models.download_by_link')
+    def test_retrieve_models_ocr_from_store(self, mock_download, mock_save_versions,
+                                            mock_exists, mock_os_system, mock_store):
+        """Test that re-syncing an OCR version already in the store still pushes it to the ocr container"""
+        from worker_scripts.retrieve_models import retrieve_models
+
+        mock_exists.return_value = False
+        mock_store.link.side_effect = lambda *args: True
+
+        data = {
+            'models': {
+                'model1': {
+                    '_id': 'proj1',
+                    'name': 'OCR Model',
+                    'models': ['v1']
+                }
+            },
+            'exclude_models': {},
+            'model_type': 'ocr'
+        }
+
+        assert retrieve_models(data, 'token123') is True
+
+        mock_download.assert_not_called()
+        commands = [call[0][0] for call in mock_os_system.call_args_list]
+        assert 'mv /tmp/OCR_Model /tmp/ocrmodel' in commands
+        assert 'docker cp /tmp/ocrmodel ocr:/documentocr' in commands
+
     @pytest.mark.unit
     @patch('builtins.open', new_callable=mock_open)
     @patch('os.system')
@@ -361,7 +420,7 @@ class TestRetrieveModels:
     @patch('builtins.open', new_callable=mock_open)
     @patch('os.system')
     @patch('os.path.exists')
-    def test_retrieve_models_removes_existing(self, mock_exists, mock_os_system, mock_file):
+    def test_retrieve_models_removes_existing(self, mock_exists, mock_os_system, mock_file, mock_clear):
         """Test that existing models are removed when exclude_models is empty"""
         from worker_scripts.retrieve_models import retrieve_models
 
@@ -378,16 +437,14 @@ class TestRetrieveModels:
             'exclude_models': {}
         }
 
-        with patch('requests.get'), \
+        with patch('requests.Session.get'), \
              patch('zipfile.ZipFile'), \
              patch('worker_scripts.retrieve_models.save_models_versions'):
 
             retrieve_models(data, 'token123')
 
-            # Should remove existing models directory
-            rm_calls = [str(call) for call in mock_os_system.call_args_list
-                       if 'rm -rf' in str(call)]
-            assert len(rm_calls) > 0
+            # Should empty the existing models directory
+            mock_clear.assert_called_once_with('/xavier_ssd/models/')
 
 
 class TestSaveModelsVersions:
@@ -411,8 +468,15 @@ class TestSaveModelsVersions:
 
         save_models_versions(models_versions, 'versions')
 
-        # Should update both models
-        assert mock_models_collection.update_one.call_count >= 2
+        # Should update both models in one ordered bulk write
+        mock_models_collection.bulk_write.assert_called_once()
+        ops, = mock_models_collection.bulk_write.call_args[0]
+        assert mock_models_collection.bulk_write.call_args[1] == {'ordered': True}
+        assert ops == [
+            UpdateOne({'type': 'model1'}, {'$set': {'versions': ['v1', 'v2']}}, upsert=True),
+            UpdateOne({'type': 'model2'}, {'$set': {'versions': ['v1']}}, upsert=True),
+        ]
+        mock_models_collection.update_one.assert_not_called()
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_models.presets_collection')
@@ -433,9 +497,12 @@ class TestSaveModelsVersions:
 
         save_models_versions(models_versions, 'versions')
 
-        # Should clear and then set new versions
-        update_calls = mock_models_collection.update_one.call_args_list
-        assert len(update_calls) >= 2  # At least clear + update
+        # Should clear and then set new versions, in that order
+        ops, = mock_models_collection.bulk_write.call_args[0]
+        assert ops == [
+            UpdateOne({'type': 'model1'}, {'$set': {'versions': []}}, upsert=True),
+            UpdateOne({'type': 'model1'}, {'$set': {'versions': ['new_v1', 'new_v2']}}, upsert=True),
+        ]
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_models.presets_collection')
@@ -457,7 +524,26 @@ class TestSaveModelsVersions:
         save_models_versions(models_versions, 'versions')
 
         # Should delete the old_model since it has no versions
-        mock_models_collection.delete_one.assert_called()
+        ops, = mock_models_collection.bulk_write.call_args[0]
+        assert DeleteOne({'type': 'old_model'}) in ops
+        mock_models_collection.delete_one.assert_not_called()
+
+    @pytest.mark.unit
+    @patch('worker_scripts.retrieve_models.presets_collection')
+    @patch('worker_scripts.retrieve_models.models_collection')
+    def test_presets_after_versions(self, mock_models_collection, mock_presets_collection):
+        """Test that presets are moved only after the versions are written"""
+        from worker_scripts.retrieve_models import save_models_versions
+
+        calls = MagicMock()
+        mock_models_collection.find.return_value = []
+        mock_models_collection.bulk_write.side_effect = lambda *a, **k: calls('bulk_write')
+        mock_presets_collection.update_many.side_effect = lambda *a, **k: calls('update_many')
+
+        save_models_versions([{'type': 'model1', 'versions': ['v1']},
+                              {'type': 'model2', 'versions': ['v2']}], 'versions')
+
+        assert [c[0][0] for c in calls.call_args_list] == ['bulk_write', 'update_many', 'update_many']
 
 
 class TestAssignPresetToLatestVersion:
@@ -476,15 +562,16 @@ class TestAssignPresetToLatestVersion:
         versions = ['v1', 'v3', 'v2']  # Unsorted
         assign_preset_to_latest_version('test_model', versions, 'versions')
 
-        # Should update preset to use v3 (latest after sorting)
-        mock_presets_collection.update.assert_called()
-        update_call = mock_presets_collection.update.call_args
-        assert 'v3' in str(update_call)
+        # Should update presets to use v3 (latest after sorting)
+        mock_presets_collection.update_many.assert_called_once_with(
+            {'modelName': 'test_model', 'modelType': 'high_accuracy'},
+            {'$set': {'modelVersion': 'v3'}})
+        mock_presets_collection.update.assert_not_called()
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_models.presets_collection')
     def test_assign_preset_multiple_presets(self, mock_presets_collection):
-        """Test assigning multiple presets to latest version"""
+        """Test that all of a model's presets are updated in one update_many"""
         from worker_scripts.retrieve_models import assign_preset_to_latest_version
 
         mock_presets_collection.find.return_value = [
@@ -495,8 +582,9 @@ class TestAssignPresetToLatestVersion:
         versions = ['v1', 'v2']
         assign_preset_to_latest_version('test_model', versions, 'versions')
 
-        # Should update all presets
-        assert mock_presets_collection.update.call_count == 2
+        # Should update all presets with a single query
+        assert mock_presets_collection.update_many.call_count == 1
+        mock_presets_collection.find.assert_not_called()
 
 
 class TestModelTypeMapping:
@@ -535,7 +623,7 @@ class TestModelTypeMapping:
             # No model_type specified
         }
 
-        with patch('requests.get'), \
+        with patch('requests.Session.get'), \
              patch('zipfile.ZipFile') as mock_zipfile:
 
             mock_zip = MagicMock()
@@ -556,10 +644,10 @@ class TestZipFileExtraction:
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.retrieve_models.save_models_versions')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_zip_extraction_moves_files(self, mock_get, mock_save_versions,
-                                         mock_exists, mock_os_system, mock_file):
-        """Test that files are moved after zip extraction"""
+                                         mock_exists, mock_os_system, mock_file, mock_store):
+        """Test that each version's archive goes into the store and is linked to its version folder"""
         from worker_scripts.retrieve_models import retrieve_models
 
         mock_exists.side_effect = lambda path: 'model.zip' in path or '/models' in path
@@ -581,17 +669,49 @@ class TestZipFileExtraction:
 
             retrieve_models(data, 'token123')
 
-            # Check for mv commands to move job.json and pbtxt
-            mv_calls = [str(call) for call in mock_os_system.call_args_list
-                       if 'mv' in str(call)]
-            assert any('job.json' in call for call in mv_calls)
-            assert any('object-detection.pbtxt' in call for call in mv_calls)
+            mock_store.add.assert_called_once_with('proj1', 'v1', '/models/Test_Model/.v1.model.zip', flatten=True)
+            mock_store.link.assert_called_with('proj1', 'v1', '/models/Test_Model/v1')
+            assert not any('mv ' in str(call) for call in mock_os_system.call_args_list)
 
     @pytest.mark.unit
+    @patch('builtins.open', new_callable=mock_open)
     @patch('os.system')
     @patch('os.path.exists')
     @patch('worker_scripts.retrieve_models.save_models_versions')
-    def test_bad_zipfile_handling(self, mock_save_versions, mock_exists, mock_os_system):
+    @patch('requests.Session.get')
+    def test_cached_version_not_downloaded(self, mock_get, mock_save_versions,
+                                           mock_exists, mock_os_system, mock_file, mock_store):
+        """Test that a version already in the model store is linked instead of downloaded"""
+        from worker_scripts.retrieve_models import retrieve_models
+
+        mock_exists.return_value = False
+        mock_store.link.side_effect = lambda *args: True
+
+        data = {
+            'models': {
+                'model1': {
+                    '_id': 'proj1',
+                    'name': 'Test Model',
+                    'models': ['v1', 'v2']
+                }
+            },
+            'exclude_models': {}
+        }
+
+        assert retrieve_models(data, 'token123') is True
+
+        mock_get.assert_not_called()
+        mock_store.add.assert_not_called()
+        mock_store.evict.assert_called_once_with(keep={'proj1/v1', 'proj1/v2'})
+        saved = list(mock_save_versions.call_args[0][0])
+        assert saved[0]['versions'] == ['v1', 'v2']
+
+    @pytest.mark.unit
+    @patch('builtins.open', new_callable=mock_open)
+    @patch('os.system')
+    @patch('os.path.exists')
+    @patch('worker_scripts.retrieve_models.save_models_versions')
+    def test_bad_zipfile_handling(self, mock_save_versions, mock_exists, mock_os_system, mock_file, mock_store):
         """Test handling of bad zip files"""
         from worker_scripts.retrieve_models import retrieve_models
 
@@ -608,16 +728,94 @@ class TestZipFileExtraction:
             'exclude_models': {}
         }
 
-        with patch('requests.get'), \
-             patch('zipfile.ZipFile') as mock_zipfile:
-
-            # Simulate bad zipfile
-            mock_zipfile.side_effect = zipfile.BadZipfile('Bad zip')
+        # Simulate bad zipfile
+        mock_store.add.side_effect = zipfile.BadZipfile('Bad zip')
 
+        with patch('requests.Session.get'):
             result = retrieve_models(data, 'token123')
 
-            # Should still complete but skip the bad file
-            # The function continues despite bad zipfile
+        # Should still complete but skip the bad version
+        assert result is False
+        mock_save_versions.assert_not_called()
+
+
+class TestParallelDownloads:
+    """Tests for downloading several versions at once"""
+
+    @pytest.mark.unit
+    @patch('os.system')
+    @patch('os.path.exists')
+    @patch('worker_scripts.retrieve_models.save_models_versions')
+    def test_failed_download_skips_only_that_version(self, mock_save_versions, mock_exists,
+                                                     mock_os_system, mock_fetch, mock_store):
+        """Test that one version failing to download does not stop the others"""
+        from worker_scripts.retrieve_models import retrieve_models
+        from worker_scripts.model_downloads import DownloadError
+
+        mock_exists.side_effect = lambda path: 'model.zip' in path
+        def fetch(url, destination, *args):
+            if url.endswith('/v1'):
+                raise DownloadError('checksum mismatch')
+            return destination
+
+        mock_fetch.side_effect = fetch
+
+        data = {
+            'models': {
+                'model1': {'_id': 'proj1', 'name': 'Test Model', 'models': ['v1', 'v2', 'v3']}
+            },
+            'exclude_models': {}
+        }
+
+        assert retrieve_models(data, 'token123') is True
+
+        assert sorted(call[0][1] for call in mock_fetch.call_args_list) == [
+            '/models/Test_Model/.v1.model.zip', '/models/Test_Model/.v2.model.zip', '/models/Test_Model/.v3.model.zip',
+        ]
+        saved = list(mock_save_versions.call_args[0][0])
+        assert saved[0]['versions'] == ['v2', 'v3']
+
+    @pytest.mark.unit
+    @patch('os.system')
+    @patch('os.path.exists')
+    @patch('worker_scripts.retrieve_models.save_models_versions')
+    def test_downloads_bounded_and_reported_once(self, mock_save_versions, mock_exists,
+                                                 mock_os_system, mock_fetch, mock_store):
+        """Test that at most DOWNLOAD_WORKERS downloads run at once, reporting through one stream"""
+        import threading
+        import time
+        from worker_scripts import retrieve_models
+
+        mock_exists.side_effect = lambda path: 'model.zip' in path
+        lock, active, peak = threading.Lock(), [0], [0]
+
+        def fetch(url, destination, headers, progress):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            progress.begin(100)
+            time.sleep(0.02)
+            progress.advance(100)
+            progress.finish()
+            with lock:
+                active[0] -= 1
+
+        mock_fetch.side_effect = fetch
+        data = {
+            'models': {
+                'model1': {'_id': 'proj1', 'name': 'Test Model', 'models': ['v%d' % n for n in range(6)]}
+            },
+            'exclude_models': {}
+        }
+
+        with patch.object(retrieve_models, 'DOWNLOAD_WORKERS', 2), \
+             patch.object(retrieve_models, 'update_job_progress') as update:
+            assert retrieve_models.retrieve_models(data, 'token123') is True
+
+        assert peak[0] == 2
+        percents = [call[0][0] for call in update.call_args_list]
+        assert percents == sorted(percents)
+        assert percents[-1] == 100
 
 
 class TestDockerIntegration:
@@ -629,7 +827,7 @@ class TestDockerIntegration:
     @patch('os.path.exists')
     @patch('worker_scripts.retrieve_models.save_models_versions')
     def test_docker_commands_for_high_accuracy(self, mock_save_versions, mock_exists,
-                                                 mock_os_system, mock_file):
+                                                 mock_os_system, mock_file, mock_deploy):
         """Test correct Docker commands for high accuracy models"""
         from worker_scripts.retrieve_models import retrieve_models
 
@@ -647,7 +845,7 @@ class TestDockerIntegration:
             'exclude_models': {}
         }
 
-        with patch('requests.get'), \
+        with patch('requests.Session.get'), \
              patch('zipfile.ZipFile') as mock_zipfile:
 
             mock_zip = MagicMock()
@@ -655,11 +853,9 @@ class TestDockerIntegration:
 
             retrieve_models(data, 'token123')
 
-            docker_calls = [str(call) for call in mock_os_system.call_args_list
-                           if 'docker' in str(call)]
-
-            # Should exec rm, cp, and restart localprediction
-            assert any('localprediction' in call for call in docker_calls)
-            assert any('docker exec' in call for call in docker_calls)
-            assert any('docker cp' in call for call in docker_calls)
-            assert any('docker restart' in call for call in docker_calls)
+            # Should deploy into localprediction, which polls model.config itself
+            deployer = mock_deploy.call_args[0][0]
+            assert deployer.container == 'localprediction'
+            assert deployer.container_root == '/models'
+            assert deployer.config_name == 'model.config'
+            assert not any('docker' in str(call) for call in mock_os_system.call_args_list)
@@ -102,7 +102,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_basic(self, mock_get, mock_programs_collection):
         """Test basic program retrieval"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -133,7 +133,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_correct_url(self, mock_get, mock_programs_collection):
         """Test that correct URL is constructed"""
         from worker_scripts.retrieve_programs import retrieve_programs, CLOUD_DOMAIN
@@ -158,7 +158,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_with_auth_headers(self, mock_get, mock_programs_collection):
         """Test that authorization headers are included"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -184,7 +184,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_with_timeout(self, mock_get, mock_programs_collection):
         """Test that request includes timeout"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -207,7 +207,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_formats_model_name(self, mock_get, mock_programs_collection):
         """Test that model name is formatted"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -235,7 +235,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_updates_by_id(self, mock_get, mock_programs_collection):
         """Test that programs are updated/upserted by id"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -268,7 +268,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_empty_records(self, mock_get, mock_programs_collection):
         """Test handling of empty records"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -290,7 +290,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_no_records_key(self, mock_get, mock_programs_collection):
         """Test handling when records key is missing"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -313,7 +313,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_multiple_projects(self, mock_get, mock_programs_collection):
         """Test retrieving programs for multiple projects"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -343,7 +343,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_preserves_all_fields(self, mock_get, mock_programs_collection):
         """Test that all program fields are preserved"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -386,7 +386,7 @@ class TestRetrievePrograms:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_request_exception(self, mock_get, mock_programs_collection):
         """Test handling of request exceptions"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -419,7 +419,7 @@ class TestPaginationAndFiltering:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_pagination_params(self, mock_get, mock_programs_collection):
         """Test that correct pagination parameters are used"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -442,7 +442,7 @@ class TestPaginationAndFiltering:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_retrieve_programs_use_latest_flag(self, mock_get, mock_programs_collection):
         """Test that use_latest=true flag is included"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -469,7 +469,7 @@ class TestModelNameFormatting:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_model_name_special_chars_removed(self, mock_get, mock_programs_collection):
         """Test that special characters are removed from model names"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -499,7 +499,7 @@ class TestModelNameFormatting:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_model_name_spaces_to_underscores(self, mock_get, mock_programs_collection):
         """Test that spaces in model names are converted to underscores"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -528,7 +528,7 @@ class TestModelNameFormatting:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_multiple_programs_each_formatted(self, mock_get, mock_programs_collection):
         """Test that each program's model name is formatted"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -567,7 +567,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_program_id_used_as_key(self, mock_get, mock_programs_collection):
         """Test that program id is consistently used as the query key"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -595,7 +595,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_upsert_flag_is_true(self, mock_get, mock_programs_collection):
         """Test that upsert flag is set to True"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -622,7 +622,7 @@ class TestDataIntegrity:
 
     @pytest.mark.unit
     @patch('worker_scripts.retrieve_programs.programs_collection')
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_program_data_preserved_except_model(self, mock_get, mock_programs_collection):
         """Test that program data is preserved, only model name is formatted"""
         from worker_scripts.retrieve_programs import retrieve_programs
@@ -0,0 +1,171 @@
+"""
+Unit tests for worker_scripts/sync_breaker.py
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+@pytest.fixture
+def breaker(fake_redis_with_data):
+    from worker_scripts.sync_breaker import SyncBreaker
+    return SyncBreaker(fake_redis_with_data, failure_threshold=3, open_seconds=10,
+                       max_open_seconds=40, recovery_successes=2, drain_rate=1)
+
+
+def _open(breaker):
+    for _ in range(3):
+        breaker.record_result(False)
+
+
+class TestBreakerTransitions:
+    """Tests for opening and closing the breaker"""
+
+    @pytest.mark.unit
+    def test_starts_closed(self, breaker):
+        """Test that a fresh breaker allows claims without probing"""
+        probe = MagicMock()
+
+        assert breaker.state() == 'closed'
+        assert breaker.allow_claim(probe) is True
+        probe.assert_not_called()
+
+    @pytest.mark.unit
+    def test_opens_after_threshold(self, breaker):
+        """Test that consecutive failures open the breaker"""
+        breaker.record_result(False)
+        breaker.record_result(False)
+        assert breaker.state() == 'closed'
+
+        breaker.record_result(False)
+        assert breaker.state() == 'open'
+
+    @pytest.mark.unit
+    def test_success_resets_failures(self, breaker):
+        """Test that a success between failures keeps the breaker closed"""
+        breaker.record_result(False)
+        breaker.record_result(False)
+        breaker.record_result(True)
+        breaker.record_result(False)
+
+        assert breaker.state() == 'closed'
+
+    @pytest.mark.unit
+    def test_no_probe_inside_open_window(self, breaker):
+        """Test that claims are refused without probing until the window ends"""
+        _open(breaker)
+        probe = MagicMock(return_value=True)
+
+        assert breaker.allow_claim(probe) is False
+        probe.assert_not_called()
+
+    @pytest.mark.unit
+    def test_failed_probe_backs_off(self, breaker):
+        """Test that a failed probe doubles the open window up to the max"""
+        _open(breaker)
+
+        with patch('worker_scripts.sync_breaker.time.time') as mock_time:
+            mock_time.return_value = 10 ** 10
+            assert breaker.allow_claim(MagicMock(return_value=False)) is False
+            assert breaker.stats()['open_seconds'] == '20.0'
+            mock_time.return_value += 100
+            breaker.allow_claim(MagicMock(side_effect=Exception('timeout')))
+            mock_time.return_value += 100
+            breaker.allow_claim(MagicMock(return_value=False))
+
+        assert breaker.stats()['open_seconds'] == '40.0'
+        assert breaker.state() == 'open'
+
+    @pytest.mark.unit
+    def test_recovery_drains_then_closes(self, breaker):
+        """Test that a good probe drains at the reduced rate until enough successes"""
+        _open(breaker)
+
+        with patch('worker_scripts.sync_breaker.time.time', return_value=10 ** 10):
+            assert breaker.allow_claim(MagicMock(return_value=True)) is True
+
+        assert breaker.state() == 'half_open'
+        assert breaker.rate_limit(5) == 1
+        assert breaker.rate_limit(0) == 1
+
+        breaker.record_result(True)
+        assert breaker.state() == 'half_open'
+        breaker.record_result(True)
+        assert breaker.state() == 'closed'
+        assert breaker.rate_limit(5) == 5
+
+    @pytest.mark.unit
+    def test_failure_while_draining_reopens(self, breaker):
+        """Test that a failed upload during the drain opens the breaker again"""
+        _open(breaker)
+        with patch('worker_scripts.sync_breaker.time.time', return_value=10 ** 10):
+            breaker.allow_claim(MagicMock(return_value=True))
+
+        breaker.record_result(False)
+
+        assert breaker.state() == 'open'
+        assert breaker.stats()['open_seconds'] == '20.0'
+
+    @pytest.mark.unit
+    def test_redis_down_fails_open(self):
+        """Test that redis errors never stop syncing"""
+        from worker_scripts.sync_breaker import SyncBreaker
+
+        redis_con = MagicMock()
+        redis_con.hgetall.side_effect = Exception('redis down')
+        redis_con.hset.side_effect = Exception('redis down')
+        redis_con.hincrby.side_effect = Exception('redis down')
+        breaker = SyncBreaker(redis_con)
+
+        breaker.record_result(False)
+        assert breaker.allow_claim(MagicMock()) is True
+
+
+class TestBacklogMetrics:
+    """Tests for backlog size and time-to-drain"""
+
+    @pytest.mark.unit
+    def test_backlog_recorded(self, breaker):
+        """Test that the spool size is stored"""
+        breaker.update_backlog(250)
+
+        assert breaker.stats()['backlog'] == '250'
+
+    @pytest.mark.unit
+    def test_drain_eta_and_duration(self, breaker):
+        """Test that the drain ETA follows the observed drain rate and the total is recorded"""
+        breaker.update_backlog(1000)
+        _open(breaker)
+
+        with patch('worker_scripts.sync_breaker.time.time') as mock_time:
+            mock_time.return_value = 10 ** 10
+            breaker.allow_claim(MagicMock(return_value=True))
+
+            mock_time.return_value = 10 ** 10 + 60
+            breaker.update_backlog(400)
+            assert breaker.stats()['drain_eta_seconds'] == '40.0'
+
+            mock_time.return_value = 10 ** 10 + 100
+            breaker.update_backlog(0)
+
+        stats = breaker.stats()
+        assert stats['last_drain_seconds'] == '100.0'
+        assert stats['drain_started'] == '0'
+
+    @pytest.mark.unit
+    def test_tracks_backlog_until_drained(self, breaker):
+        """Test that the backlog stays tracked after recovery until the drain finishes"""
+        assert breaker.tracks_backlog() is False
+
+        breaker.update_backlog(100)
+        _open(breaker)
+        assert breaker.tracks_backlog() is True
+
+        with patch('worker_scripts.sync_breaker.time.time', return_value=10 ** 10):
+            breaker.allow_claim(MagicMock(return_value=True))
+        breaker.record_result(True)
+        breaker.record_result(True)
+        assert breaker.state() == 'closed'
+        assert breaker.tracks_backlog() is True
+
+        breaker.update_backlog(0)
+        assert breaker.tracks_backlog() is False
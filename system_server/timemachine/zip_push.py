@@ -8,6 +8,7 @@ import time
 import pymongo
 from datetime import datetime
 import settings
+from utils.http_session import get_session
 
 client            = MongoClient("172.17.0.1")
 tm_records_db     = client["fvonprem"]["event_records"]
@@ -66,7 +67,7 @@ def push_event_records(cloud_domain, id_token, event_records):
         try:
             push_path = '{}/TMEventIngest'.format(CLOUD_FUNCTIONS_BASE)
             headers   = {'Authorization': 'Bearer '+id_token}
-            r = requests.post(push_path, headers=headers, files=batch, timeout=30)
+            r = get_session().post(push_path, headers=headers, files=batch, timeout=30)
             if r.status_code <= 299:
                 mark_as_processed(batch)
             else:
@@ -0,0 +1,144 @@
+"""
+Keep-alive HTTP client for the capture backend's predict endpoints.
+
+tcp_server and gpio_controller call the capture backend once per trigger.
+Going through one pooled requests.Session per process keeps those
+connections open, so a trigger only pays the TCP setup when the pool has
+to open a new connection. Prediction calls are not retried: a retried
+snap would capture a second frame.
+
+Every call records its timings in a LatencyHistogram:
+    connect - time spent opening a connection, only when a new one was needed
+    predict - the whole request, including any connect
+    gpio    - recorded by the caller around setting the result pins
+    trigger - recorded by the caller, trigger received to result handled
+
+Unlike utils/http_session this module does not import settings, so the
+hardware scripts can use it without the cloud config.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+CAPTURE_URL = 'http://172.17.0.1:5000'
+POOL_SIZE   = 8
+# upper bounds of the histogram buckets in ms, the last one catches the rest
+BUCKETS_MS  = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+_connect = threading.local()
+
+
+class _TimedConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect.seconds = getattr(_connect, 'seconds', 0) + time.perf_counter() - start
+
+
+class _TimedConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose http connections report how long they took to open"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(self.poolmanager.pool_classes_by_scheme,
+                                                       http=_TimedConnectionPool)
+
+
+class LatencyHistogram(object):
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.stages     = {}
+        self.lock       = threading.Lock()
+
+    def record(self, stage, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                              'counts': [0] * len(self.buckets_ms)}
+            entry['count']    += 1
+            entry['total_ms'] += ms
+            entry['max_ms']    = max(entry['max_ms'], ms)
+            for i, bound in enumerate(self.buckets_ms):
+                if ms <= bound:
+                    entry['counts'][i] += 1
+                    break
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def _percentile(self, counts, count, pct):
+        """Upper bound of the bucket holding the pct-th percentile"""
+        target = pct / 100 * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets_ms, counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return self.buckets_ms[-1]
+
+    def snapshot(self):
+        """JSON friendly copy of the histogram, buckets keyed by their upper bound in ms"""
+        with self.lock:
+            stages = {stage: dict(entry, counts=entry['counts'][:]) for stage, entry in self.stages.items()}
+        report = {}
+        for stage, entry in stages.items():
+            count = entry['count']
+            report[stage] = {
+                'count':   count,
+                'mean_ms': round(entry['total_ms'] / count, 3),
+                'max_ms':  round(entry['max_ms'], 3),
+                'p50_ms':  self._percentile(entry['counts'], count, 50),
+                'p99_ms':  self._percentile(entry['counts'], count, 99),
+                'buckets': {('inf' if bound == float('inf') else str(bound)): n
+                            for bound, n in zip(self.buckets_ms, entry['counts'])},
+            }
+        return report
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+
+class CaptureClient(object):
+    def __init__(self, base_url=CAPTURE_URL, pool_size=POOL_SIZE, timeout=None):
+        self.base_url = base_url
+        self.timeout  = timeout
+        self.latency  = LatencyHistogram()
+        self.session  = requests.Session()
+        adapter = TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+
+    def request(self, method, path, **kwargs):
+        """Send a request to the capture backend; path may also be a full url"""
+        url = path if path.startswith('http') else self.base_url + path
+        kwargs.setdefault('timeout', self.timeout)
+        _connect.seconds = 0
+        start = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self.latency.record('predict', time.perf_counter() - start)
+            if _connect.seconds:
+                self.latency.record('connect', _connect.seconds)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
@@ -0,0 +1,120 @@
+"""
+In-process cache for the mongo documents the TCP server needs on every
+command (presets, tcp_config, the id token), so a trigger does not wait on
+mongo reads.
+
+Entries are loaded on first use and dropped when a mongo change stream
+reports a write to their collection. Change streams need a replica set;
+on a standalone mongod, or while the stream is reconnecting, entries
+expire after ttl seconds instead.
+
+Latency critical callers (the GPIO edge thread) warm() their entries at
+startup and read them with get_nowait(), which never waits on mongo once
+a value has been loaded: an expired or invalidated entry is served stale
+while it is reloaded on another thread.
+"""
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+RETRY_INTERVAL = 60  # seconds between attempts to open the change stream
+
+
+class ConfigCache(object):
+    def __init__(self, ttl=30):
+        self.ttl         = ttl
+        self.loaders     = {}
+        self.collections = {}  # collection name -> cache entries loaded from it
+        self.entries     = {}  # name -> (value, loaded_at)
+        self.last        = {}  # name -> last loaded value, served by get_nowait while reloading
+        self.refreshing  = set()
+        self.generation  = 0
+        self.watching    = False
+        self.lock        = threading.Lock()
+
+    def register(self, name, collection, loader):
+        """loader() returns the value for name, read from collection"""
+        self.loaders[name] = loader
+        self.collections.setdefault(collection.name, []).append(name)
+
+    def _fresh(self, entry):
+        return entry is not None and (self.watching or time.time() - entry[1] < self.ttl)
+
+    def get(self, name):
+        entry = self.entries.get(name)
+        if self._fresh(entry):
+            return entry[0]
+        generation = self.generation
+        value = self.loaders[name]()
+        with self.lock:
+            self.last[name] = value
+            # don't keep a value that was invalidated while it was loading
+            if generation == self.generation:
+                self.entries[name] = (value, time.time())
+        return value
+
+    def get_nowait(self, name):
+        """Like get(), but serves the last value while a stale entry reloads in the background"""
+        entry = self.entries.get(name)
+        if self._fresh(entry):
+            return entry[0]
+        if name not in self.last:
+            # never loaded, nothing to serve
+            return self.get(name)
+        self.refresh(name)
+        return self.last[name]
+
+    def refresh(self, name):
+        """Reload name on a background thread, unless a reload is already running"""
+        with self.lock:
+            if name in self.refreshing:
+                return
+            self.refreshing.add(name)
+        threading.Thread(target=self._reload, args=(name,), daemon=True).start()
+
+    def _reload(self, name):
+        try:
+            self.get(name)
+        except PyMongoError as error:
+            print('failed to reload', name, error)
+        finally:
+            with self.lock:
+                self.refreshing.discard(name)
+
+    def warm(self, names=None):
+        """Load entries now, so get_nowait() has a value to serve from the start"""
+        for name in list(self.loaders) if names is None else names:
+            try:
+                self.get(name)
+            except PyMongoError as error:
+                print('failed to load', name, error)
+
+    def invalidate(self, names=None):
+        with self.lock:
+            self.generation += 1
+            for name in list(self.entries) if names is None else names:
+                self.entries.pop(name, None)
+
+    def watch(self, database):
+        """Invalidate entries when their collection changes; runs until the process exits"""
+        pipeline = [{'$match': {'ns.coll': {'$in': list(self.collections)}}}]
+        while True:
+            try:
+                with database.watch(pipeline) as stream:
+                    self.watching = True
+                    # writes made before the stream opened were not seen
+                    self.invalidate()
+                    for change in stream:
+                        collection = change.get('ns', {}).get('coll')
+                        self.invalidate(self.collections.get(collection) if collection else None)
+            except PyMongoError as error:
+                print('config change stream unavailable, caching for', self.ttl, 'seconds:', error)
+            self.watching = False
+            self.invalidate()
+            time.sleep(RETRY_INTERVAL)
+
+    def start_watching(self, database):
+        thread = threading.Thread(target=self.watch, args=(database,), daemon=True)
+        thread.start()
+        return thread
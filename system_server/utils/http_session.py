@@ -0,0 +1,61 @@
+"""
+Shared HTTP session for cloud-facing worker scripts.
+
+Each process gets one requests.Session with a pooled, keep-alive adapter so
+repeated calls to the same cloud host reuse the TCP/TLS connection instead
+of paying a fresh handshake per request. The session is rebuilt after a
+fork so an RQ work-horse never shares sockets with its parent.
+
+Pool size and retry policy come from fvconfig.json:
+    http_pool_size      - connections kept per host (default 10)
+    http_max_retries    - retries on connect errors / 502-504 (default 3)
+    http_backoff_factor - urllib3 backoff factor in seconds (default 0.5)
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import settings
+
+POOL_SIZE      = int(settings.config.get('http_pool_size', 10))
+MAX_RETRIES    = int(settings.config.get('http_max_retries', 3))
+BACKOFF_FACTOR = float(settings.config.get('http_backoff_factor', 0.5))
+
+_session     = None
+_session_pid = None
+_lock        = threading.Lock()
+
+
+def build_session(pool_size=POOL_SIZE, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        # only idempotent requests are retried on bad status; connect errors are always safe
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Return this process' pooled session, creating it on first use."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+    return _session
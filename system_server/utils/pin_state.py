@@ -0,0 +1,101 @@
+"""
+Compact GPIO pin state: the two bytes of the C GPIO_State struct.
+
+Pins read like the board: a bit is 0 while the pin is on (inputs
+triggered, outputs driven), so an idle board is PinState(0xff, 0xff).
+Comparing two states is one XOR; the 'GPI1'..'GPO8' dict used by mongo
+and the UI, and the {'inputs': [...], 'outputs': [...]} JSON of
+read_all_gpio_states_as_json, are only built when asked for.
+
+As one int (mask) the inputs are the low byte and the outputs the high
+byte, the layout EdgeMonitor samples.
+"""
+
+PIN_COUNT = 8
+BYTE      = 0xff
+
+
+def pin_bit(name):
+    """'GPI3' -> 2, 'GPO1' -> 8: the pin's bit in PinState.mask"""
+    index = int(name[3:]) - 1
+    if not 0 <= index < PIN_COUNT or name[:3] not in ('GPI', 'GPO'):
+        raise ValueError('unknown pin ' + name)
+    return index if name[:3] == 'GPI' else index + PIN_COUNT
+
+
+def pin_name(bit):
+    return ('GPI' if bit < PIN_COUNT else 'GPO') + str(bit % PIN_COUNT + 1)
+
+
+PIN_NAMES = tuple(pin_name(bit) for bit in range(2 * PIN_COUNT))
+ALL_PINS  = (1 << 2 * PIN_COUNT) - 1
+
+
+class PinState(object):
+    __slots__ = ('inputs', 'outputs')
+
+    def __init__(self, inputs=BYTE, outputs=BYTE):
+        self.inputs  = inputs & BYTE
+        self.outputs = outputs & BYTE
+
+    @classmethod
+    def from_c(cls, c_state):
+        """From the GPIO_State struct returned by read_all_gpio_states"""
+        return cls(c_state.inputs, c_state.outputs)
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(mask, mask >> 8)
+
+    @classmethod
+    def from_dict(cls, pins):
+        """From a 'GPIx'/'GPOx' -> on dict such as the pin_state document; missing pins are off"""
+        mask = ALL_PINS
+        for bit, name in enumerate(PIN_NAMES):
+            if pins.get(name):
+                mask &= ~(1 << bit)
+        return cls.from_mask(mask)
+
+    @property
+    def mask(self):
+        return self.inputs | self.outputs << 8
+
+    def __eq__(self, other):
+        return isinstance(other, PinState) and self.mask == other.mask
+
+    def __hash__(self):
+        return self.mask
+
+    def __repr__(self):
+        return 'PinState(0x%02x, 0x%02x)' % (self.inputs, self.outputs)
+
+    def diff(self, other):
+        """Mask of the pins that differ from other"""
+        return self.mask ^ other.mask
+
+    def is_on(self, name):
+        return not self.mask >> pin_bit(name) & 1
+
+    def with_pin(self, name, on):
+        bit = 1 << pin_bit(name)
+        return PinState.from_mask(self.mask & ~bit if on else self.mask | bit)
+
+    def triggered(self):
+        """Input pin numbers that are on, lowest first"""
+        return [pin + 1 for pin in range(PIN_COUNT) if not self.inputs >> pin & 1]
+
+    def as_dict(self, pins=ALL_PINS):
+        """{'GPI1': False, ...} for the pins in the mask, True meaning on"""
+        mask = self.mask
+        return {PIN_NAMES[bit]: not mask >> bit & 1 for bit in range(2 * PIN_COUNT) if pins >> bit & 1}
+
+    def changes(self, previous):
+        """The $set for moving the stored state from previous to this one"""
+        return self.as_dict(self.diff(previous))
+
+    def to_json(self):
+        """The read_all_gpio_states_as_json format: raw bit values per pin"""
+        return {
+            'inputs':  [(self.inputs >> i) & 1 for i in range(PIN_COUNT)],
+            'outputs': [(self.outputs >> i) & 1 for i in range(PIN_COUNT)]
+        }
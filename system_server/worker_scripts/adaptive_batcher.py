@@ -0,0 +1,109 @@
+"""
+Adaptive batch sizing for analytics sync.
+
+Batches are sized by record count and payload bytes. The record count
+grows while uploads are fast and successful and shrinks on errors,
+timeouts or slow uploads, always staying within the configured min/max.
+State and throughput stats live in a redis hash so every RQ worker sees
+the same batch size:
+
+    batch_size                  current target records per batch
+    last_records / last_bytes   size of the last uploaded batch
+    last_latency_ms             upload time of the last batch
+    last_records_per_sec        throughput of the last batch
+    last_bytes_per_sec
+    last_success                1/0
+    cycle_records / cycle_bytes / cycle_batches / cycle_batch_size
+                                what the last push cycle enqueued
+"""
+import json
+import time
+
+
+class AdaptiveBatcher(object):
+    def __init__(self, redis_con, key='analytics_batcher', min_size=10, max_size=500,
+                 max_bytes=1024 * 1024, target_latency_ms=2000):
+        self.redis_con         = redis_con
+        self.key               = key
+        self.min_size          = min_size
+        self.max_size          = max(min_size, max_size)
+        self.max_bytes         = max_bytes
+        self.target_latency_ms = target_latency_ms
+
+    def current_size(self):
+        try:
+            size = self.redis_con.hget(self.key, 'batch_size')
+        except Exception as e:
+            print(f"Batcher state unavailable: {str(e)}")
+            size = None
+        if size is None:
+            return self.min_size
+        return min(self.max_size, max(self.min_size, int(size)))
+
+    def make_batches(self, records):
+        """Split records into batches of at most current_size() records and max_bytes payload"""
+        size = self.current_size()
+        batches = []
+        batch, batch_bytes = [], 0
+        total_bytes = 0
+        for record in records:
+            record_bytes = len(json.dumps(record))
+            total_bytes += record_bytes
+            if batch and (len(batch) >= size or batch_bytes + record_bytes > self.max_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(record)
+            batch_bytes += record_bytes
+        if batch:
+            batches.append(batch)
+
+        self._save({
+            'cycle_records': len(records),
+            'cycle_bytes': total_bytes,
+            'cycle_batches': len(batches),
+            'cycle_batch_size': size,
+            'cycle_time': int(time.time())
+        })
+        print(f"Analytics batching: {len(records)} records, {total_bytes} bytes "
+              f"-> {len(batches)} batches (batch size {size})")
+        return batches
+
+    def next_size(self, size, latency_ms, success):
+        if not success:
+            return max(self.min_size, size // 2)
+        if latency_ms > self.target_latency_ms:
+            return max(self.min_size, int(size * 0.75))
+        return min(self.max_size, int(size * 1.25) + 1)
+
+    def record_result(self, num_records, num_bytes, latency_s, success):
+        """Feed back one upload; adjusts the batch size and stores throughput stats"""
+        latency_ms = latency_s * 1000
+        size = self.next_size(self.current_size(), latency_ms, success)
+        elapsed = max(latency_s, 0.001)
+        stats = {
+            'batch_size': size,
+            'last_records': num_records,
+            'last_bytes': num_bytes,
+            'last_latency_ms': int(latency_ms),
+            'last_records_per_sec': round(num_records / elapsed, 1),
+            'last_bytes_per_sec': round(num_bytes / elapsed, 1),
+            'last_success': int(bool(success))
+        }
+        self._save(stats)
+        print(f"Analytics upload: {num_records} records in {int(latency_ms)} ms "
+              f"({stats['last_records_per_sec']} rec/s, {stats['last_bytes_per_sec']} B/s), "
+              f"next batch size {size}")
+        return size
+
+    def stats(self):
+        try:
+            raw = self.redis_con.hgetall(self.key)
+        except Exception:
+            return {}
+        return {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+
+    def _save(self, values):
+        try:
+            self.redis_con.hset(self.key, mapping=values)
+        except Exception as e:
+            print(f"Failed to save batcher state: {str(e)}")
@@ -22,6 +22,7 @@ from pymongo import MongoClient
 from bson import json_util
 from redis import Redis
 from rq import Queue, Retry
+from utils.http_session import get_session
 
 # Configuration
 MONGODB_HOST = "172.17.0.1"
@@ -129,7 +130,7 @@ def sync_to_cloud(assemblies, access_token):
         }
         url = f'{CLOUD_DOMAIN}/api/assembly/progress/sync'
 
-        res = requests.post(
+        res = get_session().post(
             url,
             headers=headers,
             json={'assemblies': assemblies},
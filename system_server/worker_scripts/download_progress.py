@@ -0,0 +1,139 @@
+"""
+Throttled job progress for model downloads.
+
+Each update_job_progress is a get_current_job() plus a mongo update_one,
+so downloads must not call it for every chunk they read. ProgressReporter
+counts the bytes written and only calls report(percent, rate, eta) when
+the rounded percentage changes or `interval` seconds have passed since
+the last call. rate is in MB/s and eta in seconds; eta is None while the
+size is unknown.
+
+A download can cover part of a job's progress: with start=40, span=20
+it reports 40..60, so several versions downloaded in turn add up to one
+0..100 stream. ProgressGroup does the same for downloads running at
+once: each gets an item() and an equal share of the span, and all of
+them report through one throttled stream.
+"""
+import threading
+import time
+
+CHUNK_SIZE        = 1024 * 1024  # bytes read per iteration and buffered per file write
+PROGRESS_INTERVAL = 2.0          # seconds between reports while the percentage holds
+MB                = 1024 * 1024
+
+
+class ProgressReporter(object):
+    def __init__(self, report, total=0, start=0, span=100, interval=PROGRESS_INTERVAL, clock=time.monotonic):
+        self.report     = report
+        self.total      = total
+        self.start      = start
+        self.span       = span
+        self.interval   = interval
+        self.clock      = clock
+        self.written    = 0
+        self.resumed    = 0  # bytes already on disk when the download began
+        self.started_at = clock()
+        self.last_pct   = None
+        self.last_at    = self.started_at
+        self.reports    = 0
+
+    def percent(self):
+        if not self.total:
+            return round(self.start)
+        return round(self.start + self.span * min(self.written, self.total) / self.total)
+
+    def rate(self):
+        """MB/s since the download started"""
+        elapsed = self.clock() - self.started_at
+        return (self.written - self.resumed) / MB / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Seconds left at the current rate, None if unknown"""
+        rate = self.rate()
+        if not self.total or not rate:
+            return None
+        return max(0, self.total - self.written) / MB / rate
+
+    def begin(self, total, offset=0):
+        """Set the size once the response is in; offset bytes were resumed from disk"""
+        self.total   = total
+        self.written = self.resumed = offset
+
+    def advance(self, size):
+        self.written += size
+        pct = self.percent()
+        if pct != self.last_pct or self.clock() - self.last_at >= self.interval:
+            self._report(pct)
+
+    def finish(self):
+        """Report the final state unless it was the last thing reported"""
+        pct = self.percent() if self.total else round(self.start + self.span)
+        if pct != self.last_pct:
+            self._report(pct)
+
+    def _report(self, pct):
+        eta = self.eta()
+        self.report(pct, round(self.rate(), 2), None if eta is None else round(eta))
+        self.last_pct = pct
+        self.last_at  = self.clock()
+        self.reports += 1
+
+
+class ProgressGroup(ProgressReporter):
+    def __init__(self, report, count, start=0, span=100, interval=PROGRESS_INTERVAL, clock=time.monotonic):
+        super(ProgressGroup, self).__init__(report, 0, start, span, interval, clock)
+        self.count = max(1, count)
+        self.items = []
+        self.lock  = threading.Lock()
+
+    def item(self):
+        """Progress for one of the downloads, with begin/advance/finish"""
+        with self.lock:
+            item = ProgressItem(self)
+            self.items.append(item)
+            return item
+
+    def percent(self):
+        done = sum(item.fraction() for item in self.items)
+        return round(self.start + self.span * min(done, self.count) / self.count)
+
+    def eta(self):
+        rate = self.rate()
+        if len(self.items) < self.count or not all(item.total for item in self.items) or not rate:
+            return None
+        return sum(max(0, item.total - item.written) for item in self.items) / MB / rate
+
+    def advance(self, size):
+        with self.lock:
+            super(ProgressGroup, self).advance(size)
+
+    def finish(self):
+        with self.lock:
+            super(ProgressGroup, self).finish()
+
+
+class ProgressItem(object):
+    def __init__(self, group):
+        self.group   = group
+        self.total   = 0
+        self.written = 0
+        self.done    = False
+
+    def begin(self, total, offset=0):
+        self.total   = total
+        self.written = offset
+        self.group.advance(0)
+
+    def advance(self, size):
+        self.written += size
+        self.group.advance(size)
+
+    def finish(self):
+        self.done = True
+        self.group.advance(0)
+
+    def fraction(self):
+        if self.done:
+            return 1.0
+        return min(self.written, self.total) / self.total if self.total else 0.0
+
@@ -1,4 +1,5 @@
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 import datetime
 import string
 import requests
@@ -7,9 +8,16 @@ import time
 import json
 import sys
 import os 
+import uuid
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 settings_path = os.environ['HOME']+'/flex-run'
 sys.path.append(settings_path)
 import settings
+from utils.http_session import get_session
+from worker_scripts.adaptive_batcher import AdaptiveBatcher
+from worker_scripts.sync_breaker import SyncBreaker
 
 from redis import Redis
 from rq import Queue, Retry, Worker
@@ -52,7 +60,22 @@ util_collection   = client["fvonprem"]["utils"]
 use_aws           = False 
 aws_client        = None
 config            = settings.config
-BATCH_SIZE        = 10
+BATCH_SIZE        = 10  # smallest batch; the adaptive batcher grows from here
+CLAIM_LIMIT       = 1000
+STUCK_CLAIM_LIMIT = 20
+# backlog counts stop here, so checking a huge spool stays cheap
+BACKLOG_COUNT_LIMIT = int(config.get('analytics_backlog_count_limit', 100000))
+# 'bulk' claims a whole batch with a claim token, 'loop' claims one record per round trip
+CLAIM_MODE        = config.get('analytics_claim_mode', 'bulk')
+# which destinations must accept a batch for it to count as synced: 'primary', 'both' or 'any'
+SYNC_SUCCESS_POLICY = config.get('cloud_sync_success_policy', 'primary')
+# max cloud sync batches per second across all workers, 0 disables the limit
+SYNC_RATE_LIMIT     = int(config.get('cloud_sync_rate_limit', 5))
+SYNC_RATE_KEY       = 'cloud_sync_rate'
+# 'gzip' sends analytics with Content-Encoding: gzip, 'none' sends plain JSON
+SYNC_COMPRESSION    = config.get('cloud_sync_compression', 'none')
+# primed gzip stream, copied per payload so the compressor setup is paid once
+_GZIP_COMPRESSOR    = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
 LB_DOMAIN         = "https://functions-proxy.flexiblevision.com"
 BQ_INGEST_PATH    = "https://data-ingest-queue-172198548516.us-central1.run.app"
 if config['latest_stable_ref'] == 'latest_stable_version':
@@ -70,6 +93,23 @@ if 'use_aws' in config and config['use_aws']:
     use_aws    = True
     aws_client = settings.kinesis
 
+batcher = AdaptiveBatcher(
+    redis_con,
+    min_size=int(config.get('analytics_batch_min', BATCH_SIZE)),
+    max_size=int(config.get('analytics_batch_max', 500)),
+    max_bytes=int(config.get('analytics_batch_max_bytes', 1024 * 1024)),
+    target_latency_ms=int(config.get('analytics_batch_target_latency_ms', 2000))
+)
+
+breaker = SyncBreaker(
+    redis_con,
+    failure_threshold=int(config.get('cloud_breaker_failures', 5)),
+    open_seconds=int(config.get('cloud_breaker_open_seconds', 30)),
+    max_open_seconds=int(config.get('cloud_breaker_max_open_seconds', 600)),
+    recovery_successes=int(config.get('cloud_breaker_recovery_successes', 3)),
+    drain_rate=int(config.get('cloud_sync_drain_rate', 1))
+)
+
 
 def _get_tracker_collection():
     """Get the dedicated tracker collection"""
@@ -149,6 +189,90 @@ def update_sync_tracker(did, success=True, error_msg=None, record_id=None):
         print(f"Error updating sync_tracker for {did}: {str(e)}")
 
 
+def update_sync_tracker_batch(synced=(), failed=()):
+    """Update sync tracker for a whole batch - one $inc per did
+
+    synced: analytics records that were synced successfully
+    failed: (record, error_msg) tuples for records that failed to sync
+    """
+    current_time_ms = time_now_ms()
+    current_time_iso = datetime.datetime.now().isoformat()
+
+    counts = defaultdict(int)
+    for record in synced:
+        counts[record.get('did', 'unknown')] += 1
+
+    errors = defaultdict(list)
+    for record, error_msg in failed:
+        errors[record.get('did', 'unknown')].append({
+            'timestamp': current_time_iso,
+            'timestamp_ms': current_time_ms,
+            'record_id': record.get('id', 'unknown'),
+            'error': error_msg
+        })
+
+    on_insert = {
+        'completed': False,
+        'first_sync': current_time_iso,
+        'first_sync_ms': current_time_ms,
+        'completion_time': None,
+        'completion_time_ms': None,
+        'total_time_seconds': None
+    }
+    last_sync = {'last_sync': current_time_iso, 'last_sync_ms': current_time_ms}
+
+    ops = []
+    for did, count in counts.items():
+        ops.append(UpdateOne(
+            {'_id': did, 'completed': {'$ne': True}},
+            {'$inc': {'count': count}, '$set': last_sync,
+             '$setOnInsert': dict(on_insert, errors=[])},
+            upsert=True
+        ))
+    for did, entries in errors.items():
+        ops.append(UpdateOne(
+            {'_id': did},
+            {'$push': {'errors': {'$each': entries}}, '$set': last_sync,
+             '$setOnInsert': dict(on_insert, count=0)},
+            upsert=True
+        ))
+    if not ops:
+        return
+
+    try:
+        tracker_coll = _get_tracker_collection()
+        try:
+            tracker_coll.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # the count upsert of an already completed did collides with its _id;
+            # unordered, so every other update was still applied
+            for error in e.details.get('writeErrors', []):
+                print(f"sync_tracker write error: {error.get('errmsg')}")
+
+        if not counts:
+            return
+
+        completed = tracker_coll.find({
+            '_id': {'$in': list(counts.keys())},
+            'completed': {'$ne': True},
+            'count': {'$gte': SYNC_COMPLETION_THRESHOLD}
+        }, {'first_sync_ms': 1})
+        completion_ops = [UpdateOne(
+            {'_id': t['_id'], 'completed': {'$ne': True}},
+            {'$set': {
+                'completed': True,
+                'completion_time': current_time_iso,
+                'completion_time_ms': current_time_ms,
+                'total_time_seconds': (current_time_ms - t['first_sync_ms']) / 1000.0
+            }}
+        ) for t in completed]
+        if completion_ops:
+            tracker_coll.bulk_write(completion_ops, ordered=False)
+
+    except Exception as e:
+        print(f"Error updating sync_tracker batch: {str(e)}")
+
+
 def insert_job(job_id, msg):
     job_collection.insert_one({
         '_id': job_id,
@@ -164,6 +288,75 @@ def find_utility(util_type):
 def time_now_ms():
     return int(round(time.time() * 1000))
 
+def to_json_types(value):
+    """Convert a BSON document to plain JSON types in a single walk
+
+    Produces the same structure as json.loads(json_util.dumps(value)) without
+    serializing and re-parsing the record.
+    """
+    if isinstance(value, dict):
+        return {k: to_json_types(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_types(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    try:
+        return to_json_types(json_util.default(value))
+    except TypeError:
+        return value
+
+def encode_payload(analytics, compression=None):
+    """Serialize a batch to wire bytes once. Returns (body, extra_headers)"""
+    compression = compression or SYNC_COMPRESSION
+    body = json.dumps(analytics, separators=(',', ':')).encode('utf-8')
+    if compression == 'gzip':
+        compressor = _GZIP_COMPRESSOR.copy()
+        return compressor.compress(body) + compressor.flush(), {'Content-Encoding': 'gzip'}
+    return body, {}
+
+def claim_records_loop(query, limit):
+    """Claim up to limit records one find_one_and_update at a time"""
+    result = []
+    for _ in range(limit):
+        record = analytics_coll.find_one_and_update(
+            query,
+            {"$set": {"synced": "processing", "modified": time_now_ms()}},
+            return_document=True  # Return the updated document
+        )
+
+        if not record:
+            break  # No more records matching query
+
+        result.append(to_json_types(record))
+    return result
+
+def claim_records_bulk(query, limit):
+    """Claim up to limit records in one batch
+
+    Candidate ids are selected first, then tagged with a claim token via
+    update_many (re-applying the query so records claimed concurrently by
+    another cycle are skipped) and read back in a single find by token.
+    The token goes when the record does: synced records are deleted and
+    mark_many_for_retry unsets it.
+    """
+    ids = [r['_id'] for r in analytics_coll.find(query, {'_id': 1}).limit(limit)]
+    if not ids:
+        return []
+
+    claim_token = uuid.uuid4().hex
+    claim_query = dict(query)
+    claim_query['_id'] = {'$in': ids}
+    analytics_coll.update_many(
+        claim_query,
+        {"$set": {"synced": "processing", "modified": time_now_ms(), "claim_token": claim_token}}
+    )
+
+    records = analytics_coll.find(
+        {'_id': {'$in': ids}, 'claim_token': claim_token},
+        {'claim_token': 0}
+    )
+    return [to_json_types(r) for r in records]
+
 def get_unsynced_records():
     sync_obj = find_utility('predict_sync')
     if not sync_obj:
@@ -181,22 +374,7 @@ def get_unsynced_records():
     
     if use_aws:
         query['complete'] = True
-    
-    result = []
-    batch_size = 1000  # Reasonable limit
-    
-    for _ in range(batch_size):
-        record = analytics_coll.find_one_and_update(
-            query,
-            {"$set": {"synced": "processing", "modified": time_now_ms()}},
-            return_document=True  # Return the updated document
-        )
-        
-        if not record:
-            break  # No more records matching query
-            
-        result.append(json.loads(json_util.dumps(record)))
-    
+
     one_hour_ago_ms = time_now_ms() - (60000*60)
     five_hours_ago_ms = time_now_ms() - ((60000*60)*5)
     
@@ -207,19 +385,14 @@ def get_unsynced_records():
             "$gt": five_hours_ago_ms
         }
     }
-    
-    for _ in range(20):
-        stuck_record = analytics_coll.find_one_and_update(
-            stuck_query,
-            {"$set": {"synced": "processing", "modified": time_now_ms()}},
-            return_document=True
-        )
-        
-        if not stuck_record:
-            break
-            
-        result.append(json.loads(json_util.dumps(stuck_record)))
-    
+
+    if CLAIM_MODE == 'bulk':
+        result = claim_records_bulk(query, CLAIM_LIMIT)
+        result += claim_records_bulk(stuck_query, STUCK_CLAIM_LIMIT)
+        return result
+
+    result = claim_records_loop(query, CLAIM_LIMIT)
+    result += claim_records_loop(stuck_query, STUCK_CLAIM_LIMIT)
     time.sleep(1)
     return result
 
@@ -230,113 +403,182 @@ def mark_as_processing(record_id):
 def mark_as_synced(record_id):
     analytics_coll.delete_one({"id": record_id})
 
+def mark_many_as_synced(record_ids):
+    if record_ids:
+        analytics_coll.delete_many({"id": {"$in": record_ids}})
+
+def mark_many_for_retry(record_ids):
+    if record_ids:
+        analytics_coll.update_many({"id": {"$in": record_ids}},
+                                   {"$set": {"synced": False}, "$unset": {"claim_token": ""}})
+
+def wait_for_sync_slot(rate=None):
+    """Block until a sync slot is free in the current one-second window.
+
+    The window counter lives in redis so the limit holds across all RQ
+    workers. Redis trouble never blocks a sync.
+    """
+    rate = SYNC_RATE_LIMIT if rate is None else rate
+    if rate <= 0:
+        return
+    while True:
+        window = int(time.time())
+        key = f'{SYNC_RATE_KEY}:{window}'
+        try:
+            pipe = redis_con.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            count = pipe.execute()[0]
+        except Exception as e:
+            print(f"Sync rate limiter unavailable: {str(e)}")
+            return
+        if count <= rate:
+            return
+        time.sleep(max(0, window + 1 - time.time()))
+
+def count_backlog():
+    """Number of analytics records waiting in the local spool, up to BACKLOG_COUNT_LIMIT"""
+    try:
+        return analytics_coll.count_documents({'synced': {'$in': [False, 'processing']}},
+                                              limit=BACKLOG_COUNT_LIMIT)
+    except Exception as e:
+        print(f"Failed to count analytics backlog: {str(e)}")
+        return 0
+
+def probe_endpoint(domain):
+    """Lightweight reachability check used while the sync breaker is open"""
+    if use_aws:
+        return bool(aws_client and (aws_client.authorized or aws_client.authorize()))
+    res = get_session().head(domain, timeout=5)
+    return res.status_code < 500
+
+def post_to_destination(session, url, body, headers):
+    """POST an encoded batch to one destination. Returns (ok, error_msg)"""
+    try:
+        res = session.post(url, data=body, headers=headers, timeout=20)
+        print(url, res)
+        if res.status_code == 200:
+            return True, None
+        return False, f"HTTP {res.status_code}: {res.text[:200]}"
+    except Exception as e:
+        return False, f"Exception in cloud_call: {str(e)}"
+
+def sync_succeeded(primary_ok, bq_ok, policy=None):
+    policy = policy or SYNC_SUCCESS_POLICY
+    if policy == 'both':
+        return primary_ok and bq_ok
+    if policy == 'any':
+        return primary_ok or bq_ok
+    return primary_ok
+
 def cloud_call(url, analytics, headers):
     if not analytics:
         return True
+    record_ids = [i['id'] for i in analytics]
+    if breaker.is_open():
+        # endpoint went down after this batch was queued, return it to the spool
+        mark_many_for_retry(record_ids)
+        return False
     try:
         for a in analytics: a['synced'] = True
-        res = requests.post(url, json=analytics, headers=headers, timeout=20)
-        bq_res = requests.post(BQ_INGEST_PATH, json=analytics, headers=headers, timeout=20)
-        print(res, bq_res)
+        body, encoding_headers = encode_payload(analytics)
+        post_headers = dict(headers, **encoding_headers)
+        post_headers['Content-Type'] = 'application/json'
+        wait_for_sync_slot(breaker.rate_limit(SYNC_RATE_LIMIT))
+        session = get_session()
+        start = time.time()
+        # both destinations get the same payload, post them concurrently
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            bq_future = pool.submit(post_to_destination, session, BQ_INGEST_PATH, body, post_headers)
+            primary_ok, primary_err = post_to_destination(session, url, body, post_headers)
+            bq_ok, bq_err = bq_future.result()
+        latency = time.time() - start
         print('--------------------------------------')
-        success = res.status_code == 200
+        if primary_err:
+            print(f'FAILED TO CALL {url}: {primary_err}')
+        if bq_err:
+            print(f'FAILED TO CALL {BQ_INGEST_PATH}: {bq_err}')
+
+        success = sync_succeeded(primary_ok, bq_ok)
+        batcher.record_result(len(analytics), len(body), latency, success)
+        breaker.record_result(success)
         if success:
-            for i in analytics:
-                mark_as_synced(i['id'])
-                if sync_tracker:
-                    did = i.get('did', 'unknown')
-                    update_sync_tracker(did, success=True, record_id=i['id'])
+            mark_many_as_synced(record_ids)
+            if sync_tracker:
+                update_sync_tracker_batch(synced=analytics)
         else:
             # Track failed syncs and mark for retry
-            for i in analytics:
-                did = i.get('did', 'unknown')
-                analytics_coll.update_one({"id": i['id']}, {"$set": {"synced": False}})
-                if sync_tracker:
-                    update_sync_tracker(
-                        did,
-                        success=False,
-                        error_msg=f"HTTP {res.status_code}: {res.text[:200]}",
-                        record_id=i['id']
-                    )
-        time.sleep(1)
+            mark_many_for_retry(record_ids)
+            if sync_tracker:
+                error_msg = '; '.join(e for e in (primary_err, bq_err) if e)
+                update_sync_tracker_batch(failed=[(i, error_msg) for i in analytics])
         return success
     except Exception as e:
         error_msg = f"Exception in cloud_call: {str(e)}"
         print(f'FAILED TO CALL {url}: {error_msg}')
+        breaker.record_result(False)
         # Track failed syncs for all records in batch and mark for retry
-        for i in analytics:
-            did = i.get('did', 'unknown')
-            analytics_coll.update_one({"id": i['id']}, {"$set": {"synced": False}})
-            if sync_tracker:
-                update_sync_tracker(
-                    did,
-                    success=False,
-                    error_msg=error_msg,
-                    record_id=i['id']
-                )
+        mark_many_for_retry(record_ids)
+        if sync_tracker:
+            update_sync_tracker_batch(failed=[(i, error_msg) for i in analytics])
         return False
 
 def kinesis_call(analytics):
     if not analytics:
         return True
-    
+    if breaker.is_open():
+        mark_many_for_retry([a['id'] for a in analytics if 'id' in a])
+        return False
+
     overall_success = True
+    synced = []
+    failed = []
     try:
+        records = []
         for a in analytics:
-            record_id = a.get('id', 'unknown')
-            did = a.get('did', 'unknown')
-            
             # Check if record exists
             if 'id' not in a:
-                error_msg = "Record missing 'id' field"
-                if sync_tracker:
-                    update_sync_tracker(did, success=False, error_msg=error_msg, record_id=record_id)
+                failed.append((a, "Record missing 'id' field"))
                 overall_success = False
                 continue
             
-            if 'did' not in a:
-                error_msg = "Record missing 'did' field"
-            
             if '_id' in a: 
                 del a['_id']
-            
-            try:
-                did_send = aws_client.send_stream(a)
-
-                if did_send is True:
-                    mark_as_synced(record_id)
-                    if sync_tracker:
-                        update_sync_tracker(did, success=True, record_id=record_id)
-                    print(f"Kinesis send success: {did_send}")
-                else:
-                    error_msg = "Kinesis send returned False"
-                    analytics_coll.update_one({"id": record_id}, {"$set": {"synced": False}})
-                    if sync_tracker:
-                        update_sync_tracker(did, success=False, error_msg=error_msg, record_id=record_id)
-                    overall_success = False
-
-            except Exception as inner_error:
-                error_msg = f"Kinesis send exception: {str(inner_error)}"
-                analytics_coll.update_one({"id": record_id}, {"$set": {"synced": False}})
-                if sync_tracker:
-                    update_sync_tracker(did, success=False, error_msg=error_msg, record_id=record_id)
+            records.append(a)
+
+        if records:
+            wait_for_sync_slot(breaker.rate_limit(SYNC_RATE_LIMIT))
+        start = time.time()
+        results = aws_client.send_batch(records) if records else []
+        for a, did_send in zip(records, results):
+            if did_send is True:
+                synced.append(a)
+            else:
+                failed.append((a, f"Kinesis send failed: {did_send}"))
                 overall_success = False
+        print(f"Kinesis batch: {len(synced)} sent, {len(failed)} failed")
+        if records:
+            batcher.record_result(len(records), len(json.dumps(records)), time.time() - start, not failed)
+            # partial failures are per-record problems, only a fully failed batch counts against the endpoint
+            breaker.record_result(bool(synced))
+
+        mark_many_as_synced([a['id'] for a in synced])
+        mark_many_for_retry([a['id'] for a, _ in failed if 'id' in a])
+        if sync_tracker:
+            update_sync_tracker_batch(synced=synced, failed=failed)
 
-        time.sleep(1)
         print('--------------------------------------')
         return overall_success
         
     except Exception as error:
         error_msg = f"FAILED TO POST TO KINESIS: {str(error)}"
         print(error_msg)
+        breaker.record_result(False)
 
         # Track all records as failed and mark for retry
-        for a in analytics:
-            did = a.get('did', 'unknown')
-            record_id = a.get('id', 'unknown')
-            analytics_coll.update_one({"id": record_id}, {"$set": {"synced": False}})
-            if sync_tracker:
-                update_sync_tracker(did, success=False, error_msg=error_msg, record_id=record_id)
+        mark_many_for_retry([a.get('id', 'unknown') for a in analytics])
+        if sync_tracker:
+            update_sync_tracker_batch(failed=[(a, error_msg) for a in analytics])
 
         return False
 
@@ -344,16 +586,20 @@ def push_analytics_to_cloud(domain, access_token):
     headers = {"Authorization": "Bearer "+access_token, 'Content-Type': 'application/json'}
     url     = domain+"/api/capture/devices/upload_prediction"
 
+    # the backlog only drives the open and drain metrics, skip the count while syncing normally
+    if breaker.tracks_backlog():
+        breaker.update_backlog(count_backlog())
+    if not breaker.allow_claim(lambda: probe_endpoint(domain)):
+        print(f"Sync paused while the cloud is unreachable, backlog: {breaker.stats().get('backlog')}")
+        return True
+
     latest_analytics = get_unsynced_records()
     num_analytics = len(latest_analytics)
 
     if num_analytics == 0:
         return True
 
-    for i in range(0, num_analytics, BATCH_SIZE):
-        analytics = latest_analytics[i:i+BATCH_SIZE]
-        if not analytics: break
-
+    for analytics in batcher.make_batches(latest_analytics):
         print('#Analytics: ', len(analytics))
         if use_aws:
             j_push = job_queue.enqueue(
@@ -0,0 +1,104 @@
+"""
+Model zips extracted straight into their serving layout.
+
+A model version archive has job.json and object-detection.pbtxt at the
+top and the TF SavedModel under <version>/saved_model/. The prediction
+servers want it flat in the version directory:
+
+    <model>/<version>/job.json
+    <model>/<version>/object-detection.pbtxt
+    <model>/<version>/saved_model.pb
+    <model>/<version>/variables/...
+
+extract_model_archive maps every member to that path while it reads the
+zip. Each member is copied once into a staging directory next to the
+version. install_version then moves the staging directory into place
+with a rename. There is no extractall followed by mv and rm -rf shell
+calls. A bad or interrupted archive never leaves a half-written version.
+
+OCR archives are not TF SavedModels. The ocr container expects them as
+they are, so with flatten=False every member keeps its archive path.
+
+zip keeps its index at the end, so the archive must be seekable: a file
+path, or an upload stream that is already spooled to disk or memory.
+"""
+import json
+import os
+import shutil
+import zipfile
+
+COPY_BUFFER = 1024 * 1024
+FLATTENED   = ('saved_model.pb', 'variables')  # lifted out of saved_model/
+
+
+def read_job_data(zf):
+    """job.json from an open archive, {} if it is missing or unreadable"""
+    try:
+        return json.loads(zf.read('job.json')) or {}
+    except (KeyError, ValueError):
+        return {}
+
+
+def member_target(name, version, flatten=True):
+    """Path of an archive member relative to the version directory, None to skip it"""
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    if not flatten:
+        return os.path.join(*parts)
+    if parts[0] == str(version) and len(parts) > 1:
+        parts = parts[1:]
+    if parts[0] == 'saved_model' and len(parts) > 1 and parts[1] in FLATTENED:
+        parts = parts[1:]
+    return os.path.join(*parts)
+
+
+def install_version(source, model_folder, version):
+    """Move a version directory to model_folder/<version>, replacing an older copy"""
+    os.makedirs(model_folder, exist_ok=True)
+    target = os.path.join(model_folder, str(version))
+    if os.path.exists(target):
+        old = os.path.join(model_folder, '.' + str(version) + '.old')
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(target, old)
+        shutil.move(source, target)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        shutil.move(source, target)
+    return target
+
+
+def extract_model_archive(archive, model_folder, version=None, flatten=True):
+    """Extract a model zip into model_folder/<version>/ and return the version.
+
+    version defaults to job.json's model_version; None is returned without
+    extracting anything when neither is known. flatten=False keeps the
+    archive's own layout. Raises zipfile.BadZipfile for a corrupt archive.
+    """
+    with zipfile.ZipFile(archive) as zf:
+        if version is None:
+            version = read_job_data(zf).get('model_version')
+            if version is None:
+                return None
+        version = str(version)
+        os.makedirs(model_folder, exist_ok=True)
+        staging = os.path.join(model_folder, '.' + version + '.partial')
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            for info in zf.infolist():
+                target = member_target(info.filename, version, flatten)
+                if target is None:
+                    continue
+                path = os.path.join(staging, target)
+                if info.is_dir():
+                    os.makedirs(path, exist_ok=True)
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with zf.open(info) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, COPY_BUFFER)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    install_version(staging, model_folder, version)
+    return version
@@ -0,0 +1,182 @@
+"""
+Incremental model deployment into the prediction containers.
+
+Model syncs used to wipe the container's model directory, docker cp the
+whole tree and restart localprediction, so inference went down and every
+byte was copied each time. ModelDeployer instead compares the host tree
+with what it last deployed to the same container and only:
+
+    - docker cp's version directories that are new or changed,
+    - removes versions (and models) that are gone from the host,
+    - copies model.config when its content changed.
+
+What was deployed is kept in <host_root>/.deployed.json, keyed by the
+container id, so a recreated container gets a full deploy. A version's
+signature is its files' paths, sizes and mtimes; re-extracting a version
+changes it.
+
+TF Serving polls the base path of each configured model and loads or
+unloads versions by itself (model_version_policy all), so new versions
+need no restart. localprediction is started with
+--model_config_file_poll_wait_seconds (setup/system_setup.sh and
+upgrades/system_container_upgrades.sh), so it also re-reads a changed
+model.config and loads or unloads whole models. Nothing is restarted.
+
+deploy() returns {'container', 'copied', 'removed', 'unchanged', 'bytes',
+'seconds', 'config_changed', 'full'}.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import time
+
+MANIFEST = '.deployed.json'
+
+
+def run_docker(*args):
+    return subprocess.run(('docker',) + args, check=True, capture_output=True, text=True).stdout
+
+
+def version_signature(path):
+    """(signature, bytes) of a version directory"""
+    digest, size = hashlib.sha1(), 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            stat = os.stat(full)
+            size += stat.st_size
+            digest.update(('%s\0%d\0%d\n' % (os.path.relpath(full, path), stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest(), size
+
+
+def file_signature(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class ModelDeployer(object):
+    def __init__(self, container, host_root, container_root, config_name=None, docker=run_docker):
+        self.container      = container
+        self.host_root      = host_root.rstrip('/')
+        self.container_root = container_root.rstrip('/')
+        self.config_name    = config_name
+        self.docker         = docker
+
+    def scan(self):
+        """{'<model>/<version>': (signature, bytes)} for the host tree"""
+        versions = {}
+        if not os.path.isdir(self.host_root):
+            return versions
+        for model in sorted(os.listdir(self.host_root)):
+            model_path = os.path.join(self.host_root, model)
+            if model.startswith('.') or not os.path.isdir(model_path):
+                continue
+            for version in sorted(os.listdir(model_path)):
+                version_path = os.path.join(model_path, version)
+                if version.startswith('.') or not os.path.isdir(version_path):
+                    continue
+                versions[model + '/' + version] = version_signature(version_path)
+        return versions
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.host_root, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest):
+        if not os.path.isdir(self.host_root):
+            return
+        path = os.path.join(self.host_root, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def container_id(self):
+        return self.docker('inspect', '-f', '{{.Id}}', self.container).strip()
+
+    def deploy(self):
+        started   = time.monotonic()
+        report    = {'container': self.container, 'copied': [], 'removed': [], 'unchanged': 0, 'bytes': 0,
+                     'config_changed': False, 'full': False}
+        container = self.container_id()
+        manifest  = self.load_manifest()
+        if manifest.get('container') != container:
+            # new or recreated container: start from an empty model directory
+            manifest = {'container': container, 'versions': {}, 'config': None}
+            self.docker('exec', self.container, 'rm', '-rf', self.container_root)
+            self.docker('exec', self.container, 'mkdir', '-p', self.container_root)
+            report['full'] = True
+        deployed = manifest['versions']
+        current  = self.scan()
+
+        try:
+            for key in sorted(set(deployed) - set(current)):
+                self.docker('exec', self.container, 'rm', '-rf', self.container_root + '/' + key)
+                del deployed[key]
+                report['removed'].append(key)
+            gone = {key.split('/')[0] for key in report['removed']} - {key.split('/')[0] for key in current}
+            for model in sorted(gone):
+                self.docker('exec', self.container, 'rm', '-rf', self.container_root + '/' + model)
+
+            changed = [key for key in sorted(current) if deployed.get(key) != current[key][0]]
+            report['unchanged'] = len(current) - len(changed)
+            models = sorted({key.split('/')[0] for key in changed})
+            if models:
+                self.docker('exec', self.container, 'mkdir', '-p',
+                            *[self.container_root + '/' + model for model in models])
+            for key in changed:
+                if key in deployed:
+                    self.docker('exec', self.container, 'rm', '-rf', self.container_root + '/' + key)
+                model = key.split('/')[0]
+                self.docker('cp', self.host_root + '/' + key, self.container + ':' + self.container_root + '/' + model)
+                deployed[key] = current[key][0]
+                report['copied'].append(key)
+                report['bytes'] += current[key][1]
+
+            self.deploy_config(manifest, report)
+        finally:
+            self.save_manifest(manifest)
+        report['seconds'] = round(time.monotonic() - started, 3)
+        return report
+
+    def deploy_config(self, manifest, report):
+        if not self.config_name:
+            return
+        path = os.path.join(self.host_root, self.config_name)
+        if not os.path.exists(path):
+            return
+        signature = file_signature(path)
+        if signature == manifest.get('config'):
+            return
+        # picked up by the server's config poll, no restart
+        self.docker('cp', path, self.container + ':' + self.container_root + '/' + self.config_name)
+        report['config_changed'] = True
+        report['bytes'] += os.path.getsize(path)
+        manifest['config'] = signature
+
+
+def prediction_deployer(host_root):
+    """localprediction (TF Serving) serving host_root as /models"""
+    return ModelDeployer('localprediction', host_root, '/models', 'model.config')
+
+
+def lite_deployer(host_root):
+    """predictlite serving host_root as /data/lite_models"""
+    return ModelDeployer('predictlite', host_root, '/data/lite_models')
+
+
+def deploy_models(deployer):
+    """Run a deploy and print its report; None if docker failed"""
+    try:
+        report = deployer.deploy()
+    except (subprocess.CalledProcessError, OSError) as error:
+        print('failed to deploy models to', deployer.container, getattr(error, 'stderr', None) or error)
+        return None
+    print('deployed {} versions ({:.1f} MB) to {} in {}s, {} removed, {} unchanged{}'.format(
+        len(report['copied']), report['bytes'] / (1024 * 1024), report['container'], report['seconds'],
+        len(report['removed']), report['unchanged'], ', new model.config' if report['config_changed'] else ''))
+    return report
@@ -0,0 +1,118 @@
+"""
+Resumable model downloads.
+
+fetch() streams a URL into <destination>.part and renames it to
+destination only once it is complete. An interrupted attempt leaves the
+part file in place. The next attempt, in this job or a later one, asks
+for the rest with an HTTP Range request. A server that ignores the range
+answers 200, and the part file is started over.
+
+A download is complete when its size matches Content-Range or
+Content-Length. When the server sends an MD5 of the whole file (GCS
+x-goog-hash, or Content-MD5 on a 200 answer), the file must match it
+too. Otherwise the part file is removed and the next attempt starts from
+the beginning. Content-MD5 on a 206 answer covers only the range, so a
+resumed download is then checked by size alone.
+
+retrieve_models runs several fetches at once, each reporting to its own
+item of a download_progress.ProgressGroup.
+"""
+import base64
+import hashlib
+import os
+
+import requests
+
+from utils.http_session import get_session
+from worker_scripts.download_progress import CHUNK_SIZE
+
+PARTIAL  = '.part'
+ATTEMPTS = 3
+TIMEOUT  = (10, 60)  # connect, read: a stalled transfer is resumed instead of hanging
+
+
+class DownloadError(Exception):
+    pass
+
+
+def content_total(response, offset):
+    """Full size of the file being served, 0 if unknown"""
+    content_range = response.headers.get('Content-Range', '')
+    total = content_range.rpartition('/')[2]
+    if total.isdigit():
+        return int(total)
+    length = response.headers.get('Content-length')
+    return offset + int(length) if length else 0
+
+
+def expected_md5(response):
+    """Hex MD5 the server gave for the whole file, None if it gave none"""
+    for part in response.headers.get('x-goog-hash', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name == 'md5':
+            return base64.b64decode(value).hex()
+    # Content-MD5 describes the body, which for a 206 is only the requested range
+    content_md5 = response.headers.get('Content-MD5')
+    if not content_md5 or response.status_code == 206:
+        return None
+    return base64.b64decode(content_md5).hex()
+
+
+def file_md5(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch(url, destination, headers=None, progress=None, attempts=ATTEMPTS, session=None, chunk_size=CHUNK_SIZE):
+    """Download url to destination, resuming destination.part; returns destination.
+
+    progress gets begin(total, offset), advance(size) and finish(). Raises
+    DownloadError or a requests exception once `attempts` tries have failed.
+    """
+    session = session or get_session()
+    part    = destination + PARTIAL
+    for attempt in range(1, attempts + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers['Range'] = 'bytes=%d-' % offset
+        try:
+            with session.get(url, headers=request_headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code == 416:
+                    # nothing left past offset: either complete or a stale part file
+                    total, md5 = content_total(response, 0), None
+                    if total != offset:
+                        os.remove(part)
+                        raise DownloadError('range not satisfiable for %d bytes' % offset)
+                else:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        offset = 0
+                    total = content_total(response, offset)
+                    md5   = expected_md5(response)
+                    if progress is not None:
+                        progress.begin(total, offset)
+                    with open(part, 'ab' if offset else 'wb', buffering=chunk_size) as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                            if progress is not None:
+                                progress.advance(len(chunk))
+            size = os.path.getsize(part)
+            if total and size != total:
+                if size > total:
+                    os.remove(part)
+                raise DownloadError('expected %d bytes, have %d' % (total, size))
+            if md5 and file_md5(part) != md5:
+                os.remove(part)
+                raise DownloadError('checksum mismatch')
+            os.replace(part, destination)
+            if progress is not None:
+                progress.finish()
+            return destination
+        except (requests.RequestException, DownloadError) as error:
+            if attempt == attempts:
+                raise
+            print('download of', os.path.basename(destination), 'interrupted, retrying:', error)
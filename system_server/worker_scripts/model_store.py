@@ -0,0 +1,196 @@
+"""
+Content-addressed cache of extracted model versions.
+
+Every archive downloaded by a model sync is extracted once into
+
+    <root>/objects/<sha256 of the archive>/
+
+and index.json maps '<project_id>/<version>' to that hash, its size and
+when it was last used. The serving directories (/models/<name>/<version>
+and /lite_models/<name>/<version>) are hard-linked from the object, so
+they take no extra disk. Wiping them is cheap, and a version that is
+cached is linked back in instead of being downloaded again. That covers
+re-syncs, rollbacks to an older version, and switching a project between
+high_accuracy and high_speed, since both download the same archive.
+Archives with the same content share one object. OCR archives are
+stored with their raw layout (flatten=False) as a separate object.
+
+evict() drops the least recently used versions until the objects fit the
+disk budget. Versions in use by the current sync are kept. A linked file
+only frees its space once the serving directory is cleared as well.
+
+Linked files keep the object's mtime, so model_deployer sees a relinked
+version as unchanged and does not copy it into the container again.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from worker_scripts.model_archive import extract_model_archive, install_version
+from worker_scripts.model_deployer import MANIFEST
+from worker_scripts.model_downloads import PARTIAL
+
+GB    = 1024 * 1024 * 1024
+INDEX = 'index.json'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tree_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+def link_tree(source, target):
+    """Recreate source at target with hard links, copying where linking fails"""
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        folder = target if relative == '.' else os.path.join(target, relative)
+        os.makedirs(folder, exist_ok=True)
+        for name in files:
+            try:
+                os.link(os.path.join(root, name), os.path.join(folder, name))
+            except OSError:
+                # other filesystem or no hard links: fall back to a copy
+                shutil.copy2(os.path.join(root, name), os.path.join(folder, name))
+
+
+def clear_serving_dir(path, keep=(MANIFEST,)):
+    """Empty a serving directory, keeping the deploy manifest and interrupted downloads"""
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name in keep:
+            continue
+        full = os.path.join(path, name)
+        if os.path.isdir(full) and not os.path.islink(full):
+            clear_model_dir(full)
+        else:
+            os.remove(full)
+
+
+def clear_model_dir(path):
+    """Remove a model folder, except the part files of downloads to resume"""
+    partials = False
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name.endswith(PARTIAL) and os.path.isfile(full):
+            partials = True
+        elif os.path.isdir(full) and not os.path.islink(full):
+            shutil.rmtree(full, ignore_errors=True)
+        else:
+            os.remove(full)
+    if not partials:
+        os.rmdir(path)
+
+
+class ModelStore(object):
+    def __init__(self, root, budget, clock=time.time):
+        self.root    = root.rstrip('/')
+        self.objects = os.path.join(self.root, 'objects')
+        self.budget  = budget
+        self.clock   = clock
+        self.index   = self.load_index()
+
+    @staticmethod
+    def key(project_id, version):
+        return str(project_id) + '/' + str(version)
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.root, INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def path(self, project_id, version):
+        """Object directory of a cached version, None if it is not cached"""
+        entry = self.index.get(self.key(project_id, version))
+        if not entry:
+            return None
+        path = os.path.join(self.objects, entry['hash'])
+        return path if os.path.isdir(path) else None
+
+    def add(self, project_id, version, archive, flatten=True):
+        """Extract an archive into the store unless its content is already there.
+
+        flatten is passed to extract_model_archive. Returns the object
+        directory. Raises zipfile.BadZipfile for a corrupt archive,
+        leaving the store unchanged.
+        """
+        digest = file_sha256(archive) + ('' if flatten else '-raw')
+        target = os.path.join(self.objects, digest)
+        if not os.path.isdir(target):
+            staging = os.path.join(self.root, 'staging', digest)
+            shutil.rmtree(staging, ignore_errors=True)
+            try:
+                extract_model_archive(archive, staging, version, flatten)
+                install_version(os.path.join(staging, str(version)), self.objects, digest)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        self.index[self.key(project_id, version)] = {
+            'hash': digest, 'bytes': tree_size(target), 'last_used': self.clock()
+        }
+        self.save_index()
+        return target
+
+    def link(self, project_id, version, target):
+        """Link a cached version to target; False if it is not cached"""
+        source = self.path(project_id, version)
+        if source is None:
+            return False
+        folder, name = os.path.split(target.rstrip('/'))
+        staging = os.path.join(folder, '.' + name + '.partial')
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            link_tree(source, staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        install_version(staging, folder, name)
+        self.index[self.key(project_id, version)]['last_used'] = self.clock()
+        self.save_index()
+        return True
+
+    def size(self):
+        """Bytes held by the store's objects"""
+        sizes = {entry['hash']: entry['bytes'] for entry in self.index.values()}
+        return sum(sizes.values())
+
+    def evict(self, keep=()):
+        """Drop least recently used versions until the store fits its budget.
+
+        keep holds '<project_id>/<version>' keys that must stay. Returns the
+        evicted keys.
+        """
+        evicted = []
+        by_age  = sorted(self.index.items(), key=lambda item: item[1]['last_used'])
+        for key, entry in by_age:
+            if self.size() <= self.budget:
+                break
+            if key in keep:
+                continue
+            del self.index[key]
+            evicted.append(key)
+            if all(other['hash'] != entry['hash'] for other in self.index.values()):
+                shutil.rmtree(os.path.join(self.objects, entry['hash']), ignore_errors=True)
+        if evicted:
+            self.save_index()
+        return evicted
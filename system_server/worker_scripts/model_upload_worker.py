@@ -13,9 +13,12 @@ import base64
 import re
 import subprocess
 import os
+import shutil
 import sys
 import uuid
 import platform
+from worker_scripts.model_archive import install_version
+from worker_scripts.model_deployer import deploy_models, prediction_deployer, lite_deployer
 
 def is_arm_device():
     return platform.processor() == 'aarch64'
@@ -99,7 +102,7 @@ def upload_model(temp_model_path, filename):
 
         if model_exists and version_exists:
             print(model_type, ' ', model_name, ' ', version, ' already exists')
-            os.system('rm -rf '+temp_model_path)
+            shutil.rmtree(temp_model_path, ignore_errors=True)
             return False
 
         #read model information from job.json to find the model type
@@ -107,7 +110,7 @@ def upload_model(temp_model_path, filename):
         if model_exists and not version_exists:
             print('ADDING VERSION')
             #ADD VERSION TO ALREADY EXISTING MODEL FOLDER - DONT RECREATE CONFIG FILE
-            os.system("mv {}/{} {}".format(temp_model_path, str(version), model_path))
+            install_version(os.path.join(temp_model_path, version), model_path, version)
 
             if is_lite_model:
                 models_collection.update_one({'type': model_name}, {'$push': {'high_speed': version}})
@@ -117,8 +120,7 @@ def upload_model(temp_model_path, filename):
         else:
             print('ADDING MODEL AND VERSION')
             #ADD MODEL AND VERSION
-            os.system("mkdir "+model_path)
-            os.system("mv {}/{} {}".format(temp_model_path, str(version), model_path))
+            install_version(os.path.join(temp_model_path, version), model_path, version)
 
             if is_lite_model:
                 models_collection.update_one({'type': model_name}, {'$set': {'high_speed': [version]} }, True)
@@ -131,13 +133,12 @@ def upload_model(temp_model_path, filename):
 
         if is_lite_model:
             print('PUSHING MODELS TO PREDICT LITE SERVER')
-            os.system("docker cp /lite_models predictlite:/data/")
-            os.system('rm -rf '+temp_model_path)
+            deploy_models(lite_deployer('/lite_models'))
+            shutil.rmtree(temp_model_path, ignore_errors=True)
         else:
             print('PUSHING MODELS TO PREDICTION SERVER')
-            os.system("docker cp /models localprediction:/")
-            os.system("docker restart localprediction")
-            os.system('rm -rf '+temp_model_path)
+            deploy_models(prediction_deployer('/models'))
+            shutil.rmtree(temp_model_path, ignore_errors=True)
         
         return True
     else:
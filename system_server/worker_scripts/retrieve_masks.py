@@ -16,6 +16,7 @@ import string
 settings_path = os.environ['HOME']+'/flex-run'
 sys.path.append(settings_path)
 import settings
+from utils.http_session import get_session
 
 client            = MongoClient("172.17.0.1")
 job_collection    = client["fvonprem"]["jobs"]
@@ -25,10 +26,11 @@ CLOUD_DOMAIN = settings.config['cloud_domain'] if 'cloud_domain' in settings.con
 
 def retrieve_masks(resp_data, token):
     project_ids = resp_data['models'].keys()
+    session     = get_session()
     for project_id in project_ids:
         headers = {"Authorization": "Bearer "+token, 'Content-Type': 'application/json'}
         url     = CLOUD_DOMAIN+"/api/capture/mask/get_masks/"+project_id
-        res     = requests.get(url, headers=headers, timeout=30)
+        res     = session.get(url, headers=headers, timeout=30)
         data    = res.json()
 
         if data:
@@ -8,9 +8,11 @@ import time
 import uuid
 import platform
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import StringIO
 from io import BytesIO
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DeleteOne
 from rq import get_current_job
 import datetime
 import string
@@ -21,6 +23,11 @@ def is_arm_device():
 settings_path = os.environ['HOME']+'/flex-run'
 sys.path.append(settings_path)
 import settings
+from utils.http_session import get_session
+from worker_scripts.download_progress import ProgressReporter, ProgressGroup
+from worker_scripts.model_downloads import fetch, DownloadError
+from worker_scripts.model_deployer import deploy_models, prediction_deployer, lite_deployer
+from worker_scripts.model_store import ModelStore, GB, clear_serving_dir
 
 client             = MongoClient("172.17.0.1")
 job_collection     = client["fvonprem"]["jobs"]
@@ -28,11 +35,27 @@ models_collection  = client["fvonprem"]["models"]
 presets_collection = client["fvonprem"]["io_presets"]
 
 CLOUD_DOMAIN = settings.config['cloud_domain'] if 'cloud_domain' in settings.config else "https://clouddeploy.api.flexiblevision.com"
+MODEL_STORE_GB = float(settings.config.get('model_store_gb', 20))
+DOWNLOAD_WORKERS = int(settings.config.get('model_download_workers', 3))
 
-def update_job_progress(progress):
-    job = get_current_job()
+def update_job_progress(progress, rate=None, eta=None, job=None):
+    # download threads pass the job in: get_current_job() only works on the job's own thread
+    job = job or get_current_job()
     if job:
-        job_collection.update_one({'_id': job.id}, {'$set': {'progress': progress}})
+        update = {'progress': progress}
+        if rate is not None:
+            update['rate_mbps'] = rate
+            update['eta_seconds'] = eta
+        job_collection.update_one({'_id': job.id}, {'$set': update})
+
+def record_deployment(report):
+    job = get_current_job()
+    if job and report:
+        job_collection.update_one({'_id': job.id}, {'$set': {'deployment': report}})
+
+def report_download_progress(progress, rate, eta, job=None):
+    print(f"{progress}% {rate} MB/s eta {eta if eta is not None else '?'}s")
+    update_job_progress(progress, rate, eta, job)
 
 def base_path():
     xavier_ssd = '/xavier_ssd/'
@@ -42,6 +65,9 @@ BASE_PATH_TO_MODELS = base_path()+'models/'
 BASE_PATH_TO_LITE_MODELS = base_path()+'lite_models/'
 LITE_MODEL_TYPES    = ['high_speed']
 
+def model_store():
+    return ModelStore(base_path()+'model_store/', int(MODEL_STORE_GB * GB))
+
 def create_config_file(data):
     with open (BASE_PATH_TO_MODELS+'model.config', 'a') as f:
         f.write('model_config_list {\n')
@@ -54,27 +80,24 @@ def create_config_file(data):
             f.write('\t}\n')
         f.write('}')
 
-def download_by_link(token, project_id, version, destination):
+def download_by_link(token, project_id, version, destination, start=0, span=100, progress=None):
     # get link 
     path = CLOUD_DOMAIN+'/api/capture/models/download_link/'+str(project_id)+'/'+str(version)
     headers = {'Authorization': 'Bearer '+token}
-    res  = requests.get(path, headers=headers)
+    session = get_session()
+    res  = session.get(path, headers=headers)
     
     signed_link = res.json()
-    written     = 0
-    chunk_size  = 8192
-    download = requests.get(signed_link, stream=True)
-    cont_length = int(download.headers.get('Content-length', 0))
-    with download as r:
-        r.raise_for_status()
-        with open(destination, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-                written += len(chunk)
-                if cont_length > 0:
-                    pct = round((written / cont_length) * 100)
-                    update_job_progress(pct)
-                print(f"{written}/{cont_length}")
+    if progress is None:
+        progress = ProgressReporter(report_download_progress, 0, start, span)
+    fetch(signed_link, destination, progress=progress, session=session)
+
+def download_version(token, model_type, project_id, version, destination, progress=None):
+    if model_type == 'ocr':
+        return download_by_link(token, str(project_id), str(version), destination, progress=progress)
+    path = CLOUD_DOMAIN+'/api/capture/models/download/'+str(project_id)+'/'+str(version)
+    headers = {'accept': 'application/json', 'Authorization': 'Bearer '+token}
+    fetch(path, destination, headers, progress)
     
 
 def retrieve_models(data, token):
@@ -99,8 +122,8 @@ def retrieve_models(data, token):
 
     #check if exclude_models is empty
     if not bool(data['exclude_models']) and os.path.exists(BASE_PATH_TO_MODELS): 
-        os.system("rm -rf "+BASE_PATH_TO_MODELS)
-        os.system("mkdir "+BASE_PATH_TO_MODELS)
+        # versions are linked back from the model store, not downloaded again
+        clear_serving_dir(BASE_PATH_TO_MODELS)
 
     if not os.path.exists(BASE_PATH_TO_MODELS): 
         os.system("mkdir "+BASE_PATH_TO_MODELS)
@@ -113,6 +136,10 @@ def retrieve_models(data, token):
     exclude_models = data['exclude_models']
     total_models = sum(len(ref['models']) for ref in models.values())
     completed_models = 0
+    store     = model_store()
+    used      = set()
+    installed = set()  # (model_name, version) ready in the serving directory
+    pending   = []     # versions to download
     update_job_progress(0)
     for model_ref in models.values():
         project_id   = model_ref['_id']
@@ -124,69 +151,80 @@ def retrieve_models(data, token):
         if len(versions) > 0 and not os.path.exists(model_folder): 
             os.system("mkdir " + model_folder)
 
-        model_data = {'type': model_name}
-        model_data[model_type] =[]
-        #iterate over the models data and request/extract model to models folder
+        #iterate over the models data and link or queue each version for download
         for version in versions:
+            version_folder = model_folder+'/'+str(version)
+            used.add(store.key(project_id, version))
+            if model_type == 'ocr':
+                # pushed to the ocr container however the version got here,
+                # with the archive's own layout at the model folder's root
+                OCR_MODEL = model_folder
+                version_folder = model_folder
             if model_name in exclude_models and version in exclude_models[model_name]:
                 # model has already been downloaded
                 completed_models += 1
                 update_job_progress(round((completed_models / total_models) * 100))
-                if os.path.exists(model_folder+'/'+str(version)):
-                    model_data[model_type].append(version)
+                if os.path.exists(version_folder):
+                    installed.add((model_name, version))
                     print('model has already been downloaded')
+                elif store.link(project_id, version, version_folder):
+                    installed.add((model_name, version))
+                    print('model linked from model store')
                 else:
-                    print('version not found, skipping...', model_folder+'/'+str(version))
-            else:
-                print('Syncing '+model_name+' versions '+str(version))
-                if model_type == 'ocr':
-                    OCR_MODEL = model_folder
-                    download_by_link(token, str(project_id), str(version), f"{model_folder}/model.zip")
-                else:
-                    path = CLOUD_DOMAIN+'/api/capture/models/download/'+str(project_id)+'/'+str(version)
-                    headers = {'accept': 'application/json', 'Authorization': 'Bearer '+token}
-                    r = requests.get(path, headers=headers, stream=True)
-                    cont_length = int(r.headers.get('Content-length', 0))
-                    written = 0
-                    with open(f"{model_folder}/model.zip", 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                            written += len(chunk)
-                            if cont_length > 0 and total_models > 0:
-                                base_pct = (completed_models / total_models) * 100
-                                chunk_pct = ((written / cont_length) / total_models) * 100
-                                update_job_progress(round(base_pct + chunk_pct))
+                    print('version not found, skipping...', version_folder)
+            elif store.link(project_id, version, version_folder):
+                print('Linked '+model_name+' version '+str(version)+' from model store')
+                installed.add((model_name, version))
                 completed_models += 1
                 update_job_progress(round((completed_models / total_models) * 100))
-                
-                if os.path.exists(model_folder+'/model.zip'):
-                    try:
-                        with zipfile.ZipFile(model_folder+'/model.zip') as zf:
-                            zf.extractall(model_folder)
-                        os.system("mv "+model_folder+"/job.json "+model_folder+"/"+str(version))
-                        os.system("mv "+model_folder+"/object-detection.pbtxt "+model_folder+"/"+str(version))
-
-                        #move pb file to model version directory
-                        model_file_path = model_folder+"/"+str(version)+"/saved_model/saved_model.pb"
-                        if os.path.exists(model_file_path):
-                            os.system("mv "+model_file_path+" "+model_folder+"/"+str(version))
-
-                        #move variables folder to model version directory
-                        vars_path = model_folder+"/"+str(version)+"/saved_model/variables"
-                        if os.path.exists(vars_path):
-                            os.system("mv "+vars_path+" "+model_folder+"/"+str(version))
-
-                        model_data[model_type].append(version)
-                    except zipfile.BadZipfile:
-                        print('bad zipfile in '+model_folder)
-                    os.system("rm -rf "+model_folder+'/model.zip')
+            else:
+                # one archive per version, resumed if an earlier job was interrupted
+                archive = f"{model_folder}/.{version}.model.zip"
+                pending.append((project_id, model_name, model_folder, version, version_folder, archive))
+
+    if pending:
+        # the downloads share the rest of the job's 0..100
+        job      = get_current_job()
+        progress = ProgressGroup(partial(report_download_progress, job=job), len(pending),
+                                 completed_models / total_models * 100, len(pending) / total_models * 100)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            futures = [pool.submit(download_version, token, model_type, project_id, version, archive, progress.item())
+                       for project_id, model_name, model_folder, version, version_folder, archive in pending]
+        progress.finish()
+
+        for (project_id, model_name, model_folder, version, version_folder, archive), future in zip(pending, futures):
+            try:
+                future.result()
+            except (requests.RequestException, DownloadError, OSError) as error:
+                print('failed to download '+model_name+' version '+str(version)+':', error)
+                continue
+            print('Synced '+model_name+' version '+str(version))
+            if os.path.exists(archive):
+                try:
+                    store.add(project_id, version, archive, flatten=model_type != 'ocr')
+                    stored = True
+                except zipfile.BadZipfile:
+                    print('bad zipfile in '+model_folder)
+                    stored = False
+                # before linking: an ocr link replaces the folder holding the archive
+                os.remove(archive)
+                if stored and store.link(project_id, version, version_folder):
+                    installed.add((model_name, version))
 
+    for model_ref in models.values():
+        model_name = format_filename(model_ref['name'])
+        model_data = {'type': model_name}
+        model_data[model_type] = [version for version in model_ref['models'] if (model_name, version) in installed]
         if model_data[model_type]:
             if model_name in models_versions:
                 models_versions[model_name][model_type] += model_data[model_type]
             else:
                 models_versions[model_name] = model_data
 
+    evicted = store.evict(keep=used)
+    if evicted:
+        print('evicted from model store:', ', '.join(evicted))
+
     if models_versions:
         if model_type not in LITE_MODEL_TYPES and model_type != 'ocr':
             create_config_file(models_versions.values())
@@ -203,29 +241,21 @@ def retrieve_models(data, token):
             os.system("docker restart ocr")
         elif model_type in LITE_MODEL_TYPES or is_arm_device():
             # Lite models and ARM high_accuracy models use predictlite
-            os.system("docker exec predictlite rm -rf /data/lite_models")
             print('pushing models into predictlite server: ', BASE_PATH_TO_MODELS)
-            os.system("docker cp "+BASE_PATH_TO_MODELS+" predictlite:/data/")
+            record_deployment(deploy_models(lite_deployer(BASE_PATH_TO_MODELS)))
         else:
-            os.system("docker exec localprediction rm -rf /models")
             print('pushing new models to localprediction')
-            os.system("docker cp "+BASE_PATH_TO_MODELS+" localprediction:/")
-            os.system("docker restart localprediction")
+            record_deployment(deploy_models(prediction_deployer(BASE_PATH_TO_MODELS)))
         return True
     else:
         return False
 
 
 def save_models_versions(models_versions, model_type):
-    # models_collection.drop()
-    # models_collection.insert_many(models_versions)
-    db_models = models_collection.find()
-
-    # loop over models and set model type(model name) lists to empty
-    for model in db_models:
-        model_list = {}
-        model_list[model_type] = []
-        models_collection.update_one({'type': model['type']}, {'$set': model_list}, True)
+    # one ordered bulk_write: clear this type's lists, drop empty models, then set the synced versions
+    ops = []
+    for model in models_collection.find():
+        ops.append(UpdateOne({'type': model['type']}, {'$set': {model_type: []}}, upsert=True))
 
         # if versions are empty then remove model
         is_empty = []
@@ -233,16 +263,18 @@ def save_models_versions(models_versions, model_type):
             for version_list in model.values():
                 if isinstance(version_list, list):
                     is_empty.append(len(version_list)==0)
-                
+
         if all(is_empty):
-            models_collection.delete_one({'type': model['type']})
+            ops.append(DeleteOne({'type': model['type']}))
+
+    # set model versions array by type/model_name
+    for mv in models_versions:
+        ops.append(UpdateOne({'type': mv['type']}, {'$set': {model_type: mv[model_type]}}, upsert=True))
+    if ops:
+        models_collection.bulk_write(ops, ordered=True)
 
-    # loop over model versions and set model versions array by type/model_name
+    # presets move only once the versions they point at are written
     for mv in models_versions:
-        model_list = {}
-        model_list[model_type] = mv[model_type]
-        model_query = {'type': mv['type']}
-        models_collection.update_one(model_query, {'$set': model_list}, True)
         try:
             assign_preset_to_latest_version(mv['type'], mv[model_type], model_type)
         except Exception as error:
@@ -252,9 +284,8 @@ def assign_preset_to_latest_version(model, versions, model_type):
     type_map = {'versions': 'high_accuracy', 'high_speed': 'high_speed'}
     versions.sort()
     latest_version = versions[-1]
-    presets = presets_collection.find({'modelName': model, 'modelType': type_map[model_type]})
-    for preset in presets:
-        presets_collection.update({'presetId': preset['presetId']}, {'$set': {'modelVersion': latest_version}})
+    presets_collection.update_many({'modelName': model, 'modelType': type_map[model_type]},
+                                   {'$set': {'modelVersion': latest_version}})
 
 def format_filename(s):
     valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
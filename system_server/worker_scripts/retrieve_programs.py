@@ -13,6 +13,7 @@ from pymongo import MongoClient
 import datetime
 import string
 import settings
+from utils.http_session import get_session
 
 client              = MongoClient("172.17.0.1")
 job_collection      = client["fvonprem"]["jobs"]
@@ -22,10 +23,11 @@ CLOUD_DOMAIN = settings.config['cloud_domain'] if 'cloud_domain' in settings.con
 
 def retrieve_programs(resp_data, token):
     project_ids = resp_data['models'].keys()
+    session     = get_session()
     for project_id in project_ids:
         headers = {"Authorization": "Bearer "+token, 'Content-Type': 'application/json'}
         url     = CLOUD_DOMAIN+"/api/capture/programs/"+project_id+"/0/9999?use_latest=true"
-        res     = requests.get(url, headers=headers, timeout=5)
+        res     = session.get(url, headers=headers, timeout=5)
         data    = res.json()
 
         if data:
@@ -0,0 +1,155 @@
+"""
+Circuit breaker for analytics sync.
+
+While the cloud endpoint keeps failing, unsynced analytics stay in
+img_analytics (the local spool) instead of being claimed, posted and
+flipped back every cycle. States:
+
+    closed      normal syncing
+    open        endpoint failing; nothing is claimed until open_until,
+                then a lightweight probe decides whether to try again
+    half_open   probe succeeded; the backlog drains at drain_rate batches
+                per second until enough uploads succeed to close again
+
+State and metrics live in a redis hash so every RQ worker sees them:
+
+    state / failures / successes / open_until / open_seconds
+    backlog / backlog_time          unsynced records at the last check
+    drain_started / drain_backlog   when draining began and the backlog then
+    drain_eta_seconds               estimated time left to drain
+    last_drain_seconds              how long the last full drain took
+"""
+import time
+
+CLOSED    = 'closed'
+OPEN      = 'open'
+HALF_OPEN = 'half_open'
+
+
+class SyncBreaker(object):
+    def __init__(self, redis_con, key='analytics_breaker', failure_threshold=5,
+                 open_seconds=30, max_open_seconds=600, recovery_successes=3, drain_rate=1):
+        self.redis_con          = redis_con
+        self.key                = key
+        self.failure_threshold  = failure_threshold
+        self.open_seconds       = open_seconds
+        self.max_open_seconds   = max(open_seconds, max_open_seconds)
+        self.recovery_successes = recovery_successes
+        self.drain_rate         = drain_rate
+
+    def state(self):
+        return self.stats().get('state', CLOSED)
+
+    def allow_claim(self, probe):
+        """Return True if records may be claimed; probes the endpoint once the open window ends"""
+        stats = self.stats()
+        state = stats.get('state', CLOSED)
+        if state != OPEN:
+            return True
+        if time.time() < float(stats.get('open_until', 0)):
+            return False
+
+        try:
+            healthy = probe()
+        except Exception as e:
+            print(f"Sync probe failed: {str(e)}")
+            healthy = False
+
+        if not healthy:
+            self._open(float(stats.get('open_seconds', self.open_seconds)) * 2)
+            return False
+
+        print('Sync endpoint reachable again, draining backlog')
+        self._save({
+            'state': HALF_OPEN,
+            'successes': 0,
+            'drain_started': time.time(),
+            'drain_backlog': stats.get('backlog', 0)
+        })
+        return True
+
+    def is_open(self):
+        return self.state() == OPEN
+
+    def rate_limit(self, rate):
+        """Batches per second allowed for the current state"""
+        if self.state() == HALF_OPEN and self.drain_rate:
+            return min(rate, self.drain_rate) if rate else self.drain_rate
+        return rate
+
+    def record_result(self, success):
+        """Feed back one upload; opens or closes the breaker as needed"""
+        stats = self.stats()
+        state = stats.get('state', CLOSED)
+        if success:
+            if state == HALF_OPEN:
+                successes = self._incr('successes')
+                if successes >= self.recovery_successes:
+                    print('Sync endpoint recovered, closing breaker')
+                    self._save({'state': CLOSED, 'failures': 0, 'successes': 0,
+                                'open_seconds': self.open_seconds})
+            elif int(stats.get('failures', 0)):
+                self._save({'failures': 0})
+            return
+
+        if state == HALF_OPEN:
+            self._open(float(stats.get('open_seconds', self.open_seconds)) * 2)
+        elif state == CLOSED and self._incr('failures') >= self.failure_threshold:
+            self._open(self.open_seconds)
+
+    def tracks_backlog(self):
+        """True while the backlog feeds the open or drain metrics, including a drain that outlasts recovery"""
+        stats = self.stats()
+        return stats.get('state', CLOSED) != CLOSED or bool(float(stats.get('drain_started', 0)))
+
+    def update_backlog(self, backlog):
+        """Store the spool size and drain metrics"""
+        now = time.time()
+        stats = self.stats()
+        values = {'backlog': backlog, 'backlog_time': now}
+
+        drain_started = float(stats.get('drain_started', 0))
+        if drain_started:
+            elapsed = now - drain_started
+            drained = int(stats.get('drain_backlog', 0)) - backlog
+            if backlog == 0:
+                values['last_drain_seconds'] = round(elapsed, 1)
+                values['drain_started'] = 0
+                values['drain_eta_seconds'] = 0
+                print(f"Analytics backlog drained in {round(elapsed, 1)} s")
+            elif drained > 0 and elapsed > 0:
+                values['drain_eta_seconds'] = round(backlog / (drained / elapsed), 1)
+
+        self._save(values)
+
+    def stats(self):
+        try:
+            raw = self.redis_con.hgetall(self.key)
+        except Exception:
+            return {}
+        return {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+
+    def _open(self, open_seconds):
+        open_seconds = float(min(self.max_open_seconds, max(self.open_seconds, open_seconds)))
+        print(f"Sync endpoint failing, pausing sync for {int(open_seconds)} s")
+        self._save({
+            'state': OPEN,
+            'open_seconds': open_seconds,
+            'open_until': time.time() + open_seconds,
+            'successes': 0,
+            'failures': 0,
+            'drain_started': 0
+        })
+
+    def _incr(self, field):
+        try:
+            return self.redis_con.hincrby(self.key, field, 1)
+        except Exception as e:
+            print(f"Failed to update breaker state: {str(e)}")
+            return 0
+
+    def _save(self, values):
+        try:
+            self.redis_con.hset(self.key, mapping=values)
+        except Exception as e:
+            print(f"Failed to save breaker state: {str(e)}")